@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from mysql.connector import Error, errorcode
+
+import comandos
+import metricas
+
+TAMANHO_POOL = int(os.getenv('DB_POOL_TAMANHO', 5))
+
+# Classes de rota: vagas simultâneas por worker, requisições que podem esperar
+# por uma vaga, quanto tempo (s) elas esperam e o prazo (s) da requisição, que
+# limita a espera por conexão e o tempo de cada SELECT. As rotas pesadas ficam
+# com metade do pool, para que as demais sempre encontrem conexão livre.
+CLASSES = {
+    'padrao': {
+        'vagas': int(os.getenv('ADMISSAO_PADRAO_VAGAS', TAMANHO_POOL)),
+        'fila': int(os.getenv('ADMISSAO_PADRAO_FILA', 2 * TAMANHO_POOL)),
+        'espera': float(os.getenv('ADMISSAO_PADRAO_ESPERA', 1)),
+        'prazo': float(os.getenv('ADMISSAO_PADRAO_PRAZO', 5)),
+    },
+    'pesada': {
+        'vagas': int(os.getenv('ADMISSAO_PESADA_VAGAS', max(1, TAMANHO_POOL // 2))),
+        'fila': int(os.getenv('ADMISSAO_PESADA_FILA', TAMANHO_POOL)),
+        'espera': float(os.getenv('ADMISSAO_PESADA_ESPERA', 0.5)),
+        'prazo': float(os.getenv('ADMISSAO_PESADA_PRAZO', 10)),
+    },
+    # Exportações transmitem por minutos: ocupam a vaga até o fim, sem prazo de consulta
+    'exportacao': {
+        'vagas': int(os.getenv('ADMISSAO_EXPORTACAO_VAGAS', 1)),
+        'fila': int(os.getenv('ADMISSAO_EXPORTACAO_FILA', 0)),
+        'espera': 0.0,
+        'prazo': None,
+    },
+    # Uploads e downloads de imagens duram o tempo da transmissão: classe própria,
+    # para que clientes lentos não ocupem as vagas das rotas JSON
+    'imagem': {
+        'vagas': int(os.getenv('ADMISSAO_IMAGEM_VAGAS', TAMANHO_POOL)),
+        'fila': int(os.getenv('ADMISSAO_IMAGEM_FILA', TAMANHO_POOL)),
+        'espera': float(os.getenv('ADMISSAO_IMAGEM_ESPERA', 0.5)),
+        'prazo': None,
+    },
+}
+# Segundos sugeridos ao cliente no Retry-After das respostas 503
+REPETIR_APOS = int(os.getenv('ADMISSAO_REPETIR_APOS', 1))
+
+_ERROS_DE_PRAZO = {errorcode.ER_QUERY_TIMEOUT, errorcode.ER_QUERY_INTERRUPTED}
+
+
+class Sobrecarga(Exception):
+    """A requisição foi recusada ou passou do prazo; a aplicação responde 503 com Retry-After."""
+
+
+class Limite:
+    """Vagas de uma classe de rotas, com uma fila de espera limitada."""
+
+    def __init__(self, nome, vagas, fila, espera, prazo):
+        self.nome = nome
+        self.fila = fila
+        self.espera = espera
+        self.prazo = prazo
+        self._vagas = threading.BoundedSemaphore(vagas)
+        self._lock = threading.Lock()
+        self.total_vagas = vagas
+        self.em_andamento = 0
+        self.esperando = 0
+
+    def entrar(self):
+        """Ocupa uma vaga, esperando no máximo `espera` segundos; False se a requisição deve ser recusada."""
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                if self.esperando >= self.fila:
+                    return False
+                self.esperando += 1
+            _contar(self.nome, 'enfileirada')
+            try:
+                if not self._vagas.acquire(timeout=self.espera):
+                    return False
+            finally:
+                with self._lock:
+                    self.esperando -= 1
+        with self._lock:
+            self.em_andamento += 1
+        return True
+
+    def sair(self):
+        with self._lock:
+            self.em_andamento -= 1
+        self._vagas.release()
+
+
+limites = {nome: Limite(nome, **opcoes) for nome, opcoes in CLASSES.items()}
+
+
+def configurar(nome, **opcoes):
+    """Troca os limites de uma classe (ex.: benchmarks com outro tamanho de pool); vale para novas requisições."""
+    limites[nome] = Limite(nome, **dict(CLASSES[nome], **opcoes))
+
+
+def classe(nome):
+    """Marca a rota com uma classe de admissão ('leve' não tem limite nem prazo)."""
+    if nome != 'leve' and nome not in limites:
+        raise ValueError(f"Classe de admissão desconhecida: {nome}")
+
+    def decorador(view):
+        view.classe_admissao = nome
+        return view
+
+    return decorador
+
+
+def _contar(nome, evento):
+    metricas.registro.incrementar('admissao_eventos_total', (('classe', nome), ('evento', evento)))
+
+
+def restante():
+    """Segundos que faltam para o prazo da requisição atual; None fora de requisição ou sem prazo."""
+    if not has_request_context():
+        return None
+    prazo = g.get('prazo_admissao')
+    if prazo is None:
+        return None
+    return prazo - time.monotonic()
+
+
+def verificar_prazo():
+    """Recusa continuar uma requisição cujo prazo já terminou."""
+    faltam = restante()
+    if faltam is not None and faltam <= 0:
+        _contar(g.limite_admissao.nome, 'prazo_esgotado')
+        raise Sobrecarga("O prazo da requisição terminou.")
+
+
+class CursorComPrazo:
+    """Envolve um cursor passando o prazo da requisição para o banco.
+
+    Cada SELECT recebe o hint MAX_EXECUTION_TIME com o tempo que resta (o MySQL
+    interrompe a consulta, em vez de prender a conexão e o worker) e não começa
+    depois do prazo. Escritas não são interrompidas no meio: o hint só vale para
+    SELECT e elas continuam limitadas pelo innodb_lock_wait_timeout do servidor.
+    Os comandos registrados (buscas por chave primária) não recebem o hint, que
+    mudaria o texto e impediria o reuso do statement preparado.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def execute(self, sql, params=()):
+        faltam = restante()
+        inicio = sql.lstrip()
+        if faltam is None or inicio[:6].upper() != 'SELECT':
+            return self._cursor.execute(sql, params)
+        verificar_prazo()
+        if comandos.nome_do_comando(sql):
+            return self._cursor.execute(sql, params)
+        sql = f"SELECT /*+ MAX_EXECUTION_TIME({max(int(faltam * 1000), 1)}) */" + inicio[6:]
+        try:
+            return self._cursor.execute(sql, params)
+        except Error as err:
+            if err.errno in _ERROS_DE_PRAZO:
+                _contar(g.limite_admissao.nome, 'prazo_esgotado')
+                raise Sobrecarga("A consulta passou do prazo da requisição.") from err
+            raise
+
+
+def _admitir(app):
+    def admitir():
+        view = app.view_functions.get(request.endpoint)
+        nome = getattr(view, 'classe_admissao', 'padrao')
+        if view is None or nome == 'leve':
+            return None
+        limite = limites[nome]
+        if not limite.entrar():
+            _contar(nome, 'rejeitada')
+            return recusar(Sobrecarga("Serviço sobrecarregado."))
+        _contar(nome, 'admitida')
+        g.limite_admissao = limite
+        g.prazo_admissao = time.monotonic() + limite.prazo if limite.prazo else None
+        return None
+
+    return admitir
+
+
+def _liberar_vaga():
+    limite = g.pop('limite_admissao', None)
+    if limite is not None:
+        limite.sair()
+
+
+def _ao_responder(resp):
+    # Arquivos (send_file, direct_passthrough) vão direto ao servidor WSGI, que não
+    # chama resp.close(): para eles a vaga é liberada no fim da requisição
+    if resp.is_streamed and not resp.direct_passthrough and 'limite_admissao' in g:
+        # Respostas transmitidas ocupam a vaga até o fim da transmissão, não só até o fim da view
+        limite = g.pop('limite_admissao')
+        resp.call_on_close(limite.sair)
+    return resp
+
+
+def recusar(err):
+    """Resposta 503 com Retry-After para requisições recusadas ou fora do prazo."""
+    return {"erro": str(err)}, 503, {'Retry-After': str(REPETIR_APOS)}
+
+
+def estatisticas():
+    """Vagas, requisições em andamento e na fila de cada classe, neste worker."""
+    return {
+        nome: {'vagas': l.total_vagas, 'em_andamento': l.em_andamento, 'esperando': l.esperando, 'prazo': l.prazo}
+        for nome, l in limites.items()
+    }
+
+
+def coletar_metricas():
+    amostras = []
+    for nome, stats in estatisticas().items():
+        rotulos = (('classe', nome),)
+        amostras.append(('admissao_em_andamento', 'gauge', 'Requisições ocupando uma vaga, por classe.', rotulos, stats['em_andamento']))
+        amostras.append(('admissao_esperando', 'gauge', 'Requisições na fila por uma vaga, por classe.', rotulos, stats['esperando']))
+    return amostras
+
+
+def controlar(app):
+    """Registra o controle de admissão: limites por classe de rota, prazos e 503 com Retry-After."""
+    app.before_request(_admitir(app))
+    app.after_request(_ao_responder)
+    app.teardown_request(lambda exc: _liberar_vaga())
+    app.register_error_handler(Sobrecarga, recusar)
+    metricas.registro.coletores.append(coletar_metricas)
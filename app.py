@@ -1,612 +1,406 @@
-from flask import Flask, request
+from flask import Blueprint, Flask
+import click
+import logging
 import os
-import mysql.connector
-from mysql.connector import Error
-from dotenv import load_dotenv
-
-# Carrega as variáveis de ambiente do arquivo .cred (se disponível)
-load_dotenv('.cred')
-
-# Configurações para conexão com o banco de dados usando variáveis de ambiente
-config = {
-    'host': os.getenv('DB_HOST', 'localhost'),  # Obtém o host do banco de dados da variável de ambiente
-    'user': os.getenv('DB_USER'),  # Obtém o usuário do banco de dados da variável de ambiente
-    'password': os.getenv('DB_PASSWORD'),  # Obtém a senha do banco de dados da variável de ambiente
-    'database': os.getenv('DB_NAME', 'db_prep'),  # Obtém o nome do banco de dados da variável de ambiente
-    'port': int(os.getenv('DB_PORT', 3306)),  # Obtém a porta do banco de dados da variável de ambiente
-    'ssl_ca': os.getenv('SSL_CA_PATH')  # Caminho para o certificado SSL
-}
-
-
-# Função para conectar ao banco de dados
-def connect_db():
-    """Estabelece a conexão com o banco de dados usando as configurações fornecidas."""
-    try:
-        # Tenta estabelecer a conexão com o banco de dados usando mysql-connector-python
-        conn = mysql.connector.connect(**config)
-        if conn.is_connected():
-            return conn
-    except Error as err:
-        # Em caso de erro, imprime a mensagem de erro
-        print(f"Erro: {err}")
-        return None
-
-
-app = Flask(__name__)
-
+from datetime import date, timedelta
+from banco import ConexaoIndisponivel
+from paginacao import paginar, codificar_cursor
+import admissao
+import busca
+import comandos
+import estoque
+import expansao
+import idempotencia
+import imagens
+import esquema
+import metricas
+import mudancas
+import notificacoes
+import recursos
+import relatorios
+import respostas
+import senhas
+import serializacao
+from recursos import connect_db
+import rotas
+import rotas.carrinhos
+import rotas.clientes
+import rotas.pedidos
+import rotas.produtos
+import rotas.relatorios
+import rotas.status
+
+# Aquecimento do worker antes de aceitar tráfego (gunicorn.conf.py chama aquecer() depois do fork)
+AQUECER = os.getenv('AQUECER', '1') != '0'
+# Produtos mais vendidos nos últimos AQUECER_DIAS carregados no cache de leitura ao aquecer (0 = nenhum)
+AQUECER_PRODUTOS = int(os.getenv('AQUECER_PRODUTOS', 500))
+AQUECER_DIAS = int(os.getenv('AQUECER_DIAS', 30))
+
+MAIS_VENDIDOS = ("SELECT produto_id FROM tbl_resumo_vendas WHERE dia >= %s "
+                 "GROUP BY produto_id ORDER BY SUM(quantidade) DESC LIMIT %s")
+
+log = logging.getLogger(__name__)
+
+# Comandos do CLI (flask --app app <comando>), registrados sem grupo próprio
+operacao = Blueprint('operacao', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Cria a aplicação: lê a configuração, cria os recursos do processo e registra as blueprints.
+
+    Não abre conexões nem processos: o pool abre as conexões no primeiro uso
+    (ou em aquecer()), já no worker. Com gunicorn --preload a aplicação é
+    criada uma vez no processo mestre e herdada pelos workers no fork.
+    `config` vai para app.config; a chave BANCO sobrepõe a conexão do .cred
+    (host, user, password, database, port, ssl_ca).
+    """
+    app = Flask(__name__)
+    app.config.update(config or {})
+    recursos.configurar(app.config.get('BANCO'))
+
+    app.json = serializacao.ProvedorJSON(app)  # orjson, com a mesma saída do provedor padrão
+    metricas.instrumentar(app)
+    admissao.controlar(app)  # Limites por classe de rota, prazos e 503 com Retry-After
+    app.after_request(recursos.marcar_escrita)
+    app.teardown_request(recursos.devolver_reservada)
+    respostas.comprimir_respostas(app)  # Registrado depois das métricas: elas contam os bytes já comprimidos
+
+    for modulo in (rotas.status, rotas.clientes, rotas.produtos, rotas.carrinhos, rotas.pedidos, rotas.relatorios):
+        app.register_blueprint(modulo.bp)
+    app.register_blueprint(operacao)
+    return app
+
+
+def aquecer(app):
+    """Prepara o worker antes da primeira requisição; retorna o que cada etapa aqueceu.
+
+    Abre as conexões do pool com as leituras mais usadas já preparadas,
+    carrega no cache os produtos mais vendidos, inicia os processos de senha e
+    compila as rotas. Chamado depois do fork e antes do worker aceitar
+    conexões (gunicorn.conf.py). Uma etapa que falha só vai para o log: o
+    worker sobe frio, como sem o aquecimento.
+    """
+    aquecidos = {}
+    for nome, etapa in (('conexoes', aquecer_conexoes), ('produtos', aquecer_cache), ('senhas', senhas.aquecer)):
+        try:
+            aquecidos[nome] = etapa()
+        except Exception as err:
+            log.warning("aquecimento: etapa '%s' falhou: %s", nome, err)
+    app.url_map.update()  # Ordena e compila as regras agora, não na primeira requisição
+    return aquecidos
+
+
+def aquecer_conexoes():
+    """Abre todas as conexões do pool do primário e das réplicas e prepara nelas as leituras de comandos.AQUECER."""
+    abertas = 0
+    for pool in [recursos.pool] + [replica.pool for replica in recursos.roteador.replicas]:
+        conexoes = []  # Retiradas juntas: o pool é LIFO e devolveria sempre a mesma conexão
+        try:
+            for _ in range(pool.tamanho):
+                conn = pool.retirar(0)
+                if conn is None:
+                    break
+                conexoes.append(conn)
+                comandos.aquecer(conn)
+        finally:
+            for conn in conexoes:
+                conn.close()
+        abertas += len(conexoes)
+    return abertas
 
-@app.route('/', methods=['GET'])
-def index():
-    return {"status": "API em execução"}, 200
 
-@app.route('/clientes', methods=['POST'])
-def clientes():
-    conn = connect_db()
+def aquecer_cache():
+    """Carrega no cache de leitura os produtos mais vendidos (sem vendas no período, os primeiros ids)."""
+    if AQUECER_PRODUTOS <= 0:
+        return 0
+    conn = connect_db(primario=True, prazo=False)
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    dado_cliente = request.json
-    campos_obrigatorios = ['nome', 'email', 'cpf', 'senha']
-
-    for campo in campos_obrigatorios:
-        if campo not in dado_cliente:
-            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
-        
-    sql = "INSERT INTO tbl_clientes (nome, email, cpf, senha) VALUES (%s, %s, %s, %s)"
-    values = tuple(dado_cliente[campo] for campo in campos_obrigatorios)
-
+        raise ConexaoIndisponivel("Erro ao conectar com o banco de dados")
     try:
         with conn.cursor() as cursor:
-            cursor.execute(sql, values)
-            conn.commit()
-            return {"mensagem": "cliente cadastrado com sucesso"}, 201
-    except Error as err:
-        return {"erro": f"Erro ao cadastrar cliente: {err}"}, 500
-    finally:
-        conn.close()
-
-@app.route('/clientes/<int:id>', methods=['GET'])
-def procurar_clientes(id):
-    conn = connect_db()
-    if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql = "SELECT * FROM tbl_clientes WHERE id = %s"
-    try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, (id,))
-            cliente = cursor.fetchone()
-            if cliente:
-                return cliente, 200
-            return {"erro": "cliente não encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar cliente: {err}"}, 500
+            cursor.execute(MAIS_VENDIDOS, (date.today() - timedelta(days=AQUECER_DIAS), AQUECER_PRODUTOS))
+            ids = [linha[0] for linha in cursor.fetchall()]
+            if not ids:
+                cursor.execute("SELECT id FROM tbl_produtos ORDER BY id LIMIT %s", (AQUECER_PRODUTOS,))
+                ids = [linha[0] for linha in cursor.fetchall()]
     finally:
         conn.close()
+    carregados = 0
+    for inicio in range(0, len(ids), rotas.MULTI_GET_MAXIMO):
+        parte = ids[inicio:inicio + rotas.MULTI_GET_MAXIMO]
+        carregados += len(recursos.cache_produtos.obter_varios(parte, rotas.produtos.buscar_produtos))
+    return carregados
 
-@app.route('/clientes', methods=['GET'])
-def listar_clientes():
-    conn = connect_db()
-    if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    filtro_nome = request.args.get('nome')
-    ordenar_por = request.args.get('ordenar_por', 'id')
-    ordem = request.args.get('ordem', 'asc')
 
-    sql = "SELECT * FROM tbl_clientes"
-    params = []
-
-    if filtro_nome:
-        sql += " WHERE nome LIKE %s"
-        params.append(f"%{filtro_nome}%")
-
-    if ordenar_por not in ['id', 'nome', 'email', 'cpf', 'senha']:
-        ordenar_por = 'id'
-    if ordem not in ['asc', 'desc']:
-        ordem = 'asc'
-
-    sql += f" ORDER BY {ordenar_por} {ordem}"
-
-    try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, params)
-            clientes = cursor.fetchall()
-            if clientes:
-                return {"clientes": clientes}, 200
-            return {"erro": "Nenhum cliente encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar clientes: {err}"}, 500
-    finally:
-        conn.close()
+def __getattr__(nome):
+    # `app` é criada no primeiro acesso (gunicorn app:app, flask --app app, benchmarks), não na importação
+    if nome == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 
-@app.route('/clientes/<int:cliente_id>', methods=['PUT'])
-def atualizar_cliente(cliente_id):
+@operacao.cli.command('expirar-reservas')
+def expirar_reservas():
+    """Remove carrinhos abandonados e devolve o estoque reservado (rodar periodicamente, ex.: cron)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    dado_cliente = request.json
-    campos_obrigatorios = ['nome', 'email', 'cpf', 'senha']
-
-    for campo in campos_obrigatorios:
-        if campo not in dado_cliente:
-            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
-
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT * FROM tbl_clientes WHERE id = %s", (cliente_id,))
-            cliente_atual = cursor.fetchone()
-
-            if not cliente_atual:
-                return {"erro": "cliente não encontrado!"}, 404
-
-            sql = "UPDATE tbl_clientes SET nome = %s, email = %s, cpf = %s, senha = %s WHERE id = %s"
-            values = tuple(dado_cliente[campo] for campo in campos_obrigatorios) + (cliente_id,)
-
-            cursor.execute(sql, values)
-            conn.commit()
-
-            return {"mensagem": "cliente atualizado com sucesso!"}, 200
-
-    except Error as err:
-        return {"erro": f"Erro ao atualizar cliente: {err}"}, 500
+        removidos, produtos_afetados = estoque.expirar_reservas(conn)
+        recursos.cache_produtos.invalidar(*produtos_afetados)
+        click.echo(f"{removidos} carrinho(s) abandonado(s) removido(s)")
     finally:
         conn.close()
 
-@app.route('/clientes/<int:cliente_id>', methods=['DELETE'])
-def delete_cliente(cliente_id):
+@operacao.cli.command('limpar-idempotencia')
+def limpar_idempotencia():
+    """Apaga as chaves de idempotência vencidas (rodar periodicamente, ex.: cron)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql_remove = "DELETE FROM tbl_clientes WHERE id = %s"
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM tbl_clientes WHERE id = %s", (cliente_id,))
-            if cursor.fetchone():
-                cursor.execute(sql_remove, (cliente_id,))
-                conn.commit()
-                return {"mensagem": "cliente removido com sucesso"}, 200
-            return {"erro": "cliente não encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar cliente: {err}"}, 500
+        click.echo(f"{idempotencia.limpar(conn)} chave(s) vencida(s) removida(s)")
     finally:
         conn.close()
-    
-@app.route('/produtos', methods=['POST'])
-def produtos():
 
-    # conectar colm a base
-    conn = connect_db()
-    produto_id = None
-
-    if conn is None:
-        resp = {"erro": "Erro ao conectar com o banco de dados"}
-        return resp, 500
-    
-    dado_produto = request.json
-    cursor = conn.cursor(dictionary=True)
-    sql = "INSERT INTO tbl_produtos (nome, descrição, preco, qtd_em_estoque, fornecedor_id, custo_no_fornecedor) VALUES (%s, %s, %s, %s, %s,%s)"
-    values = (dado_produto['nome'], dado_produto['descrição'], dado_produto['preco'], dado_produto['qtd_em_estoque'], dado_produto['fornecedor_id'], dado_produto['custo_no_fornecedor'])
-    cursor.execute(sql, values)
-    conn.commit()
-
-    produto_id = cursor.lastrowid
-    resp = "produto cadastrado com sucesso"
-
-    cursor.close()
-    conn.close()
-
-    return resp, 201
-
-@app.route('/produtos/<int:id>', methods=['GET'])
-def procurar_produtos(id):
-    """Busca um produto específico na tabela tbl_produtos pelo seu ID."""
-    conn = connect_db()  # Conecta ao banco de dados
-    if conn:
-        cursor = conn.cursor(dictionary=True)  # Adicionei dictionary=True para o retorno ser um dicionário
-        sql = "SELECT * FROM tbl_produtos WHERE id = %s"  # Comando SQL para buscar um produto pelo ID
-
-        try:
-            # Executa o comando SQL com o ID fornecido
-            cursor.execute(sql, (id,))
-            # Recupera o resultado da consulta
-            produto = cursor.fetchone()
-
-            # Verifica se o produto foi encontrado e retorna os detalhes como JSON
-            if produto:
-                resp = {"id": produto['id'], "nome": produto['nome'], "descrição": produto['descrição'], "preco": produto['preco'],"qtd_em_estoque": produto['qtd_em_estoque'],"fornecedor_id": produto['fornecedor_id'],"custo_no_fornecedor":produto['custo_no_fornecedor']}
-                return resp, 200  # Retorna o produto encontrado e o código de status 200 (OK)
-            else:
-                return {"erro": "produto não encontrado"}, 404  # Retorna uma mensagem de erro se não encontrar o produto
-        except Error as err:
-            # Em caso de erro na busca, retorna uma mensagem de erro
-            return {"erro": f"Erro ao buscar produto: {err}"}, 500
-        finally:
-            # Fecha o cursor e a conexão para liberar recursos
-            cursor.close()
-            conn.close()
-    else:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-@app.route('/produtos', methods=['GET'])
-def listar_produto():
-    """Busca e exibe todos os produtos da tabela tbl_produtos."""
-    conn = connect_db()  # Conecta ao banco de dados
-    if conn:
-        cursor = conn.cursor(dictionary=True)  # Cria um cursor para executar comandos SQL e retorna resultados como dicionários
-        sql = "SELECT * FROM tbl_produtos"  # Comando SQL para selecionar todos os produtos
-
-        try:
-            cursor.execute(sql)  # Executa o comando SQL sem parâmetros
-            produtos = cursor.fetchall()  # Recupera todos os resultados da consulta
-
-            # Verifica se encontrou produtos e retorna a lista
-            if produtos:
-                return {"produtos": produtos}, 200  # Retorna a lista de produtos como JSON
-            else:
-                return {"erro": "Nenhum produto encontrado"}, 404  # Retorna uma mensagem de erro se não encontrar produtos
-        except Error as err:
-            # Em caso de erro na busca, retorna uma mensagem de erro
-            return {"erro": f"Erro ao buscar produtos: {err}"}, 500
-        finally:
-            # Fecha o cursor e a conexão para liberar recursos
-            cursor.close()
-            conn.close()
-    else:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-@app.route('/produtos/<int:produto_id>', methods=['PUT'])
-def atualizar_produto(produto_id):
-    """Atualiza os dados de um produto existente na tabela tbl_produtos."""
-    conn = connect_db()  # Conecta ao banco de dados
-    if conn:
-        cursor = conn.cursor()  # Cria um cursor para executar comandos SQL
-        dado_produto = request.json  # Obtém os dados enviados no corpo da requisição
-
-        # Verifica se os dados 'nome' e 'ano' estão no JSON recebido
-        if 'nome' not in dado_produto or 'descrição' not in dado_produto or 'preco' not in dado_produto or 'qtd_em_estoque' not in dado_produto or 'fornecedor_id' not in dado_produto or 'custo_no_fornecedor' not in dado_produto:
-            return {"erro": "Dados inválidos, verifique se os dados necessários foram fornecidos"}, 400
-
-        sql = "UPDATE tbl_produtos SET nome = %s, descrição = %s, preco = %s, qtd_em_estoque = %s, fornecedor_id = %s, custo_no_fornecedor = %s WHERE id = %s"  # Comando SQL para atualizar o produto
-        values = (dado_produto['nome'], dado_produto['descrição'], dado_produto['preco'], dado_produto['qtd_em_estoque'], dado_produto['fornecedor_id'], dado_produto['custo_no_fornecedor'], produto_id)  # Dados a serem atualizados
-
-        try:
-            # Executa o comando SQL com os valores fornecidos
-            cursor.execute(sql, values)
-            # Confirma a transação no banco de dados
-            conn.commit()
-
-            # Verifica se alguma linha foi afetada (atualizada)
-            if cursor.rowcount > 0:
-                return {"mensagem": "produto atualizado com sucesso!"}, 200
-            else:
-                return {"erro": "produto não encontrado!"}, 404
-        except Error as err:
-            # Em caso de erro na atualização, retorna a mensagem de erro
-            return {"erro": f"Erro ao atualizar produto: {err}"}, 500
-        finally:
-            # Fecha o cursor e a conexão para liberar recursos
-            cursor.close()
-            conn.close()
-    else:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-    
-@app.route('/produtos/<int:produto_id>', methods=['DELETE'])
-def delete_produto(produto_id):
-    """Remove um usuário da tabela tbl_produtos e suas referências em outras tabelas."""    
-    conn = connect_db()  # Conecta ao banco de dados
-
-    if conn:
-        cursor = conn.cursor(dictionary=True)  # Adiciona dictionary=True para retorno como dicionário
-
-        # Comando SQL para buscar um usuário pelo ID
-        sql_select = "SELECT * FROM tbl_produtos WHERE id = %s"
-        # Comando SQL para remover o usuário
-        sql_remove_produto = "DELETE FROM tbl_produtos WHERE id = %s"
-
-        try:
-            # Executa o comando SQL com o ID fornecido
-            cursor.execute(sql_select, (produto_id,))
-            produto = cursor.fetchone()
-
-            # Verifica se o usuário foi encontrado
-            if produto:
-                # Remove o usuário
-                cursor.execute(sql_remove_produto, (produto_id,))
-                conn.commit()
-
-                resp = {"mensagem": "produto removido com sucesso"}
-                return resp, 200  # Retorna mensagem de sucesso e o código de status 200 (OK)
-            else:
-                return {"erro": "produto não encontrado"}, 404  # Retorna mensagem de erro se não encontrar o usuário
-        except Error as err:
-            # Em caso de erro, retorna uma mensagem de erro
-            return {"erro": f"Erro ao buscar produto: {err}"}, 500
-        finally:
-            # Fecha o cursor e a conexão para liberar recursos
-            cursor.close()
-            conn.close()
-    else:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    
-@app.route('/carrinhos', methods=['POST'])
-def carrinhos():
+@operacao.cli.command('limpar-mudancas')
+def limpar_mudancas():
+    """Apaga do registro de mudanças o que passou de MUDANCAS_RETENCAO_DIAS (rodar periodicamente, ex.: cron)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    dado_carrinho = request.json
-    if 'produto_id' not in dado_carrinho or 'quantidade' not in dado_carrinho or 'cliente_id' not in dado_carrinho:
-        return {"erro": "Dados inválidos"}, 400
-
-    # Verificar a quantidade em estoque
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT qtd_em_estoque FROM tbl_produtos WHERE id = %s", (dado_carrinho['produto_id'],))
-            produto = cursor.fetchone()
-
-            if not produto:
-                return {"erro": "Produto não encontrado"}, 404
-
-            qtd_em_estoque = produto['qtd_em_estoque']  # Altere 'qtd_em_estoque' se necessário
-            if dado_carrinho['quantidade'] > qtd_em_estoque:
-                return {"erro": "Quantidade solicitada excede o qtd_em_estoque disponível"}, 400
-
-            # Inserir no carrinho
-            sql = "INSERT INTO tbl_carrinhos (produto_id, quantidade, cliente_id) VALUES (%s, %s, %s)"
-            values = (dado_carrinho['produto_id'], dado_carrinho['quantidade'], dado_carrinho['cliente_id'])
-            cursor.execute(sql, values)
-
-            # Atualizar o qtd_em_estoque do produto
-            novo_qtd_em_estoque = qtd_em_estoque - dado_carrinho['quantidade']
-            cursor.execute("UPDATE tbl_produtos SET qtd_em_estoque = %s WHERE id = %s", (novo_qtd_em_estoque, dado_carrinho['produto_id']))
-
-            conn.commit()
-            return {"mensagem": "Carrinho cadastrado com sucesso"}, 201
-
-    except Error as err:
-        return {"erro": f"Erro ao processar o carrinho: {err}"}, 500
+        click.echo(f"{mudancas.limpar(conn)} mudança(s) antiga(s) removida(s)")
     finally:
         conn.close()
 
-
-@app.route('/carrinhos/<int:id>', methods=['GET'])
-def procurar_carrinhos(id):
+@operacao.cli.command('gerar-miniaturas')
+def gerar_miniaturas():
+    """Gera as miniaturas que faltam (imagens enviadas com a fila cheia ou antes de mudar IMAGEM_MINIATURAS)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql = "SELECT * FROM tbl_carrinhos WHERE id = %s"
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, (id,))
-            carrinho = cursor.fetchone()
-            if carrinho:
-                return carrinho, 200
-            return {"erro": "carrinho não encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar carrinho: {err}"}, 500
+        futuros = imagens.gerar_pendentes(conn)
+    except RuntimeError as err:
+        raise click.ClickException(str(err))
     finally:
         conn.close()
-
-@app.route('/carrinhos', methods=['GET'])
-def listar_carrinhos():
+    geradas = erros = 0
+    for futuro in futuros:
+        try:
+            geradas += futuro.result()
+        except Exception as err:
+            erros += 1
+            click.echo(f"erro: {err}", err=True)
+    click.echo(f"{geradas} miniatura(s) gerada(s) de {len(futuros)} imagem(ns), {erros} erro(s)")
+
+@operacao.cli.command('limpar-imagens')
+def limpar_imagens():
+    """Apaga os arquivos de imagens que nenhum produto usa mais (rodar periodicamente, ex.: cron)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    filtro_produto_id = request.args.get('produto_id')
-    ordenar_por = request.args.get('ordenar_por', 'id')
-    ordem = request.args.get('ordem', 'asc')
-
-    sql = "SELECT * FROM tbl_carrinhos"
-    params = []
-
-    if filtro_produto_id:
-        sql += " WHERE produto_id LIKE %s"
-        params.append(f"%{filtro_produto_id}%")
-
-    if ordenar_por not in ['id', 'produto_id', 'quantidade']:
-        ordenar_por = 'id'
-    if ordem not in ['asc', 'desc']:
-        ordem = 'asc'
-
-    sql += f" ORDER BY {ordenar_por} {ordem}"
-
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, params)
-            carrinhos = cursor.fetchall()
-            if carrinhos:
-                return {"carrinhos": carrinhos}, 200
-            return {"erro": "Nenhum carrinho encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar carrinhos: {err}"}, 500
+        click.echo(f"{imagens.limpar(conn)} imagem(ns) sem uso removida(s)")
     finally:
         conn.close()
 
+@operacao.cli.command('despachar-notificacoes')
+@click.option('--uma-vez', is_flag=True, help='Esvazia a fila uma vez e termina (ex.: cron).')
+@click.option('--lote', type=int, default=None, help='Notificações por lote (padrão: NOTIFICACOES_LOTE).')
+@click.option('--porta-metricas', type=int, default=None, help='Expõe as métricas do despachante nesta porta.')
+def despachar_notificacoes(uma_vez, lote, porta_metricas):
+    """Envia os emails da fila de notificações, com novas tentativas em backoff (processo contínuo)."""
+    conectar = lambda: connect_db(prazo=False)
+    if uma_vez:
+        conn = conectar()
+        if not conn:
+            raise click.ClickException("Erro ao conectar com o banco de dados")
+        total = 0
+        try:
+            with notificacoes.EnvioSMTP() as envio:
+                while True:
+                    lidas = notificacoes.despachar_lote(conn, envio, lote)
+                    total += lidas
+                    if lidas < (lote or notificacoes.LOTE):
+                        break
+        finally:
+            conn.close()
+        click.echo(f"{total} notificação(ões) processada(s)")
+        return
 
-@app.route('/carrinhos/<int:carrinho_id>', methods=['PUT'])
-def atualizar_carrinho(carrinho_id):
-    conn = connect_db()
-    if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    dado_carrinho = request.json
-    if 'produto_id' not in dado_carrinho or 'quantidade' not in dado_carrinho:
-        return {"erro": "Dados inválidos"}, 400
-
+    if porta_metricas:
+        metricas.servir(porta_metricas)
+    click.echo("Despachando notificações (Ctrl+C para parar)")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT * FROM tbl_carrinhos WHERE id = %s", (carrinho_id,))
-            carrinho_atual = cursor.fetchone()
-
-            if not carrinho_atual:
-                return {"erro": "carrinho não encontrado!"}, 404
-
-            sql = "UPDATE tbl_carrinhos SET produto_id = %s, quantidade = %s WHERE id = %s"
-            values = (dado_carrinho['produto_id'], dado_carrinho['quantidade'], carrinho_id)
-
-            cursor.execute(sql, values)
-            conn.commit()
-
-            return {"mensagem": "carrinho atualizado com sucesso!"}, 200
-
-    except Error as err:
-        return {"erro": f"Erro ao atualizar carrinho: {err}"}, 500
-    finally:
-        conn.close()
-
-@app.route('/carrinhos/<int:carrinho_id>', methods=['DELETE'])
-def delete_carrinho(carrinho_id):
-    conn = connect_db()
+        notificacoes.executar(conectar, limite=lote)
+    except KeyboardInterrupt:
+        pass
+
+@operacao.cli.command('reconstruir-relatorios')
+@click.option('--lote', type=int, default=None, help='Pedidos por transação (padrão: RELATORIOS_LOTE).')
+def reconstruir_relatorios(lote):
+    """Refaz os resumos de vendas a partir dos pedidos (carga inicial ou acerto após mudanças diretas no banco)."""
+    conn = connect_db(prazo=False)
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql_remove = "DELETE FROM tbl_carrinhos WHERE id = %s"
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM tbl_carrinhos WHERE id = %s", (carrinho_id,))
-            if cursor.fetchone():
-                cursor.execute(sql_remove, (carrinho_id,))
-                conn.commit()
-                return {"mensagem": "carrinho removido com sucesso"}, 200
-            return {"erro": "carrinho não encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar carrinho: {err}"}, 500
+        novas, grupos = relatorios.reconstruir(conn, lote)
+        click.echo(f"{novas} venda(s) registrada(s), {grupos} grupo(s) no resumo")
     finally:
         conn.close()
 
-@app.route('/carrinhos/cliente/<int:cliente_id>', methods=['GET'])
-def listar_carrinhos_cliente(cliente_id):
+@operacao.cli.command('fragmentar-estoque')
+@click.argument('produto_id', type=int)
+@click.option('--fragmentos', type=int, default=None, help='Número de fragmentos (padrão: ESTOQUE_FRAGMENTOS).')
+def fragmentar_estoque(produto_id, fragmentos):
+    """Divide o estoque de um produto muito disputado em fragmentos."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql = "SELECT * FROM tbl_carrinhos WHERE cliente_id = %s"
-    
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, (cliente_id,))
-            carrinho = cursor.fetchall()
-            if carrinho:
-                return {"carrinho": carrinho}, 200
-            return {"erro": "Nenhum carrinho encontrado para este cliente"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar carrinho do cliente: {err}"}, 500
+        if not estoque.fragmentar(conn, produto_id, fragmentos):
+            raise click.ClickException("produto não encontrado")
+        recursos.cache_produtos.invalidar(produto_id)
     finally:
         conn.close()
 
-@app.route('/pedidos', methods=['POST'])
-def pedidos():
+@operacao.cli.command('consolidar-estoque')
+@click.argument('produto_id', type=int)
+def consolidar_estoque(produto_id):
+    """Junta de volta em tbl_produtos o estoque fragmentado de um produto."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    dado_pedido = request.json
-    campos_obrigatorios = ['cliente_id', 'carrinho_id', 'data_hora', 'status']
-
-    for campo in campos_obrigatorios:
-        if campo not in dado_pedido:
-            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
-        
-    sql = "INSERT INTO tbl_pedidos (cliente_id, carrinho_id, data_hora, status) VALUES (%s, %s, %s, %s)"
-    values = tuple(dado_pedido[campo] for campo in campos_obrigatorios)
-
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(sql, values)
-            conn.commit()
-            return {"mensagem": "pedido cadastrado com sucesso"}, 201
-    except Error as err:
-        return {"erro": f"Erro ao cadastrar pedido: {err}"}, 500
+        estoque.consolidar(conn, produto_id)
+        recursos.cache_produtos.invalidar(produto_id)
     finally:
         conn.close()
 
-@app.route('/pedidos/<int:id>', methods=['GET'])
-def procurar_pedidos(id):
+@operacao.cli.command('reindexar-busca')
+@click.option('--tabela', type=click.Choice(sorted(busca.INDEXADAS)), default=None, help='Padrão: todas as tabelas pesquisáveis.')
+def reindexar_busca(tabela):
+    """Reconstrói o índice de busca por nome (ex.: depois de uma carga feita direto no banco)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql = "SELECT * FROM tbl_pedidos WHERE id = %s"
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, (id,))
-            pedido = cursor.fetchone()
-            if pedido:
-                return pedido, 200
-            return {"erro": "pedido não encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar pedido: {err}"}, 500
+        for nome in [tabela] if tabela else sorted(busca.INDEXADAS):
+            click.echo(f"{nome}: {busca.reindexar(conn, nome)} registros indexados")
     finally:
         conn.close()
 
-@app.route('/pedidos', methods=['GET'])
-def listar_pedidos():
+@operacao.cli.command('migrar')
+@click.option('--ate', type=int, default=None, help='Aplica somente até esta versão.')
+@click.option('--status', is_flag=True, help='Só lista as migrações aplicadas e pendentes.')
+def migrar(ate, status):
+    """Cria/atualiza as tabelas e índices do banco (migrações versionadas de esquema.py)."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    filtro_cliente_id = request.args.get('cliente_id')
-    filtro_carrinho_id = request.args.get('carrinho_id')
-    ordenar_por = request.args.get('ordenar_por', 'id')
-    ordem = request.args.get('ordem', 'asc')
-
-    sql = "SELECT * FROM tbl_pedidos"
-    params = []
-
-    if filtro_cliente_id:
-        sql += " WHERE nome LIKE %s"
-        params.append(f"%{filtro_cliente_id}%")
-
-    if filtro_carrinho_id:
-        sql += " WHERE nome LIKE %s"
-        params.append(f"%{filtro_carrinho_id}%")
-
-    if ordenar_por not in ['id', 'cliente_id', 'carrinho_id', 'data_hora', 'status']:
-        ordenar_por = 'id'
-    if ordem not in ['asc', 'desc']:
-        ordem = 'asc'
-
-    sql += f" ORDER BY {ordenar_por} {ordem}"
-
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, params)
-            pedidos = cursor.fetchall()
-            if pedidos:
-                return {"pedidos": pedidos}, 200
-            return {"erro": "Nenhum pedido encontrado"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar pedidos: {err}"}, 500
+        if status:
+            aplicadas = esquema.versoes_aplicadas(conn)
+            for versao, descricao, _ in esquema.MIGRACOES:
+                click.echo(f"{versao:>4}  {'aplicada' if versao in aplicadas else 'pendente':<9} {descricao}")
+            return
+        aplicadas = esquema.migrar(conn, ate, ao_aplicar=lambda versao, descricao: click.echo(f"aplicando {versao}: {descricao}"))
+        click.echo(f"{len(aplicadas)} migração(ões) aplicada(s)" if aplicadas else "esquema já está atualizado")
     finally:
         conn.close()
 
-@app.route('/pedidos/cliente/<int:cliente_id>', methods=['GET'])
-def listar_pedidos_cliente(cliente_id):
+def consultas_das_rotas():
+    """Uma consulta de cada formato usado pelas rotas, montada pelas mesmas funções das rotas.
+
+    Retorna [(descrição, sql, params, problemas esperados)] para esquema.analisar().
+    Os esperados são formatos que nenhum índice B-tree resolve (LIKE '%x%',
+    ranking da busca) ou colunas que não vale indexar.
+    """
+    consultas = []
+
+    def listagem(rota, tabela, filtros, args, esperados=()):
+        condicoes, params, ordenar_por, ordem = filtros(args)
+        args = dict(args, apos=codificar_cursor(ordenar_por, 1 if ordenar_por.endswith('id') else 'a', 1))
+        sql, params, _ = paginar(f"SELECT * FROM {tabela}", condicoes, params, ordenar_por, ordem, args)
+        consultas.append((f"GET {rota}?{'&'.join(f'{k}={v}' for k, v in args.items() if k != 'apos')}", sql, params, set(esperados)))
+
+    consultas.append(("GET /clientes/<id>", comandos.CLIENTE_POR_ID, [1], set()))
+    consultas.append(("GET /clientes?ids=", "SELECT * FROM tbl_clientes WHERE id IN (%s, %s, %s)", [1, 2, 3], set()))
+    for ordenar_por in ['id', 'nome', 'email', 'cpf']:
+        listagem('/clientes', 'tbl_clientes', rotas.clientes.filtros_clientes, {'ordenar_por': ordenar_por})
+    listagem('/clientes', 'tbl_clientes', rotas.clientes.filtros_clientes, {'ordenar_por': 'senha'}, ['varredura', 'filesort'])
+    listagem('/clientes', 'tbl_clientes', rotas.clientes.filtros_clientes, {'nome': 'silva'}, ['varredura'])
+
+    consultas.append(("GET /produtos/<id>", comandos.PRODUTO_POR_ID, [1], set()))
+    consultas.append(("GET /produtos?ids=", "SELECT * FROM tbl_produtos WHERE id IN (%s, %s, %s)", [1, 2, 3], set()))
+    sql, params, _ = paginar("SELECT * FROM tbl_produtos", [], [], 'id', 'asc', {'apos': codificar_cursor('id', 1, 1)})
+    consultas.append(("GET /produtos", sql, params, set()))
+
+    for tabela, colunas, rota in [('tbl_produtos', expansao.COLUNAS_PRODUTO, '/produtos/busca'),
+                                  ('tbl_clientes', expansao.COLUNAS_CLIENTE, '/clientes/busca')]:
+        sql, params, *_ = busca.consulta(tabela, colunas, {'q': 'silva'})
+        # O ranking ordena pelo total de acertos, calculado na hora: sempre agrupa e ordena os candidatos
+        consultas.append((f"GET {rota}?q=", sql, params, {'varredura', 'temporaria', 'filesort'}))
+
+    consultas.append(("GET /carrinhos/<id>", comandos.CARRINHO_POR_ID, [1], set()))
+    consultas.append(("GET /carrinhos/cliente/<id>", "SELECT * FROM tbl_carrinhos WHERE cliente_id = %s", [1], set()))
+    for ordenar_por in ['id', 'produto_id', 'quantidade']:
+        listagem('/carrinhos', 'tbl_carrinhos', rotas.carrinhos.filtros_carrinhos, {'ordenar_por': ordenar_por})
+    listagem('/carrinhos', 'tbl_carrinhos', rotas.carrinhos.filtros_carrinhos, {'produto_id': '1'})
+    # Poucos itens por produto: ordenar o resultado do filtro em memória é barato
+    listagem('/carrinhos', 'tbl_carrinhos', rotas.carrinhos.filtros_carrinhos, {'produto_id': '1', 'ordenar_por': 'quantidade'}, ['filesort'])
+
+    consultas.append(("GET /pedidos/<id>?expandir=cliente,produtos", expansao.consulta_pedido(set(expansao.RELACOES)), [1], set()))
+    consultas.append(("GET /pedidos/cliente/<id>", "SELECT * FROM tbl_pedidos WHERE cliente_id = %s", [1], set()))
+    for ordenar_por in ['id', 'cliente_id', 'carrinho_id', 'data_hora', 'status']:
+        listagem('/pedidos', 'tbl_pedidos', rotas.pedidos.filtros_pedidos, {'ordenar_por': ordenar_por})
+    listagem('/pedidos', 'tbl_pedidos', rotas.pedidos.filtros_pedidos, {'cliente_id': '1'})
+    listagem('/pedidos', 'tbl_pedidos', rotas.pedidos.filtros_pedidos, {'carrinho_id': '1'})
+    listagem('/pedidos', 'tbl_pedidos', rotas.pedidos.filtros_pedidos, {'cliente_id': '1', 'ordenar_por': 'data_hora'})
+
+    for feed, tabela in mudancas.FEEDS.items():
+        consultas.append((f"GET /{feed}/mudancas", mudancas.PAGINA, [tabela, 1, 101], set()))
+        consultas.append((f"GET /{feed} (versão do ETag)", mudancas.ULTIMA_MUDANCA, [tabela], set()))
+        consultas.append((f"GET /{feed} (versão do ETag, recentes)", mudancas.MUDANCAS_RECENTES, [tabela, 0], set()))
+    consultas.append(("GET /<recurso>/mudancas (publicação)", mudancas.NAO_PUBLICADAS, [mudancas.PUBLICAR_LOTE], set()))
+
+    consultas.append(("aquecimento: produtos mais vendidos", MAIS_VENDIDOS, ['2024-01-01', AQUECER_PRODUTOS],
+                      {'temporaria', 'filesort'}))
+    consultas.append(("flask expirar-reservas",
+                      "SELECT carrinho_id FROM tbl_reservas WHERE expira_em <= %s ORDER BY expira_em LIMIT %s",
+                      ['2024-01-01 00:00:00', 500], set()))
+
+    # Relatórios: agrupam e ordenam em memória, mas só os grupos do resumo (não os pedidos)
+    for agrupar in relatorios.AGRUPAMENTOS:
+        sql, _, params, limite = relatorios.consulta({'agrupar': agrupar, 'de': '2024-01-01', 'ate': '2024-01-31'}, True)
+        consultas.append((f"GET /relatorios/margem?agrupar={agrupar}", sql, params + [limite],
+                          {'varredura', 'filesort', 'temporaria'}))
+    return consultas
+
+@operacao.cli.command('analisar-consultas')
+@click.option('--estrito', is_flag=True, help='Termina com erro se houver problema não esperado.')
+def analisar_consultas(estrito):
+    """Roda EXPLAIN nas consultas das rotas e aponta varreduras completas e filesorts."""
     conn = connect_db()
     if not conn:
-        return {"erro": "Erro ao conectar com o banco de dados"}, 500
-
-    sql = "SELECT * FROM tbl_pedidos WHERE cliente_id = %s"
-    
+        raise click.ClickException("Erro ao conectar com o banco de dados")
     try:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute(sql, (cliente_id,))
-            pedidos = cursor.fetchall()
-            if pedidos:
-                return {"pedidos": pedidos}, 200
-            return {"erro": "Nenhum pedido encontrado para este cliente"}, 404
-    except Error as err:
-        return {"erro": f"Erro ao buscar pedidos do cliente: {err}"}, 500
+        consultas = consultas_das_rotas()
+        achados = esquema.analisar(conn, consultas)
     finally:
         conn.close()
 
+    for descricao, tabela, problema, linhas, esperado in achados:
+        estimativa = f" (~{linhas} linhas)" if linhas is not None else ""
+        click.echo(f"{'esperado' if esperado else 'PROBLEMA':<9} {problema:<11} {tabela or '-':<22} {descricao}{estimativa}")
+    inesperados = [achado for achado in achados if not achado[4]]
+    click.echo(f"{len(consultas)} consultas analisadas, {len(inesperados)} problema(s) não esperado(s)")
+    if estrito and inesperados:
+        raise SystemExit(1)
+
 if __name__ == '__main__':
-      
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
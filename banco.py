@@ -0,0 +1,214 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from mysql.connector import Error
+
+import metricas
+
+log = logging.getLogger(__name__)
+
+
+class ConexaoIndisponivel(Exception):
+    """Nenhuma conexão com o banco pôde ser obtida (pool esgotado ou banco fora do ar)."""
+
+
+class ConexaoDoPool:
+    """Envolve uma conexão do pool: close() devolve a conexão ao pool em vez de fechá-la."""
+
+    def __init__(self, pool, conn, criada_em):
+        self._pool = pool
+        self._conn = conn
+        self.criada_em = criada_em
+        self._devolvida = False
+
+    def __getattr__(self, nome):
+        # Repassa commit(), rollback() etc. para a conexão real
+        return getattr(self._conn, nome)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        if self._pool.cursor_preparavel is not None:
+            cursor = self._pool.cursor_preparavel(self, cursor, kwargs.get('dictionary', False))
+        if self._pool.envolver_cursor is not None:
+            return self._pool.envolver_cursor(cursor)
+        return cursor
+
+    def preparado(self, sql, dictionary=False):
+        """Cursor com `sql` preparado nesta conexão física, criado na primeira vez; retorna (cursor, novo)."""
+        return self._pool.preparado(self._conn, sql, dictionary)
+
+    def close(self):
+        """Devolve a conexão ao pool (pode ser chamada mais de uma vez)."""
+        if self._devolvida:
+            return
+        self._devolvida = True
+        self._pool.devolver(self)
+
+    def descartar(self):
+        """Fecha a conexão real em vez de devolvê-la (ex.: resultado não lido por completo)."""
+        if self._devolvida:
+            return
+        self._devolvida = True
+        self._pool.descartar(self)
+
+
+class PoolConexoes:
+    """Pool de conexões limitado, com verificação na retirada e reciclagem de conexões antigas.
+
+    O pool é criado por processo: após um fork (workers do gunicorn) as conexões
+    herdadas do processo pai são descartadas e o pool recomeça vazio.
+    """
+
+    def __init__(self, fabrica, tamanho=5, espera_maxima=5.0, reciclar_apos=1800, verificar_apos=30):
+        self.fabrica = fabrica  # Função que abre uma nova conexão com o banco
+        self.tamanho = tamanho  # Número máximo de conexões abertas por worker
+        self.espera_maxima = espera_maxima  # Segundos que uma requisição aguarda por uma conexão livre
+        self.reciclar_apos = reciclar_apos  # Idade máxima (segundos) de uma conexão antes de ser reaberta
+        self.verificar_apos = verificar_apos  # Conexões ociosas há mais tempo que isso recebem ping na retirada
+        self.envolver_cursor = None  # Opcional: função aplicada a cada cursor criado (ex.: instrumentação)
+        self.cursor_preparavel = None  # Opcional: (conexão, cursor, dictionary) -> cursor que usa statements preparados
+        self._iniciar()
+
+    def _iniciar(self):
+        self._pid = os.getpid()
+        self._ociosas = queue.LifoQueue()  # LIFO mantém quentes as conexões usadas mais recentemente
+        self._vagas = threading.BoundedSemaphore(self.tamanho)
+        self._lock = threading.Lock()
+        self._em_uso = 0
+        self._preparados = {}  # id da conexão física -> {(sql, dictionary): cursor preparado}
+        self._stats = {
+            'retiradas': 0,
+            'timeouts': 0,
+            'criadas': 0,
+            'recicladas': 0,
+            'descartadas': 0,
+            'espera_total': 0.0,
+            'espera_maxima': 0.0,
+        }
+
+    def _verificar_fork(self):
+        if self._pid != os.getpid():
+            # Conexões herdadas do processo pai não podem ser compartilhadas
+            self._iniciar()
+
+    def retirar(self, timeout=None):
+        """Retira uma conexão do pool, aguardando no máximo `timeout` segundos.
+
+        Retorna None se nenhuma conexão ficar livre a tempo ou se o banco estiver indisponível.
+        """
+        self._verificar_fork()
+        if timeout is None:
+            timeout = self.espera_maxima
+
+        inicio = time.monotonic()
+        obteve = self._vagas.acquire(timeout=timeout)
+        espera = time.monotonic() - inicio
+
+        with self._lock:
+            self._stats['espera_total'] += espera
+            self._stats['espera_maxima'] = max(self._stats['espera_maxima'], espera)
+            if not obteve:
+                self._stats['timeouts'] += 1
+                return None
+            self._stats['retiradas'] += 1
+            self._em_uso += 1
+
+        try:
+            conn, criada_em = self._conexao_saudavel()
+        except Error as err:
+            log.error("Erro ao abrir conexão com o banco: %s", err)
+            metricas.registro.incrementar('db_erros_conexao_total', (('errno', str(err.errno)),))
+            self._liberar_vaga()
+            return None
+        return ConexaoDoPool(self, conn, criada_em)
+
+    def _conexao_saudavel(self):
+        """Reaproveita uma conexão ociosa válida ou abre uma nova."""
+        agora = time.monotonic()
+        while True:
+            try:
+                conn, criada_em, devolvida_em = self._ociosas.get_nowait()
+            except queue.Empty:
+                break
+
+            if agora - criada_em > self.reciclar_apos:
+                self._descartar(conn, 'recicladas')
+                continue
+            if agora - devolvida_em > self.verificar_apos:
+                try:
+                    conn.ping(reconnect=False)
+                except Error:
+                    self._descartar(conn, 'descartadas')
+                    continue
+            return conn, criada_em
+
+        conn = self.fabrica()
+        with self._lock:
+            self._stats['criadas'] += 1
+        return conn, time.monotonic()
+
+    def devolver(self, wrapper):
+        """Recebe de volta uma conexão retirada; transações pendentes são desfeitas."""
+        if wrapper._pool is not self or self._pid != os.getpid():
+            return
+        conn = wrapper._conn
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._ociosas.put((conn, wrapper.criada_em, time.monotonic()))
+        except Error:
+            self._descartar(conn, 'descartadas')
+        finally:
+            self._liberar_vaga()
+
+    def descartar(self, wrapper):
+        """Fecha uma conexão retirada sem devolvê-la às ociosas."""
+        if wrapper._pool is not self or self._pid != os.getpid():
+            return
+        self._descartar(wrapper._conn, 'descartadas')
+        self._liberar_vaga()
+
+    def _liberar_vaga(self):
+        with self._lock:
+            self._em_uso -= 1
+        self._vagas.release()
+
+    def preparado(self, conn, sql, dictionary=False):
+        """Cursor preparado de `sql` guardado junto da conexão física; retorna (cursor, novo).
+
+        Só a thread que retirou a conexão usa os cursores dela; os statements
+        vivem até a conexão ser fechada (reciclada ou descartada).
+        """
+        with self._lock:
+            cursores = self._preparados.setdefault(id(conn), {})
+        cursor = cursores.get((sql, dictionary))
+        if cursor is not None:
+            return cursor, False
+        cursor = conn.cursor(prepared=True, dictionary=dictionary)
+        cursores[(sql, dictionary)] = cursor
+        return cursor, True
+
+    def _descartar(self, conn, motivo):
+        with self._lock:
+            self._stats[motivo] += 1
+            self._preparados.pop(id(conn), None)
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def estatisticas(self):
+        """Estatísticas do pool deste worker."""
+        self._verificar_fork()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['em_uso'] = self._em_uso
+            stats['preparados'] = sum(len(cursores) for cursores in self._preparados.values())
+        stats['ociosas'] = self._ociosas.qsize()
+        stats['tamanho'] = self.tamanho
+        stats['pid'] = self._pid
+        stats['espera_media'] = stats['espera_total'] / max(stats['retiradas'] + stats['timeouts'], 1)
+        return stats
@@ -0,0 +1,309 @@
+"""Banco local (SQLite) compatível com a parte da API do mysql-connector usada pela aplicação.
+
+Serve de substituto do MySQL nos scripts de benchmark e de estresse: traduz o
+dialeto usado em app.py (placeholders %s, NOW(), FOR UPDATE...) e imita
+cursores, lastrowid/rowcount e os erros do mysql-connector. O esquema é criado
+pelas mesmas migrações de esquema.py, com os mesmos índices do MySQL, e
+EXPLAIN devolve o plano do SQLite nas colunas que o consultor de índices lê.
+Cópias feitas com replicar() fazem o papel de réplicas de leitura.
+"""
+import random
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+from mysql.connector import errors
+
+import esquema
+
+# Datas são gravadas como texto 'AAAA-MM-DD HH:MM:SS', que ordena como no MySQL
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(' ', 'seconds'))
+
+_TRADUCOES = [
+    (re.compile(r'\bNOW\(\)', re.I), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'\bCHAR_LENGTH\(', re.I), 'LENGTH('),
+    (re.compile(r'\s+FOR UPDATE( SKIP LOCKED)?', re.I), ''),
+    (re.compile(r'\bVALUES\((\w+)\)', re.I), r'excluded.\1'),
+    (re.compile(r'\bON DUPLICATE KEY UPDATE\b', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bINSERT IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    # DDL das migrações
+    (re.compile(r'\b(?:BIG)?INT AUTO_INCREMENT PRIMARY KEY\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\bUNIQUE KEY \w+ \(', re.I), 'UNIQUE ('),
+    (re.compile(r'\)\s*ENGINE=[^)]*$', re.I), ')'),
+]
+
+
+def traduzir(sql):
+    """Converte o SQL no dialeto MySQL usado pela aplicação para SQLite."""
+    sql = sql.replace('%s', '?')
+    for padrao, troca in _TRADUCOES:
+        sql = padrao.sub(troca, sql)
+    return sql
+
+
+class Cursor:
+    """Cursor que devolve tuplas ou dicionários (dictionary=True), como no mysql-connector."""
+
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._dictionary = dictionary
+        self._cur = conn._db.cursor()
+        self.lastrowid = None
+        self.rowcount = -1
+
+    @property
+    def column_names(self):
+        if self._cur.description is None:
+            return ()
+        return tuple(d[0] for d in self._cur.description)
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def _linha(self, linha):
+        if linha is None or not self._dictionary:
+            return linha
+        return dict(zip(self.column_names, linha))
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().upper().startswith('EXPLAIN '):
+            return self._explicar(sql.lstrip()[len('EXPLAIN '):], params)
+        if sql.strip().upper() in ('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS'):
+            return self._status_replica()
+        try:
+            self._cur.execute(traduzir(sql), tuple(params or ()))
+        except sqlite3.Error as err:
+            raise errors.DatabaseError(msg=str(err)) from err
+        self.lastrowid = self._cur.lastrowid
+        self.rowcount = self._cur.rowcount
+
+    def _explicar(self, sql, params):
+        """EXPLAIN no formato do MySQL (table, type, key, rows, Extra) a partir do EXPLAIN QUERY PLAN."""
+        try:
+            plano = self._conn._db.execute('EXPLAIN QUERY PLAN ' + traduzir(sql), tuple(params or ())).fetchall()
+        except sqlite3.Error as err:
+            raise errors.DatabaseError(msg=str(err)) from err
+        linhas = []
+        tabela = None
+        for *_, detalhe in plano:
+            partes = detalhe.split()
+            if partes[0] in ('SCAN', 'SEARCH'):
+                tabela = partes[1]
+                indice = partes[partes.index('INDEX') + 1] if 'INDEX' in partes else None
+                if partes[0] == 'SEARCH':
+                    tipo = 'ref'
+                else:
+                    tipo = 'index' if indice else 'ALL'
+                linhas.append((tabela, tipo, indice, None, ''))
+            elif detalhe.startswith('USE TEMP B-TREE FOR') and 'ORDER BY' in detalhe:
+                linhas.append((tabela, None, None, None, 'Using filesort'))
+            elif detalhe.startswith('USE TEMP B-TREE FOR'):
+                linhas.append((tabela, None, None, None, 'Using temporary'))
+        colunas = 'SELECT ? AS "table", ? AS type, ? AS key, ? AS rows, ? AS Extra'
+        if linhas:
+            self._cur.execute(' UNION ALL '.join([colunas] * len(linhas)), [valor for linha in linhas for valor in linha])
+        else:
+            self._cur.execute(colunas + ' WHERE 0', (None,) * 5)
+        self.rowcount = len(linhas)
+
+    def _status_replica(self):
+        """SHOW REPLICA STATUS: uma linha com o atraso gravado por replicar(); nenhuma se o banco não é réplica."""
+        if self._conn._db.execute("SELECT 1 FROM sqlite_master WHERE name = '_replicacao'").fetchone():
+            self._cur.execute("SELECT atraso AS Seconds_Behind_Source FROM _replicacao")
+        else:
+            self._cur.execute("SELECT NULL AS Seconds_Behind_Source WHERE 0")
+        self.rowcount = -1
+
+    def executemany(self, sql, seq_params):
+        # Como o mysql-connector em um INSERT de várias linhas: lastrowid é o id da primeira linha
+        primeiro_id = None
+        total = 0
+        try:
+            for params in seq_params:
+                self._cur.execute(traduzir(sql), tuple(params))
+                if primeiro_id is None:
+                    primeiro_id = self._cur.lastrowid
+                total += max(self._cur.rowcount, 0)
+        except sqlite3.Error as err:
+            raise errors.DatabaseError(msg=str(err)) from err
+        self.lastrowid = primeiro_id
+        self.rowcount = total
+
+    def fetchone(self):
+        return self._linha(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._linha(l) for l in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._linha(l) for l in self._cur.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Conexao:
+    """Conexão SQLite que imita a interface de MySQLConnection."""
+
+    def __init__(self, caminho):
+        self._db = sqlite3.connect(caminho, timeout=30, check_same_thread=False, isolation_level='DEFERRED')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._aberta = True
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def cursor(self, dictionary=False, buffered=None, prepared=False, raw=None):
+        return Cursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def start_transaction(self, **kwargs):
+        self._db.execute('BEGIN IMMEDIATE')
+
+    def is_connected(self):
+        return self._aberta
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self._aberta:
+            raise errors.InterfaceError(msg='conexão fechada')
+
+    def close(self):
+        self._aberta = False
+        self._db.close()
+
+
+def criar_banco(caminho):
+    """Cria o arquivo SQLite aplicando as migrações da aplicação."""
+    conn = Conexao(caminho)
+    try:
+        esquema.migrar(conn)
+    finally:
+        conn.close()
+
+
+def replicar(origem, destino, atraso=0):
+    """Copia o banco `origem` sobre a réplica `destino`, que passa a informar `atraso` segundos.
+
+    Imita uma réplica do MySQL: o destino só vê as escritas do primário a cada
+    chamada. atraso=None simula a replicação parada.
+    """
+    db_origem = sqlite3.connect(origem)
+    db_destino = sqlite3.connect(destino, timeout=30)
+    try:
+        db_origem.backup(db_destino)
+    finally:
+        db_origem.close()
+    try:
+        definir_atraso(db_destino, atraso)
+    finally:
+        db_destino.close()
+
+
+def definir_atraso(destino, atraso):
+    """Muda o atraso informado pela réplica no SHOW REPLICA STATUS (caminho ou conexão sqlite3)."""
+    db = sqlite3.connect(destino, timeout=30) if isinstance(destino, str) else destino
+    with db:
+        db.execute("CREATE TABLE IF NOT EXISTS _replicacao (atraso INTEGER)")
+        db.execute("DELETE FROM _replicacao")
+        db.execute("INSERT INTO _replicacao (atraso) VALUES (?)", (atraso,))
+    if db is not destino:
+        db.close()
+
+
+SILABAS = ['ba', 'be', 'ca', 'co', 'da', 'de', 'fa', 'fi', 'ga', 'go', 'la', 'le', 'li', 'lu', 'ma', 'me', 'mi',
+           'mo', 'na', 'ne', 'no', 'pa', 'pe', 'po', 'ra', 're', 'ri', 'ro', 'sa', 'se', 'si', 'ta', 'te', 'ti',
+           'to', 'va', 've', 'vi', 'za', 'zo']
+
+
+def palavra(aleatorio):
+    """Palavra sintética de 2 a 4 sílabas, para que os nomes tenham trigramas variados como nomes reais."""
+    return ''.join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 4))).capitalize()
+
+
+def povoar(caminho, clientes=1000, produtos=1000, carrinhos=5000, pedidos=2000, semente=42):
+    """Preenche o banco local com dados sintéticos determinísticos (mesma semente, mesmos dados)."""
+    aleatorio = random.Random(semente)
+    inicio = datetime(2024, 1, 1)
+    db = sqlite3.connect(caminho)
+    db.executemany(
+        "INSERT INTO tbl_clientes (nome, email, cpf, senha) VALUES (?, ?, ?, ?)",
+        [(f"{palavra(aleatorio)} {palavra(aleatorio)}", f"cliente{i}@exemplo.com", f"{i:011d}", f"senha{i}")
+         for i in range(1, clientes + 1)],
+    )
+    db.executemany(
+        'INSERT INTO tbl_produtos (nome, "descrição", preco, qtd_em_estoque, fornecedor_id, custo_no_fornecedor) '
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (f"{palavra(aleatorio)} {palavra(aleatorio)}", f"Descrição do produto {i}", preco, 10 ** 6,
+             aleatorio.randint(1, 50), round(preco * 0.6, 2))
+            for i, preco in ((i, round(aleatorio.uniform(1, 500), 2)) for i in range(1, produtos + 1))
+        ],
+    )
+    db.executemany(
+        "INSERT INTO tbl_carrinhos (produto_id, quantidade, cliente_id) VALUES (?, ?, ?)",
+        [(aleatorio.randint(1, produtos), aleatorio.randint(1, 5), aleatorio.randint(1, clientes)) for _ in range(carrinhos)],
+    )
+    db.executemany(
+        "INSERT INTO tbl_pedidos (cliente_id, carrinho_id, data_hora, status) VALUES (?, ?, ?, ?)",
+        [
+            (aleatorio.randint(1, clientes), aleatorio.randint(1, carrinhos),
+             inicio + timedelta(minutes=aleatorio.randint(0, 525600)),
+             aleatorio.choice(['pendente', 'pago', 'enviado', 'entregue']))
+            for _ in range(pedidos)
+        ],
+    )
+    db.commit()
+    db.close()
+
+
+def usar_no_app(modulo_app, caminho, tamanho_pool=10):
+    """Faz a aplicação abrir as conexões do pool no banco local em vez do MySQL.
+
+    Nenhuma conexão é aberta aqui: o pool trocado só conecta no primeiro uso.
+    """
+    from banco import PoolConexoes
+
+    modulo_app.app  # Cria a aplicação (e os recursos dela) se ainda não existe
+    recursos = modulo_app.recursos
+    pool = PoolConexoes(lambda: Conexao(caminho), tamanho=tamanho_pool,
+                        espera_maxima=recursos.pool_config['espera_maxima'])
+    pool.envolver_cursor = recursos.pool.envolver_cursor
+    pool.cursor_preparavel = recursos.pool.cursor_preparavel
+    recursos.pool = pool
+
+
+def usar_replicas_no_app(modulo_app, caminhos, tamanho_pool=10, **opcoes):
+    """Faz a aplicação ler das réplicas locais em `caminhos` (criadas com replicar()).
+
+    `opcoes` vai para o Roteador (atraso_maximo, verificar_apos...).
+    """
+    from banco import PoolConexoes
+    import replicas
+
+    modulo_app.app  # Cria a aplicação (e os recursos dela) se ainda não existe
+    recursos = modulo_app.recursos
+    lista = []
+    for caminho in caminhos:
+        pool = PoolConexoes(lambda caminho=caminho: Conexao(caminho), tamanho=tamanho_pool,
+                            espera_maxima=recursos.pool_config['espera_maxima'])
+        pool.envolver_cursor = recursos.pool.envolver_cursor
+        pool.cursor_preparavel = recursos.pool.cursor_preparavel
+        lista.append(replicas.Replica(caminho, pool))
+    recursos.roteador = replicas.Roteador(lista, **opcoes)
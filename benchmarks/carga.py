@@ -0,0 +1,261 @@
+"""Teste de carga reproduzível das rotas da API, com comparação entre execuções.
+
+Sobe a aplicação contra o banco local (SQLite) povoado com dados determinísticos,
+dispara cada cenário (leituras e escritas de clientes, produtos, carrinhos e
+pedidos) com concorrência fixa e mede vazão e latências p50/p95/p99. O
+resultado é gravado em JSON para comparar duas execuções.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.carga executar --saida base.json
+    python -m benchmarks.carga executar --threads 16 --requisicoes 2000 --produtos 50000 --saida novo.json
+    python -m benchmarks.carga executar --cenarios produtos,pedidos   # só os cenários cujo nome contém o filtro
+    python -m benchmarks.carga comparar base.json novo.json --limite 10
+
+`comparar` termina com código 1 se algum cenário ficou mais lento (p95) ou com
+menos vazão que o limite percentual permitido.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import admissao
+import app as aplicacao
+import busca
+from benchmarks import banco_local
+
+_sequencia = itertools.count(1)  # Sufixo único para e-mails/CPFs criados durante a carga
+
+
+def _produto(aleatorio, nome):
+    preco = round(aleatorio.uniform(1, 500), 2)
+    return {
+        'nome': nome, 'descrição': 'carga', 'preco': preco, 'qtd_em_estoque': 10 ** 6,
+        'fornecedor_id': aleatorio.randint(1, 50), 'custo_no_fornecedor': round(preco * 0.6, 2),
+    }
+
+
+def _novo_cliente(aleatorio, n):
+    numero = next(_sequencia)
+    return 'POST', '/clientes', {
+        'nome': f'Carga {numero}', 'email': f'carga{numero}-{os.getpid()}@exemplo.com',
+        'cpf': f'9{os.getpid() % 1000:03d}{numero:07d}', 'senha': 'carga',
+    }
+
+
+def _novo_carrinho(aleatorio, n):
+    return 'POST', '/carrinhos', {
+        'produto_id': aleatorio.randint(1, n['produtos']), 'quantidade': 1,
+        'cliente_id': aleatorio.randint(1, n['clientes']),
+    }
+
+
+def _novo_pedido(aleatorio, n):
+    return 'POST', '/pedidos', {
+        'cliente_id': aleatorio.randint(1, n['clientes']), 'carrinho_id': aleatorio.randint(1, n['carrinhos']),
+        'data_hora': datetime.now().isoformat(' ', 'seconds'), 'status': 'pendente',
+    }
+
+
+# nome -> função(aleatorio, quantidades) que devolve (método, caminho, corpo JSON)
+# As leituras vêm antes das escritas para que todas meçam o mesmo volume de dados.
+CENARIOS = {
+    'clientes_ler': lambda a, n: ('GET', f"/clientes/{a.randint(1, n['clientes'])}", None),
+    'clientes_listar': lambda a, n: ('GET', f"/clientes?limite=50&nome={a.choice(banco_local.SILABAS)}", None),
+    'clientes_varios': lambda a, n: ('GET', '/clientes?ids=' + ','.join(str(a.randint(1, n['clientes'])) for _ in range(20)), None),
+    'produtos_ler': lambda a, n: ('GET', f"/produtos/{a.randint(1, n['produtos'])}", None),
+    'produtos_listar': lambda a, n: ('GET', '/produtos?limite=50', None),
+    'carrinhos_ler': lambda a, n: ('GET', f"/carrinhos/{a.randint(1, n['carrinhos'])}", None),
+    'carrinhos_listar': lambda a, n: ('GET', f"/carrinhos?produto_id={a.randint(1, n['produtos'])}", None),
+    'produtos_buscar': lambda a, n: ('GET', f"/produtos/busca?q={banco_local.palavra(a)}&limite=20", None),
+    'clientes_buscar': lambda a, n: ('GET', f"/clientes/busca?q={a.choice(banco_local.SILABAS)}+{banco_local.palavra(a)}", None),
+    'pedidos_ler': lambda a, n: ('GET', f"/pedidos/{a.randint(1, n['pedidos'])}", None),
+    'pedidos_expandir': lambda a, n: ('GET', f"/pedidos/{a.randint(1, n['pedidos'])}?expandir=cliente,produtos", None),
+    'pedidos_listar': lambda a, n: ('GET', '/pedidos?limite=50&expandir=cliente', None),
+    'pedidos_cliente': lambda a, n: ('GET', f"/pedidos/cliente/{a.randint(1, n['clientes'])}", None),
+    'clientes_criar': _novo_cliente,
+    'produtos_criar': lambda a, n: ('POST', '/produtos', _produto(a, 'Produto carga')),
+    'produtos_atualizar': lambda a, n: ('PUT', f"/produtos/{a.randint(1, n['produtos'])}", _produto(a, 'Produto atualizado')),
+    'carrinhos_criar': _novo_carrinho,
+    'pedidos_criar': _novo_pedido,
+}
+
+
+def percentil(ordenadas, p):
+    """Percentil pelo método do posto mais próximo; `ordenadas` já vem em ordem crescente."""
+    if not ordenadas:
+        return 0.0
+    posicao = max(int(round(p / 100 * len(ordenadas) + 0.5)) - 1, 0)
+    return ordenadas[min(posicao, len(ordenadas) - 1)]
+
+
+def _trabalhador(gerar, quantidades, requisicoes, semente, latencias, status, lock):
+    cliente = aplicacao.app.test_client()
+    aleatorio = random.Random(semente)
+    minhas = []
+    meus_status = {}
+    for _ in range(requisicoes):
+        metodo, caminho, corpo = gerar(aleatorio, quantidades)
+        inicio = time.perf_counter()
+        resp = cliente.open(caminho, method=metodo, json=corpo)
+        resp.get_data()
+        minhas.append(time.perf_counter() - inicio)
+        meus_status[resp.status_code] = meus_status.get(resp.status_code, 0) + 1
+    with lock:
+        latencias.extend(minhas)
+        for codigo, total in meus_status.items():
+            status[codigo] = status.get(codigo, 0) + total
+
+
+def medir(nome, gerar, quantidades, args):
+    """Executa um cenário com `args.threads` clientes simultâneos e devolve as estatísticas."""
+    # Aquecimento: preenche pool e caches sem entrar na medição
+    _trabalhador(gerar, quantidades, args.aquecimento, args.semente, [], {}, threading.Lock())
+
+    latencias = []
+    status = {}
+    lock = threading.Lock()
+    por_thread = max(args.requisicoes // args.threads, 1)
+    threads = [
+        threading.Thread(target=_trabalhador, args=(gerar, quantidades, por_thread, args.semente + indice, latencias, status, lock))
+        for indice in range(args.threads)
+    ]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    erros = sum(total for codigo, total in status.items() if codigo >= 500)
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'status': {str(codigo): total for codigo, total in sorted(status.items())},
+        'segundos': round(duracao, 4),
+        'vazao': round(len(latencias) / duracao, 2) if duracao else 0.0,
+        'media_ms': round(sum(latencias) / len(latencias) * 1000, 3) if latencias else 0.0,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 3),
+    }
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args):
+    quantidades = {'clientes': args.clientes, 'produtos': args.produtos, 'carrinhos': args.carrinhos, 'pedidos': args.pedidos}
+    caminho = os.path.join(tempfile.mkdtemp(), 'carga.db')
+    banco_local.criar_banco(caminho)
+    banco_local.povoar(caminho, semente=args.semente, **quantidades)
+    banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=args.threads)
+    # Sob carga no SQLite quase toda escrita passa do limite de consulta lenta; o log só atrapalharia a leitura
+    logging.getLogger('consultas_lentas').setLevel(logging.ERROR)
+    # A carga mede vazão e latência, não o descarte: uma vaga por thread em cada classe de rota
+    for nome in ('padrao', 'pesada'):
+        admissao.configurar(nome, vagas=args.threads, fila=args.threads)
+    conn = aplicacao.connect_db()
+    try:
+        for tabela in busca.INDEXADAS:
+            busca.reindexar(conn, tabela)
+    finally:
+        conn.close()
+
+    filtros = [filtro.strip() for filtro in args.cenarios.split(',')] if args.cenarios else []
+    cenarios = {}
+    for nome, gerar in CENARIOS.items():
+        if filtros and not any(filtro in nome for filtro in filtros):
+            continue
+        cenarios[nome] = resultado = medir(nome, gerar, quantidades, args)
+        print(f"{nome:<20} {resultado['vazao']:>9.1f} req/s  p50 {resultado['p50_ms']:>8.2f} ms  "
+              f"p95 {resultado['p95_ms']:>8.2f} ms  p99 {resultado['p99_ms']:>8.2f} ms  status {resultado['status']}")
+
+    relatorio = {
+        'configuracao': dict(quantidades, threads=args.threads, requisicoes=args.requisicoes,
+                             aquecimento=args.aquecimento, semente=args.semente),
+        'ambiente': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                     'commit': _commit_atual(), 'data': datetime.now().isoformat(timespec='seconds')},
+        'cenarios': cenarios,
+    }
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        print(f"resultado gravado em {args.saida}")
+    if any(resultado['erros'] for resultado in cenarios.values()):
+        print("ATENÇÃO: houve respostas 5xx durante a carga")
+        return 1
+    return 0
+
+
+def comparar(args):
+    """Compara p95 e vazão de cada cenário; retorna 1 se algum piorou além do limite."""
+    with open(args.base, encoding='utf-8') as arquivo:
+        base = json.load(arquivo)
+    with open(args.novo, encoding='utf-8') as arquivo:
+        novo = json.load(arquivo)
+    if base['configuracao'] != novo['configuracao']:
+        print(f"ATENÇÃO: configurações diferentes\n  base: {base['configuracao']}\n  novo: {novo['configuracao']}")
+
+    regressoes = []
+    for nome, antes in base['cenarios'].items():
+        depois = novo['cenarios'].get(nome)
+        if depois is None:
+            continue
+        variacao_p95 = (depois['p95_ms'] / antes['p95_ms'] - 1) * 100 if antes['p95_ms'] else 0.0
+        variacao_vazao = (depois['vazao'] / antes['vazao'] - 1) * 100 if antes['vazao'] else 0.0
+        piorou = variacao_p95 > args.limite or variacao_vazao < -args.limite
+        if piorou:
+            regressoes.append(nome)
+        print(f"{nome:<20} p95 {antes['p95_ms']:>8.2f} -> {depois['p95_ms']:>8.2f} ms ({variacao_p95:+6.1f}%)  "
+              f"vazão {antes['vazao']:>9.1f} -> {depois['vazao']:>9.1f} ({variacao_vazao:+6.1f}%)"
+              f"{'  REGRESSÃO' if piorou else ''}")
+
+    if regressoes:
+        print(f"FALHOU: {len(regressoes)} cenário(s) pioraram mais de {args.limite:g}%: {', '.join(regressoes)}")
+        return 1
+    print(f"OK: nenhum cenário piorou mais de {args.limite:g}%")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    execucao = comandos.add_parser('executar', help='roda os cenários e grava o resultado')
+    execucao.add_argument('--threads', type=int, default=8, help='clientes simultâneos por cenário')
+    execucao.add_argument('--requisicoes', type=int, default=800, help='requisições medidas por cenário')
+    execucao.add_argument('--aquecimento', type=int, default=50, help='requisições descartadas antes de medir')
+    execucao.add_argument('--clientes', type=int, default=1000)
+    execucao.add_argument('--produtos', type=int, default=1000)
+    execucao.add_argument('--carrinhos', type=int, default=5000)
+    execucao.add_argument('--pedidos', type=int, default=2000)
+    execucao.add_argument('--semente', type=int, default=42)
+    execucao.add_argument('--cenarios', help='filtros separados por vírgula (ex.: produtos,pedidos_ler)')
+    execucao.add_argument('--saida', help='arquivo JSON de resultado')
+
+    comparacao = comandos.add_parser('comparar', help='compara dois resultados JSON')
+    comparacao.add_argument('base')
+    comparacao.add_argument('novo')
+    comparacao.add_argument('--limite', type=float, default=10.0, help='piora percentual tolerada em p95 e vazão')
+
+    args = parser.parse_args()
+    sys.exit(executar(args) if args.comando == 'executar' else comparar(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Teste de estresse da reserva de estoque em POST /carrinhos: nenhuma unidade pode ser vendida duas vezes.
+
+Dispara compras concorrentes de um mesmo produto e confere, ao final, que
+  - o total vendido nunca passa do estoque inicial;
+  - estoque final + itens em carrinho == estoque inicial;
+  - ao expirar as reservas, todo o estoque volta ao produto.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.estresse_estoque --threads 32 --compras 2000 --estoque 500
+    python -m benchmarks.estresse_estoque --fragmentado      # modo de estoque fragmentado
+    python -m benchmarks.estresse_estoque --mysql            # usa o banco de .cred em vez do SQLite local
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import app as aplicacao
+import estoque
+from benchmarks import banco_local
+
+
+def preparar(args):
+    """Cria o produto disputado e devolve seu id."""
+    conn = aplicacao.connect_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO tbl_produtos (nome, descrição, preco, qtd_em_estoque, fornecedor_id, custo_no_fornecedor) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                ('produto disputado', 'estresse', 10, args.estoque, 1, 5),
+            )
+            produto_id = cursor.lastrowid
+        conn.commit()
+        if args.fragmentado:
+            estoque.PRODUTOS_FRAGMENTADOS.add(produto_id)
+            estoque.fragmentar(conn, produto_id, args.fragmentos)
+        return produto_id
+    finally:
+        conn.close()
+
+
+def comprar(produto_id, compras, resultado, lock):
+    cliente = aplicacao.app.test_client()
+    vendidas = 0
+    status = {}
+    for _ in range(compras):
+        quantidade = random.randint(1, 3)
+        resp = cliente.post('/carrinhos', json={'produto_id': produto_id, 'quantidade': quantidade, 'cliente_id': 1})
+        status[resp.status_code] = status.get(resp.status_code, 0) + 1
+        if resp.status_code == 201:
+            vendidas += quantidade
+    with lock:
+        resultado['vendidas'] += vendidas
+        for codigo, total in status.items():
+            resultado['status'][codigo] = resultado['status'].get(codigo, 0) + total
+
+
+def estoque_atual(cursor, produto_id):
+    cursor.execute("SELECT qtd_em_estoque FROM tbl_produtos WHERE id = %s", (produto_id,))
+    return cursor.fetchone()[0] + estoque.estoque_fragmentado(cursor, produto_id)
+
+
+def conferir(args, produto_id, resultado):
+    """Retorna a lista de violações encontradas (vazia se tudo estiver correto)."""
+    falhas = []
+    conn = aplicacao.connect_db()
+    try:
+        with conn.cursor() as cursor:
+            restante = estoque_atual(cursor, produto_id)
+            cursor.execute("SELECT COALESCE(SUM(quantidade), 0) FROM tbl_carrinhos WHERE produto_id = %s", (produto_id,))
+            em_carrinhos = int(cursor.fetchone()[0])
+        conn.rollback()
+
+        print(f"estoque inicial={args.estoque} vendido={resultado['vendidas']} em carrinhos={em_carrinhos} restante={restante}")
+        print(f"respostas: {resultado['status']}")
+        if resultado['vendidas'] > args.estoque or restante < 0:
+            falhas.append("estoque vendido além do disponível")
+        if restante + em_carrinhos != args.estoque or em_carrinhos != resultado['vendidas']:
+            falhas.append("estoque final não fecha com os itens em carrinho")
+
+        # Simula o abandono de todos os carrinhos: a expiração deve devolver o estoque inteiro
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE tbl_reservas SET expira_em = %s", (datetime.now() - timedelta(minutes=1),))
+        conn.commit()
+        estoque.expirar_reservas(conn)
+        with conn.cursor() as cursor:
+            restante = estoque_atual(cursor, produto_id)
+        conn.rollback()
+        print(f"após expirar as reservas: restante={restante}")
+        if restante != args.estoque:
+            falhas.append("expiração das reservas não devolveu todo o estoque")
+    finally:
+        conn.close()
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--compras', type=int, default=2000, help='total de tentativas de compra')
+    parser.add_argument('--estoque', type=int, default=500)
+    parser.add_argument('--fragmentado', action='store_true', help='usa o modo de estoque fragmentado')
+    parser.add_argument('--fragmentos', type=int, default=estoque.FRAGMENTOS)
+    parser.add_argument('--mysql', action='store_true', help='usa o MySQL configurado em vez do banco local')
+    args = parser.parse_args()
+
+    if not args.mysql:
+        caminho = os.path.join(tempfile.mkdtemp(), 'estresse.db')
+        banco_local.criar_banco(caminho)
+        banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=args.threads)
+
+    produto_id = preparar(args)
+    resultado = {'vendidas': 0, 'status': {}}
+    lock = threading.Lock()
+    por_thread = max(args.compras // args.threads, 1)
+    threads = [threading.Thread(target=comprar, args=(produto_id, por_thread, resultado, lock)) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    falhas = conferir(args, produto_id, resultado)
+    if falhas:
+        print("FALHOU: " + "; ".join(falhas))
+        sys.exit(1)
+    print("OK: nenhuma unidade vendida além do estoque")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Memória e vazão do upload de imagens (PUT /produtos/<id>/imagem) e do download com Range.
+
+Envia corpos de alguns tamanhos a partir de um arquivo em disco e mede, com
+tracemalloc, o pico de memória alocada pela requisição: com a gravação em
+blocos ele fica perto de imagens.BLOCO, qualquer que seja o tamanho da imagem.
+Depois mede o GET completo, um GET com Range e a revalidação (304).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.imagens
+    python -m benchmarks.imagens --tamanhos 1,10,50 --repeticoes 50
+
+Sempre usa o banco local (SQLite) e um IMAGENS_DIR temporário. O corpo é
+sintético (cabeçalho JPEG e bytes aleatórios), então as miniaturas ficam
+desligadas.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import app as aplicacao
+import imagens
+from benchmarks import banco_local
+
+MIB = 1024 * 1024
+
+
+def arquivo_sintetico(pasta, mebibytes):
+    caminho = os.path.join(pasta, f'imagem-{mebibytes}.jpg')
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(b'\xff\xd8\xff\xe0' + os.urandom(12))
+        for _ in range(mebibytes):
+            arquivo.write(os.urandom(MIB))
+    return caminho
+
+
+def medir(funcao, repeticoes):
+    funcao()  # Aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', default='1,8,32', help='tamanhos dos uploads, em MiB')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    caminho = os.path.join(pasta, 'imagens.db')
+    banco_local.criar_banco(caminho)
+    banco_local.povoar(caminho, produtos=10, carrinhos=0, pedidos=0)
+    banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=2)
+    imagens.DIRETORIO = os.path.join(pasta, 'imagens')
+    imagens.TAMANHO_MAXIMO = 1024 * MIB
+    imagens.Image = None  # Corpo sintético: não há miniaturas a gerar
+
+    cliente = aplicacao.app.test_client()
+    print(f"{'upload':>10} {'tempo (ms)':>11} {'MiB/s':>8} {'pico de memória (KiB)':>22}")
+    for mebibytes in (int(t) for t in args.tamanhos.split(',')):
+        origem = arquivo_sintetico(pasta, mebibytes)
+        tamanho = os.path.getsize(origem)
+        with open(origem, 'rb') as corpo:
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            resp = cliente.put('/produtos/1/imagem', input_stream=corpo, content_length=tamanho,
+                               content_type='image/jpeg')
+            duracao = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        print(f"{mebibytes:>6} MiB {duracao * 1000:>11.1f} {tamanho / MIB / duracao:>8.0f} {pico / 1024:>22.0f}")
+
+    url = resp.json['url']
+    etag = cliente.get(url, buffered=True).headers['ETag']
+
+    def completo():
+        cliente.get(url, buffered=True).close()
+
+    def faixa():
+        resp = cliente.get(url, headers={'Range': 'bytes=0-65535'}, buffered=True)
+        assert resp.status_code == 206
+
+    def revalidacao():
+        resp = cliente.get('/produtos/1/imagem', headers={'If-None-Match': etag}, buffered=True)
+        assert resp.status_code == 304
+
+    print(f"\nGET completo ({tamanho / MIB:.0f} MiB): {medir(completo, args.repeticoes):8.2f} ms")
+    print(f"GET Range (64 KiB):     {medir(faixa, args.repeticoes):8.2f} ms")
+    print(f"GET If-None-Match (304): {medir(revalidacao, args.repeticoes):7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Tempo até a primeira resposta de um worker novo, sem e com o aquecimento (app.aquecer).
+
+Cada medida roda em um processo Python novo, como um worker recém-criado:
+importa o app, cria a aplicação e, conforme o modo, aquece antes de atender.
+Depois faz a primeira requisição de cada rota (produto por id, login e
+listagem) e uma segunda, já quente, para comparação.
+
+    frio      sem aquecimento: conexões, statements, cache e processos de senha
+              ficam para as primeiras requisições (o comportamento anterior)
+    aquecido  create_app() e aquecer() antes da primeira requisição
+    preload   como no gunicorn --preload: o processo cria a aplicação e faz um
+              fork; o filho aquece e atende (tempos contados a partir do fork)
+
+Uso (na raiz do repositório):
+    python -m benchmarks.inicializacao
+    python -m benchmarks.inicializacao --repeticoes 10 --produtos 20000
+    python -m benchmarks.inicializacao --mysql --email a@b.com --senha s   # MySQL de .cred; o login precisa existir
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import banco_local
+
+MODOS = ('frio', 'aquecido', 'preload')
+ROTAS = ('produto', 'login', 'listagem')
+
+
+def requisicoes(cliente, email, senha):
+    """Duas rodadas das rotas medidas; retorna {rota: [ms da 1ª, ms da 2ª]}."""
+    chamadas = {
+        'produto': lambda: cliente.get('/produtos/1'),
+        'login': lambda: cliente.post('/clientes/login', json={'email': email, 'senha': senha}),
+        'listagem': lambda: cliente.get('/produtos?limite=50'),
+    }
+    tempos = {rota: [] for rota in ROTAS}
+    for _ in range(2):
+        for rota in ROTAS:
+            inicio = time.perf_counter()
+            resp = chamadas[rota]()
+            tempos[rota].append((time.perf_counter() - inicio) * 1000)
+            assert resp.status_code == 200, (rota, resp.status_code, resp.get_data(as_text=True))
+    return tempos
+
+
+def filho(args):
+    """Processo medido: cria a aplicação, aquece (conforme o modo) e faz as requisições."""
+    inicio = time.perf_counter()
+    import app as aplicacao  # Importado aqui: o tempo de importação faz parte da partida
+
+    if args.banco:
+        banco_local.usar_no_app(aplicacao, args.banco, tamanho_pool=args.pool)
+    else:
+        aplicacao.app
+    criada = time.perf_counter()
+    resultado = {'importar': (criada - inicio) * 1000}
+
+    if args.filho == 'preload':
+        pid = os.fork()
+        if pid:
+            os.waitpid(pid, 0)
+            return
+        criada = time.perf_counter()  # No filho: o relógio recomeça no fork
+    else:
+        resultado['processo'] = (time.time() - args.inicio) * 1000  # Desde o início do interpretador
+
+    if args.filho != 'frio':
+        aplicacao.aquecer(aplicacao.app)
+    pronto = time.perf_counter()
+    resultado['aquecer'] = (pronto - criada) * 1000
+    resultado['pronto'] = (pronto - criada) * 1000 + resultado.get('processo', 0)
+    resultado['rotas'] = requisicoes(aplicacao.app.test_client(), args.email, args.senha)
+    print(json.dumps(resultado), flush=True)
+
+
+def medir(modo, args):
+    comando = [sys.executable, '-m', 'benchmarks.inicializacao', '--filho', modo, '--inicio', str(time.time()),
+               '--pool', str(args.pool), '--email', args.email, '--senha', args.senha]
+    if args.banco:
+        comando += ['--banco', args.banco]
+    saida = subprocess.run(comando, check=True, capture_output=True, text=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=5, help='processos medidos por modo (mostra a mediana)')
+    parser.add_argument('--produtos', type=int, default=5000)
+    parser.add_argument('--pool', type=int, default=5, help='conexões do pool (banco local)')
+    parser.add_argument('--mysql', action='store_true', help='usa o MySQL configurado em vez do banco local')
+    parser.add_argument('--email', default='cliente1@exemplo.com')
+    parser.add_argument('--senha', default='senha1')
+    parser.add_argument('--filho', choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--inicio', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--banco', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        return filho(args)
+
+    if not args.mysql:
+        import senhas
+
+        args.banco = os.path.join(tempfile.mkdtemp(), 'inicializacao.db')
+        banco_local.criar_banco(args.banco)
+        banco_local.povoar(args.banco, produtos=args.produtos)
+        with sqlite3.connect(args.banco) as db:  # Senha já com hash: o login só verifica
+            db.execute("UPDATE tbl_clientes SET senha = ? WHERE email = ?",
+                       (senhas.calcular(args.senha, senhas.CUSTO), args.email))
+
+    print(f"{'modo':<9} {'importar':>9} {'aquecer':>8} {'pronto (ms)':>12} {'1ª resposta':>12} {'pior 1ª':>8}"
+          + "".join(f" {rota + ' 1ª/2ª':>17}" for rota in ROTAS))
+    for modo in MODOS:
+        medidas = [medir(modo, args) for _ in range(args.repeticoes)]
+
+        def mediana(chave, rota=None, ordem=0):
+            return statistics.median(m['rotas'][rota][ordem] if rota else m[chave] for m in medidas)
+
+        pronto = mediana('pronto')
+        primeira = statistics.median(m['pronto'] + m['rotas'][ROTAS[0]][0] for m in medidas)
+        pior = statistics.median(max(m['rotas'][rota][0] for rota in ROTAS) for m in medidas)
+        print(f"{modo:<9} {mediana('importar'):>9.1f} {mediana('aquecer'):>8.1f} {pronto:>12.1f} {primeira:>12.1f} {pior:>8.1f}"
+              + "".join(f" {mediana(None, rota, 0):>8.1f}/{mediana(None, rota, 1):<8.1f}" for rota in ROTAS))
+    print("\nimportar: importar o app e criar a aplicação (no preload, feito uma vez antes do fork)")
+    print("pronto: desde o início do processo (preload: desde o fork); 1ª resposta: pronto + 1ª requisição;")
+    print("pior 1ª: a primeira requisição mais lenta entre as rotas, o custo de partida que cai sobre um cliente")
+
+
+if __name__ == '__main__':
+    main()
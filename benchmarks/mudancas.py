@@ -0,0 +1,84 @@
+"""Compara a releitura completa de GET /produtos com a sincronização por GET /produtos/mudancas.
+
+Povoa o banco, guarda o token atual (?desde=agora), altera e remove alguns
+produtos pela API e mede quanto custa ao consumidor descobrir essas mudanças:
+percorrer todas as páginas de /produtos contra seguir o registro de mudanças
+a partir do token. Mostra tempo, requisições e bytes recebidos.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.mudancas --produtos 50000 --alterados 100
+    python -m benchmarks.mudancas --mysql   # usa os dados do MySQL de .cred (altera produtos de verdade)
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import app as aplicacao
+from benchmarks import banco_local
+
+
+def releitura_completa(cliente, limite):
+    """Percorre todas as páginas de /produtos; retorna (requisições, bytes)."""
+    requisicoes, recebidos, url = 0, 0, f'/produtos?limite={limite}'
+    while url:
+        resp = cliente.get(url)
+        requisicoes += 1
+        recebidos += len(resp.get_data())
+        proximo = resp.json.get('proximo') if resp.status_code == 200 else None
+        url = f'/produtos?limite={limite}&apos={proximo}' if proximo else None
+    return requisicoes, recebidos
+
+
+def sincronizacao(cliente, token, limite):
+    """Segue /produtos/mudancas a partir do token; retorna (requisições, bytes, mudanças)."""
+    requisicoes, recebidos, vistas, mais = 0, 0, 0, True
+    while mais:
+        resp = cliente.get(f'/produtos/mudancas?limite={limite}&desde={token}')
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        requisicoes += 1
+        recebidos += len(resp.get_data())
+        vistas += len(resp.json['mudancas'])
+        token, mais = resp.json['proximo'], resp.json['mais']
+    return requisicoes, recebidos, vistas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--produtos', type=int, default=20000)
+    parser.add_argument('--alterados', type=int, default=50, help='produtos alterados (10%% deles removidos)')
+    parser.add_argument('--limite', type=int, default=500, help='tamanho da página nas duas leituras')
+    parser.add_argument('--mysql', action='store_true', help='usa o MySQL configurado em vez do banco local')
+    args = parser.parse_args()
+
+    if not args.mysql:
+        caminho = os.path.join(tempfile.mkdtemp(), 'mudancas.db')
+        banco_local.criar_banco(caminho)
+        banco_local.povoar(caminho, produtos=args.produtos, carrinhos=0, pedidos=0)
+        banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=2)
+
+    cliente = aplicacao.app.test_client()
+    token = cliente.get('/produtos/mudancas?desde=agora').json['proximo']
+    aleatorio = random.Random(42)
+    for indice, produto_id in enumerate(aleatorio.sample(range(1, args.produtos + 1), args.alterados)):
+        if indice % 10 == 9:
+            cliente.delete(f'/produtos/{produto_id}')
+        else:
+            cliente.patch('/produtos/lote', json={'produtos': [{'id': produto_id, 'preco': aleatorio.randint(1, 500)}]})
+
+    inicio = time.perf_counter()
+    requisicoes, recebidos = releitura_completa(cliente, args.limite)
+    completa = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    requisicoes_sync, recebidos_sync, vistas = sincronizacao(cliente, token, args.limite)
+    sync = time.perf_counter() - inicio
+
+    print(f"{'':<28} {'tempo (ms)':>10} {'requisições':>12} {'KiB':>10}")
+    print(f"{'releitura de /produtos':<28} {completa * 1000:>10.1f} {requisicoes:>12} {recebidos / 1024:>10.1f}")
+    print(f"{'/produtos/mudancas':<28} {sync * 1000:>10.1f} {requisicoes_sync:>12} {recebidos_sync / 1024:>10.1f}")
+    print(f"\n{vistas} mudança(s) recebida(s) de {args.alterados} produto(s) alterado(s) ou removido(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Latência de POST /pedidos com e sem a fila de notificações e atraso das entregas.
+
+Cria pedidos com a fila desligada e depois ligada, com o despachante rodando
+em paralelo contra o servidor SMTP local (que pode demorar por mensagem e
+recusar as primeiras com 451). Mostra p50/p95 da criação dos pedidos nos
+dois casos, o atraso entre a resposta do pedido e a chegada do email, e
+quantos emails chegaram.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.notificacoes
+    python -m benchmarks.notificacoes --latencia-smtp 0.2 --falhas 20 --pedidos 300
+
+Sempre usa o banco local (SQLite); o SMTP é o de benchmarks/smtp_local.py.
+"""
+import argparse
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import app as aplicacao
+import notificacoes
+from benchmarks import banco_local
+from benchmarks.carga import percentil
+from benchmarks.smtp_local import ServidorSMTP
+
+
+def criar_pedidos(quantidade, clientes, carrinhos, inicio_id):
+    """Cria os pedidos em sequência; retorna ([latências], {pedido_id: instante da resposta})."""
+    cliente = aplicacao.app.test_client()
+    latencias, respondidos = [], {}
+    for indice in range(quantidade):
+        corpo = {
+            'cliente_id': indice % clientes + 1, 'carrinho_id': indice % carrinhos + 1,
+            'data_hora': datetime.now().isoformat(' ', 'seconds'), 'status': 'pendente',
+        }
+        antes = time.perf_counter()
+        resp = cliente.post('/pedidos', json=corpo)
+        latencias.append(time.perf_counter() - antes)
+        if resp.status_code == 201:
+            respondidos[inicio_id + indice] = time.time()
+    return sorted(latencias), respondidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pedidos', type=int, default=200)
+    parser.add_argument('--latencia-smtp', type=float, default=0.05, help='segundos que o SMTP local leva por mensagem')
+    parser.add_argument('--falhas', type=int, default=5, help='mensagens recusadas com 451 antes de o SMTP aceitar')
+    parser.add_argument('--espera', type=float, default=60, help='segundos esperando a fila esvaziar')
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'notificacoes.db')
+    banco_local.criar_banco(caminho)
+    banco_local.povoar(caminho, clientes=100, produtos=100, carrinhos=500, pedidos=0)
+    banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=4)
+    notificacoes.ESPERA_INICIAL = 1  # Novas tentativas rápidas, para a execução terminar logo
+
+    notificacoes.NOTIFICAR_PEDIDOS = False
+    sem_fila, _ = criar_pedidos(args.pedidos, 100, 500, 1)
+
+    with ServidorSMTP(falhas=args.falhas, latencia=args.latencia_smtp) as smtp:
+        notificacoes.smtp_config.update(host='127.0.0.1', porta=smtp.porta, tls=False, usuario=None)
+        notificacoes.NOTIFICAR_PEDIDOS = True
+        parar = threading.Event()
+        despachante = threading.Thread(
+            target=notificacoes.executar, args=(lambda: aplicacao.connect_db(prazo=False), parar), kwargs={'intervalo': 0.1})
+        despachante.start()
+        com_fila, respondidos = criar_pedidos(args.pedidos, 100, 500, args.pedidos + 1)
+
+        limite = time.monotonic() + args.espera
+        while len(smtp.mensagens) < len(respondidos) and time.monotonic() < limite:
+            time.sleep(0.1)
+        parar.set()
+        despachante.join()
+
+    atrasos = []
+    for instante, _, _, texto in smtp.mensagens:
+        numero = re.search(r'Pedido #(\d+)', texto)
+        if numero and int(numero.group(1)) in respondidos:
+            atrasos.append(instante - respondidos[int(numero.group(1))])
+    atrasos.sort()
+
+    print(f"{'POST /pedidos':<16} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for nome, latencias in (('sem fila', sem_fila), ('com fila', com_fila)):
+        print(f"{nome:<16} {percentil(latencias, 50) * 1000:>9.2f} {percentil(latencias, 95) * 1000:>9.2f}")
+    print(f"\nemails entregues: {len(atrasos)}/{len(respondidos)} ({args.falhas} recusados com 451 e reenviados)")
+    if atrasos:
+        print(f"atraso da entrega: p50 {percentil(atrasos, 50):.2f} s, p95 {percentil(atrasos, 95):.2f} s, "
+              f"máximo {atrasos[-1]:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
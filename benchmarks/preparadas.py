@@ -0,0 +1,93 @@
+"""Compara os comandos registrados executados com e sem statements preparados (SQL_PREPARADAS).
+
+Executa cada comando quente do registro várias vezes na mesma conexão do pool,
+primeiro como texto (o servidor analisa o SQL a cada vez) e depois preparado
+(análise uma vez por conexão), e mostra o tempo médio por execução.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.preparadas --mysql --repeticoes 5000   # mede no MySQL de .cred
+    python -m benchmarks.preparadas                             # banco local: só confere o caminho do código
+
+No SQLite local não há diferença a medir: o sqlite3 já guarda os comandos
+compilados por conexão. A economia de análise só aparece no MySQL.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import app as aplicacao
+import comandos
+from benchmarks import banco_local
+
+
+def preparar():
+    """Cria um cliente, um produto e um carrinho para as buscas por id; retorna os ids."""
+    conn = aplicacao.connect_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(comandos.INSERIR_CLIENTE, ('Cliente Preparadas', f'preparadas{time.time_ns()}@exemplo.com',
+                                                      str(time.time_ns())[-11:], 'senha'))
+            cliente_id = cursor.lastrowid
+            cursor.execute(comandos.INSERIR_PRODUTO, ('Produto Preparadas', 'benchmark', 10, 10 ** 6, 1, 5))
+            produto_id = cursor.lastrowid
+            cursor.execute(comandos.INSERIR_CARRINHO, (produto_id, 1, cliente_id))
+            carrinho_id = cursor.lastrowid
+        conn.commit()
+        return cliente_id, produto_id, carrinho_id
+    finally:
+        conn.close()
+
+
+def medir(repeticoes, cliente_id, produto_id, carrinho_id):
+    """Tempo médio (µs) por execução de cada comando, na mesma conexão."""
+    casos = [
+        ('produto_por_id', comandos.PRODUTO_POR_ID, (produto_id,)),
+        ('cliente_por_id', comandos.CLIENTE_POR_ID, (cliente_id,)),
+        ('carrinho_por_id', comandos.CARRINHO_POR_ID, (carrinho_id,)),
+        # Baixa de zero unidades: percorre o mesmo caminho do UPDATE sem mudar o estoque
+        ('reservar_estoque', comandos.RESERVAR_ESTOQUE, (0, produto_id, 0)),
+    ]
+    tempos = {}
+    conn = aplicacao.connect_db()
+    try:
+        for nome, sql, params in casos:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(sql, params)  # Aquecimento: prepara o statement na conexão
+                cursor.fetchall()
+                inicio = time.perf_counter()
+                for _ in range(repeticoes):
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                tempos[nome] = (time.perf_counter() - inicio) / repeticoes * 1e6
+        conn.rollback()
+    finally:
+        conn.close()
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    parser.add_argument('--mysql', action='store_true', help='usa o MySQL configurado em vez do banco local')
+    args = parser.parse_args()
+
+    if not args.mysql:
+        caminho = os.path.join(tempfile.mkdtemp(), 'preparadas.db')
+        banco_local.criar_banco(caminho)
+        banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=1)
+
+    ids = preparar()
+    resultados = {}
+    for preparadas in (False, True):
+        comandos.PREPARADAS = preparadas
+        resultados[preparadas] = medir(args.repeticoes, *ids)
+
+    print(f"{'comando':<20} {'texto (µs)':>12} {'preparado (µs)':>15} {'diferença':>10}")
+    for nome, texto in resultados[False].items():
+        preparado = resultados[True][nome]
+        print(f"{nome:<20} {texto:>12.1f} {preparado:>15.1f} {(preparado - texto) / texto:>+10.1%}")
+
+
+if __name__ == '__main__':
+    main()
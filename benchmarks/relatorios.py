@@ -0,0 +1,75 @@
+"""Compara o relatório de margem lido dos resumos com a consulta agregada direto sobre os pedidos.
+
+Povoa o banco, monta os resumos com reconstruir-relatorios e mede o tempo
+médio de GET /relatorios/margem (grupos de tbl_resumo_vendas) contra a
+mesma agregação feita com JOIN em tbl_pedidos, tbl_carrinhos e tbl_produtos,
+que cresce com o número de pedidos.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.relatorios --pedidos 200000
+    python -m benchmarks.relatorios --mysql   # usa os dados do MySQL de .cred (rode reconstruir-relatorios antes)
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import app as aplicacao
+import relatorios
+from benchmarks import banco_local
+
+AGREGACAO_DIRETA = (
+    "SELECT pr.fornecedor_id, COUNT(*) AS pedidos, SUM(ca.quantidade) AS quantidade, "
+    "SUM(ca.quantidade * pr.preco) AS receita, SUM(ca.quantidade * pr.custo_no_fornecedor) AS custo "
+    "FROM tbl_pedidos p JOIN tbl_carrinhos ca ON ca.id = p.carrinho_id JOIN tbl_produtos pr ON pr.id = ca.produto_id "
+    "WHERE p.status <> 'cancelado' GROUP BY pr.fornecedor_id ORDER BY SUM(ca.quantidade * (pr.preco - pr.custo_no_fornecedor)) DESC"
+)
+
+
+def medir(funcao, repeticoes):
+    funcao()  # Aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pedidos', type=int, default=100000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--mysql', action='store_true', help='usa o MySQL configurado em vez do banco local')
+    args = parser.parse_args()
+
+    if not args.mysql:
+        caminho = os.path.join(tempfile.mkdtemp(), 'relatorios.db')
+        banco_local.criar_banco(caminho)
+        banco_local.povoar(caminho, pedidos=args.pedidos)
+        banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=2)
+        conn = aplicacao.connect_db()
+        try:
+            relatorios.reconstruir(conn)
+        finally:
+            conn.close()
+
+    cliente = aplicacao.app.test_client()
+
+    def resumo():
+        resp = cliente.get('/relatorios/margem?agrupar=fornecedor&limite=500')
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+
+    def direta():
+        conn = aplicacao.connect_db()
+        try:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(AGREGACAO_DIRETA)
+                cursor.fetchall()
+        finally:
+            conn.close()
+
+    print(f"resumos (GET /relatorios/margem): {medir(resumo, args.repeticoes):8.2f} ms")
+    print(f"agregação direta nos pedidos:     {medir(direta, args.repeticoes):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Vazão de cadastros (POST /clientes) com o hash de senha em vários custos.
+
+Para cada custo do scrypt (SENHA_CUSTO) e cada quantidade de processos
+auxiliares, dispara cadastros com `--threads` clientes simultâneos e mostra
+cadastros por segundo, latência p95 e as respostas 503 (pendentes acima do
+limite). Com 0 processos o hash roda na thread da requisição, como seria sem o
+pool de processos.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.senhas                                  # banco local, custos 12,14,15
+    python -m benchmarks.senhas --custos 14,16 --processos 0,4 --threads 16
+    python -m benchmarks.senhas --mysql                          # grava no MySQL de .cred
+
+Os cadastros criados ficam no banco (emails carga-senhas-*@exemplo.com).
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import threading
+import time
+
+import admissao
+import app as aplicacao
+import senhas
+from benchmarks import banco_local
+
+_sequencia = itertools.count(1)
+
+
+def _trabalhador(requisicoes, latencias, status, lock):
+    cliente = aplicacao.app.test_client()
+    minhas = []
+    meus_status = {}
+    for _ in range(requisicoes):
+        numero = next(_sequencia)
+        corpo = {
+            'nome': f'Senhas {numero}', 'email': f'carga-senhas-{os.getpid()}-{numero}@exemplo.com',
+            'cpf': f'8{os.getpid() % 1000:03d}{numero:07d}', 'senha': f'senha-{numero}',
+        }
+        inicio = time.perf_counter()
+        resp = cliente.post('/clientes', json=corpo)
+        minhas.append(time.perf_counter() - inicio)
+        meus_status[resp.status_code] = meus_status.get(resp.status_code, 0) + 1
+    with lock:
+        latencias.extend(minhas)
+        for codigo, total in meus_status.items():
+            status[codigo] = status.get(codigo, 0) + total
+
+
+def medir(threads, requisicoes):
+    """Cadastros por segundo, p95 (ms) e contagem por status com `threads` clientes simultâneos."""
+    _trabalhador(max(threads, 2), [], {}, threading.Lock())  # Aquecimento: sobe os processos auxiliares
+
+    latencias = []
+    status = {}
+    lock = threading.Lock()
+    por_thread = max(requisicoes // threads, 1)
+    trabalhadores = [threading.Thread(target=_trabalhador, args=(por_thread, latencias, status, lock))
+                     for _ in range(threads)]
+    inicio = time.perf_counter()
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for trabalhador in trabalhadores:
+        trabalhador.join()
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[min(int(len(latencias) * 0.95), len(latencias) - 1)] * 1000
+    return len(latencias) / duracao, p95, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--custos', default='12,14,15', help='custos do scrypt (log2 N) separados por vírgula')
+    parser.add_argument('--processos', default=f'0,{senhas.PROCESSOS}',
+                        help='quantidades de processos auxiliares a comparar (0 = hash na thread da requisição)')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requisicoes', type=int, default=200)
+    parser.add_argument('--mysql', action='store_true', help='usa o MySQL configurado em vez do banco local')
+    args = parser.parse_args()
+
+    if not args.mysql:
+        caminho = os.path.join(tempfile.mkdtemp(), 'senhas.db')
+        banco_local.criar_banco(caminho)
+        banco_local.usar_no_app(aplicacao, caminho, tamanho_pool=args.threads)
+    # O benchmark mede o hash, não o controle de admissão nem a fila de pendentes
+    admissao.configurar('padrao', vagas=args.threads, fila=args.threads, prazo=600)
+    senhas.ESPERA = 600
+
+    print(f"{'custo':>5} {'processos':>9} {'cadastros/s':>12} {'p95 (ms)':>9}  status")
+    for custo in (int(c) for c in args.custos.split(',')):
+        senhas.CUSTO = custo
+        for processos in (int(p) for p in args.processos.split(',')):
+            senhas.configurar(processos=processos, pendentes=max(args.threads, 1))
+            vazao, p95, status = medir(args.threads, args.requisicoes)
+            print(f"{custo:>5} {processos:>9} {vazao:>12.1f} {p95:>9.1f}  {dict(sorted(status.items()))}")
+    senhas.configurar(processos=0)
+
+
+if __name__ == '__main__':
+    main()
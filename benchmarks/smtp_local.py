@@ -0,0 +1,97 @@
+"""Servidor SMTP local que só guarda as mensagens recebidas, no lugar de um servidor de email real.
+
+Serve de substituto do SMTP nos scripts de benchmark: aceita as mensagens do
+despachante de notificações, guarda-as em memória e pode simular falhas
+temporárias (451 nas primeiras mensagens) e destinatários recusados (550).
+
+    with ServidorSMTP(falhas=3) as smtp:
+        notificacoes.smtp_config.update(host='127.0.0.1', porta=smtp.porta)
+        ...
+        smtp.mensagens  # [(instante da entrega, remetente, [destinatários], texto)]
+"""
+import socketserver
+import threading
+import time
+
+
+class _Sessao(socketserver.StreamRequestHandler):
+    def _responder(self, linha):
+        self.wfile.write(linha.encode() + b'\r\n')
+
+    def handle(self):
+        servidor = self.server.smtp
+        remetente, destinatarios = None, []
+        self._responder('220 smtp-local pronto')
+        for linha in self.rfile:
+            comando = linha.decode(errors='replace').rstrip('\r\n')
+            verbo = comando[:4].upper()
+            if verbo in ('HELO', 'EHLO'):
+                self._responder('250 smtp-local')
+            elif verbo == 'MAIL':
+                remetente, destinatarios = comando.split(':', 1)[1].strip(' <>'), []
+                self._responder('250 OK')
+            elif verbo == 'RCPT':
+                destinatario = comando.split(':', 1)[1].strip(' <>')
+                if destinatario in servidor.recusados:
+                    self._responder('550 destinatario inexistente')
+                else:
+                    destinatarios.append(destinatario)
+                    self._responder('250 OK')
+            elif verbo == 'DATA':
+                self._responder('354 termine com <CRLF>.<CRLF>')
+                partes = []
+                for dado in self.rfile:
+                    if dado in (b'.\r\n', b'.\n'):
+                        break
+                    partes.append(dado[1:] if dado.startswith(b'..') else dado)
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if servidor.falhar():
+                    self._responder('451 falha temporaria simulada')
+                else:
+                    servidor.guardar(remetente, destinatarios, b''.join(partes).decode(errors='replace'))
+                    self._responder('250 OK')
+            elif verbo == 'RSET':
+                remetente, destinatarios = None, []
+                self._responder('250 OK')
+            elif verbo == 'NOOP':
+                self._responder('250 OK')
+            elif verbo == 'QUIT':
+                self._responder('221 tchau')
+                return
+            else:
+                self._responder('502 comando nao implementado')
+
+
+class ServidorSMTP:
+    """Servidor SMTP em uma thread, na porta livre `porta` de 127.0.0.1."""
+
+    def __init__(self, falhas=0, recusados=(), latencia=0.0):
+        self.falhas = falhas  # Quantas mensagens recebem 451 antes de o servidor passar a aceitar
+        self.recusados = set(recusados)
+        self.latencia = latencia  # Segundos de espera por mensagem, como um servidor remoto
+        self.mensagens = []
+        self._lock = threading.Lock()
+        self._servidor = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _Sessao)
+        self._servidor.daemon_threads = True
+        self._servidor.smtp = self
+        self.porta = self._servidor.server_address[1]
+
+    def falhar(self):
+        with self._lock:
+            if self.falhas > 0:
+                self.falhas -= 1
+                return True
+            return False
+
+    def guardar(self, remetente, destinatarios, texto):
+        with self._lock:
+            self.mensagens.append((time.time(), remetente, destinatarios, texto))
+
+    def __enter__(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -0,0 +1,136 @@
+import math
+import os
+import unicodedata
+
+from paginacao import codificar_cursor, decodificar_cursor, ler_limite
+
+# Fração mínima dos trigramas da busca que um nome precisa conter para aparecer no resultado
+SIMILARIDADE_MINIMA = float(os.getenv('BUSCA_SIMILARIDADE', 0.6))
+TERMO_MAXIMO = 100  # Caracteres aceitos em ?q=
+
+# Tabelas pesquisáveis e a coluna indexada de cada uma
+INDEXADAS = {'tbl_produtos': 'nome', 'tbl_clientes': 'nome'}
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos, para que 'João' e 'joao' gerem os mesmos trigramas."""
+    decomposto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def trigramas(texto):
+    """Trigramas indexados de um nome: os de cada palavra, com dois espaços à esquerda.
+
+    O preenchimento gera trigramas de início de palavra ('  j', ' jo'), que
+    atendem buscas por prefixos curtos; os demais atendem qualquer trecho
+    com 3 ou mais letras.
+    """
+    resultado = set()
+    for palavra in normalizar(texto).split():
+        palavra = '  ' + palavra
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+def trigramas_busca(termo):
+    """Trigramas procurados para um termo: trechos de palavra, ou prefixo se a palavra é curta."""
+    resultado = set()
+    for palavra in normalizar(termo).split():
+        if len(palavra) < 3:
+            palavra = '  ' + palavra
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+def indexar(cursor, tabela, registros):
+    """Atualiza o índice para [(id, nome)]; chamar na mesma transação da escrita."""
+    if not registros:
+        return
+    remover(cursor, tabela, [id for id, _ in registros])
+    linhas = [(tabela, trigrama, id) for id, nome in registros for trigrama in trigramas(nome)]
+    if linhas:
+        cursor.executemany(
+            "INSERT INTO tbl_busca_trigramas (tabela, trigrama, registro_id) VALUES (%s, %s, %s)", linhas
+        )
+
+
+def remover(cursor, tabela, ids):
+    """Tira do índice os registros apagados (ou que serão reindexados)."""
+    if ids:
+        cursor.execute(
+            f"DELETE FROM tbl_busca_trigramas WHERE tabela = %s AND registro_id IN ({', '.join(['%s'] * len(ids))})",
+            (tabela, *ids),
+        )
+
+
+def reindexar(conn, tabela, bloco=1000):
+    """Reconstrói o índice de uma tabela inteira, em blocos de `bloco` linhas; retorna quantas foram indexadas."""
+    coluna = INDEXADAS[tabela]
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM tbl_busca_trigramas WHERE tabela = %s", (tabela,))
+    conn.commit()
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT id, {coluna} FROM {tabela} WHERE id > %s ORDER BY id LIMIT %s", (ultimo_id, bloco))
+            registros = cursor.fetchall()
+            if not registros:
+                conn.rollback()
+                return total
+            indexar(cursor, tabela, registros)
+        conn.commit()
+        total += len(registros)
+        ultimo_id = registros[-1][0]
+
+
+def consulta(tabela, colunas, args):
+    """Monta a busca ranqueada de ?q= em `tabela`, paginada por ?limite= e ?apos=.
+
+    Os candidatos saem do índice de trigramas (sem varrer a tabela) e são
+    ordenados pela quantidade de trigramas em comum com o termo; em caso de
+    empate, nomes mais curtos (mais próximos do termo) vêm antes.
+    Retorna (sql, params, limite, deslocamento, total de trigramas do termo).
+    """
+    termo = (args.get('q') or '').strip()
+    if not termo:
+        raise ValueError("Parâmetro 'q' é obrigatório.")
+    if len(termo) > TERMO_MAXIMO:
+        raise ValueError(f"Parâmetro 'q' aceita no máximo {TERMO_MAXIMO} caracteres.")
+    procurados = sorted(trigramas_busca(termo))
+    if not procurados:
+        raise ValueError("Parâmetro 'q' precisa de ao menos uma letra ou número.")
+
+    limite = ler_limite(args.get('limite'))
+    deslocamento = 0
+    if args.get('apos'):
+        # O cursor guarda o termo e a posição; só vale para a mesma busca
+        termo_cursor, deslocamento = decodificar_cursor(args['apos'], 'busca')
+        if termo_cursor != termo or not isinstance(deslocamento, int) or deslocamento < 0:
+            raise ValueError("Parâmetro 'apos' não corresponde a esta busca.")
+
+    minimo = max(1, math.ceil(len(procurados) * SIMILARIDADE_MINIMA))
+    coluna = INDEXADAS[tabela]
+    selecionadas = ', '.join(f"t.{c}" for c in colunas)
+    sql = (
+        f"SELECT {selecionadas}, b.acertos FROM {tabela} t JOIN ("
+        f"SELECT registro_id, COUNT(*) AS acertos FROM tbl_busca_trigramas "
+        f"WHERE tabela = %s AND trigrama IN ({', '.join(['%s'] * len(procurados))}) "
+        f"GROUP BY registro_id HAVING COUNT(*) >= %s"
+        f") b ON b.registro_id = t.id "
+        f"ORDER BY b.acertos DESC, CHAR_LENGTH(t.{coluna}), t.id LIMIT %s OFFSET %s"
+    )
+    params = [tabela, *procurados, minimo, limite + 1, deslocamento]
+    return sql, params, limite, deslocamento, len(procurados)
+
+
+def fatiar_resultado(linhas, args, limite, deslocamento, procurados):
+    """Separa a página, troca 'acertos' pela relevância (0 a 1) e gera o cursor da próxima."""
+    pagina = linhas[:limite]
+    for linha in pagina:
+        linha['relevancia'] = round(linha.pop('acertos') / procurados, 3)
+    proximo = None
+    if len(linhas) > limite:
+        proximo = codificar_cursor('busca', args['q'].strip(), deslocamento + limite)
+    return pagina, proximo
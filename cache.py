@@ -0,0 +1,258 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Backend em memória do processo: LRU limitado por tamanho e por tempo de vida.
+
+    Para não guardar um valor antigo lido antes de uma escrita, cada leitura que
+    falha registra uma marca; invalidar() apaga a marca e a gravação posterior
+    dessa leitura é ignorada.
+    """
+
+    def __init__(self, tamanho_maximo=1000, ttl=30):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._dados = OrderedDict()  # chave -> (expira_em, valor)
+        self._carregando = {}  # chave -> marca da leitura em andamento
+        self._lock = threading.Lock()
+        self.remocoes = 0  # Entradas descartadas por falta de espaço
+
+    def ler(self, chave):
+        """Retorna (encontrado, valor, marca); a marca deve ser passada a gravar()."""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is not None:
+                expira_em, valor = item
+                if expira_em > agora:
+                    self._dados.move_to_end(chave)
+                    return True, valor, None
+                del self._dados[chave]
+            marca = object()
+            self._carregando[chave] = marca
+            return False, None, marca
+
+    def ler_varios(self, chaves):
+        return [self.ler(chave) for chave in chaves]
+
+    def gravar(self, chave, valor, marca):
+        with self._lock:
+            if self.ttl <= 0:  # Cache desligado
+                self._carregando.pop(chave, None)
+                return
+            if self._carregando.get(chave) is not marca:
+                # Houve invalidação (ou outra leitura mais nova) desde a leitura no banco
+                return
+            del self._carregando[chave]
+            self._dados[chave] = (time.monotonic() + self.ttl, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+                self.remocoes += 1
+
+    def liberar(self, chave, marca):
+        """Descarta a marca de uma leitura que não vai gravar (não encontrado ou erro)."""
+        with self._lock:
+            if self._carregando.get(chave) is marca:
+                del self._carregando[chave]
+
+    def invalidar(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+            self._carregando.pop(chave, None)
+
+    def tamanho(self):
+        return len(self._dados)
+
+
+class CacheCompartilhado:
+    """Backend compartilhado entre workers, sobre um cliente no estilo Redis (mget/set com expiração).
+
+    Cada chave tem uma versão; o valor é gravado junto com a versão lida antes da
+    consulta ao banco. invalidar() troca a versão por um valor novo e único, então
+    um valor antigo gravado depois da escrita nunca volta a ser servido.
+
+    As chaves de versão expiram após `ttl_versao` (padrão: 10x o TTL dos valores)
+    sem invalidações, para não acumular uma por registro já escrito. Precisa ser
+    maior que o TTL dos valores: quando a versão expira, todo valor gravado com
+    ela já expirou. Por ser única (e não um contador), uma versão recriada não
+    coincide com a de um valor antigo.
+    """
+
+    def __init__(self, cliente, ttl=30, prefixo='cache', ttl_versao=None):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.ttl_versao = ttl_versao or ttl * 10
+        if self.ttl_versao <= ttl:
+            raise ValueError("ttl_versao precisa ser maior que o ttl dos valores")
+        self.prefixo = prefixo
+        self.remocoes = 0  # O servidor de cache controla as remoções; não é medido aqui
+
+    def _chaves(self, chave):
+        return f"{self.prefixo}:versao:{chave}", f"{self.prefixo}:valor:{chave}"
+
+    def ler(self, chave):
+        chave_versao, chave_valor = self._chaves(chave)
+        versao, bruto = self.cliente.mget([chave_versao, chave_valor])
+        if bruto is not None:
+            versao_gravada, valor = pickle.loads(bruto)
+            if versao_gravada == versao:
+                return True, valor, versao
+        return False, None, versao
+
+    def ler_varios(self, chaves):
+        """Lê várias chaves com um único MGET."""
+        nomes = [nome for chave in chaves for nome in self._chaves(chave)]
+        brutos = self.cliente.mget(nomes)
+        resultados = []
+        for versao, bruto in zip(brutos[::2], brutos[1::2]):
+            if bruto is not None:
+                versao_gravada, valor = pickle.loads(bruto)
+                if versao_gravada == versao:
+                    resultados.append((True, valor, versao))
+                    continue
+            resultados.append((False, None, versao))
+        return resultados
+
+    def gravar(self, chave, valor, marca):
+        _, chave_valor = self._chaves(chave)
+        self.cliente.set(chave_valor, pickle.dumps((marca, valor)), ex=self.ttl)
+
+    def liberar(self, chave, marca):
+        pass
+
+    def invalidar(self, chave):
+        chave_versao, _ = self._chaves(chave)
+        self.cliente.set(chave_versao, os.urandom(8).hex(), ex=self.ttl_versao)
+
+    def tamanho(self):
+        return None
+
+
+class ClienteMemoria:
+    """Substituto local de um servidor de cache compartilhado (subconjunto da API do Redis), para testes."""
+
+    def __init__(self):
+        self._dados = {}  # chave -> (expira_em ou None, valor)
+        self._lock = threading.Lock()
+
+    def _valor(self, chave):
+        item = self._dados.get(chave)
+        if item is None:
+            return None
+        expira_em, valor = item
+        if expira_em is not None and expira_em <= time.monotonic():
+            del self._dados[chave]
+            return None
+        return valor
+
+    def get(self, chave):
+        with self._lock:
+            return self._valor(chave)
+
+    def mget(self, chaves):
+        with self._lock:
+            return [self._valor(chave) for chave in chaves]
+
+    def set(self, chave, valor, ex=None):
+        if isinstance(valor, str):
+            valor = valor.encode()  # Como o Redis, que devolve bytes
+        with self._lock:
+            self._dados[chave] = (time.monotonic() + ex if ex else None, valor)
+        return True
+
+    def incr(self, chave):
+        with self._lock:
+            novo = int(self._valor(chave) or 0) + 1
+            self._dados[chave] = (None, str(novo).encode())
+            return novo
+
+    def delete(self, *chaves):
+        with self._lock:
+            return sum(1 for chave in chaves if self._dados.pop(chave, None) is not None)
+
+
+class CacheLeitura:
+    """Cache read-through: busca no backend e, na falta, carrega do banco e guarda o resultado."""
+
+    def __init__(self, backend, nome):
+        self.backend = backend
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._stats = {'acertos': 0, 'falhas': 0, 'invalidacoes': 0}
+
+    def _contar(self, nome):
+        with self._lock:
+            self._stats[nome] += 1
+
+    def obter(self, chave, carregar):
+        """Retorna o valor de `chave`; `carregar()` consulta o banco quando não está em cache.
+
+        Resultados None (não encontrado) não são guardados.
+        """
+        encontrado, valor, marca = self.backend.ler(chave)
+        if encontrado:
+            self._contar('acertos')
+            return valor
+        self._contar('falhas')
+        try:
+            valor = carregar()
+        except Exception:
+            self.backend.liberar(chave, marca)
+            raise
+        if valor is None:
+            self.backend.liberar(chave, marca)
+        else:
+            self.backend.gravar(chave, valor, marca)
+        return valor
+
+    def obter_varios(self, chaves, carregar):
+        """Como obter(), para várias chaves de uma vez; retorna {chave: valor} só das encontradas.
+
+        `carregar(faltando)` recebe as chaves que não estavam em cache e deve
+        buscá-las no banco com uma única consulta, retornando {chave: valor}.
+        """
+        encontrados = {}
+        marcas = {}
+        for chave, (encontrado, valor, marca) in zip(chaves, self.backend.ler_varios(chaves)):
+            if encontrado:
+                encontrados[chave] = valor
+            else:
+                marcas[chave] = marca
+        with self._lock:
+            self._stats['acertos'] += len(encontrados)
+            self._stats['falhas'] += len(marcas)
+        if not marcas:
+            return encontrados
+
+        try:
+            carregados = carregar(list(marcas))
+        except Exception:
+            for chave, marca in marcas.items():
+                self.backend.liberar(chave, marca)
+            raise
+        for chave, marca in marcas.items():
+            valor = carregados.get(chave)
+            if valor is None:
+                self.backend.liberar(chave, marca)
+            else:
+                self.backend.gravar(chave, valor, marca)
+                encontrados[chave] = valor
+        return encontrados
+
+    def invalidar(self, *chaves):
+        """Remove as chaves do cache; chamar depois do commit da escrita."""
+        for chave in chaves:
+            self.backend.invalidar(chave)
+            self._contar('invalidacoes')
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['remocoes'] = self.backend.remocoes
+        stats['tamanho'] = self.backend.tamanho()
+        return stats
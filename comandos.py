@@ -0,0 +1,170 @@
+import os
+
+import metricas
+
+# Usa prepared statements do servidor para os comandos registrados (SQL_PREPARADAS=0 desliga, para comparar)
+PREPARADAS = os.getenv('SQL_PREPARADAS', '1') != '0'
+
+# Comandos mais executados da aplicação. Use sempre estas constantes: o
+# mysql-connector só reaproveita um statement preparado quando recebe o mesmo
+# objeto de texto da execução anterior.
+PRODUTO_POR_ID = "SELECT * FROM tbl_produtos WHERE id = %s"
+PRODUTO_EXISTE = "SELECT id FROM tbl_produtos WHERE id = %s"
+CLIENTE_POR_ID = "SELECT * FROM tbl_clientes WHERE id = %s"
+CARRINHO_POR_ID = "SELECT * FROM tbl_carrinhos WHERE id = %s"
+INSERIR_CLIENTE = "INSERT INTO tbl_clientes (nome, email, cpf, senha) VALUES (%s, %s, %s, %s)"
+INSERIR_PRODUTO = ("INSERT INTO tbl_produtos (nome, descrição, preco, qtd_em_estoque, fornecedor_id, custo_no_fornecedor) "
+                   "VALUES (%s, %s, %s, %s, %s, %s)")
+INSERIR_CARRINHO = "INSERT INTO tbl_carrinhos (produto_id, quantidade, cliente_id) VALUES (%s, %s, %s)"
+INSERIR_PEDIDO = "INSERT INTO tbl_pedidos (cliente_id, carrinho_id, data_hora, status) VALUES (%s, %s, %s, %s)"
+RESERVAR_ESTOQUE = "UPDATE tbl_produtos SET qtd_em_estoque = qtd_em_estoque - %s WHERE id = %s AND qtd_em_estoque >= %s"
+REGISTRAR_RESERVA = "INSERT INTO tbl_reservas (carrinho_id, produto_id, quantidade, expira_em) VALUES (%s, %s, %s, %s)"
+CONFIRMAR_RESERVA = "DELETE FROM tbl_reservas WHERE carrinho_id = %s"
+CONFIRMAR_RESERVA_FRAGMENTOS = "DELETE FROM tbl_reservas_fragmentos WHERE carrinho_id = %s"
+REGISTRAR_RESERVA_FRAGMENTO = "INSERT INTO tbl_reservas_fragmentos (carrinho_id, fragmento, quantidade) VALUES (%s, %s, %s)"
+IMAGEM_DO_PRODUTO = "SELECT hash, tipo FROM tbl_produto_imagens WHERE produto_id = %s"
+INSERIR_NOTIFICACAO = "INSERT INTO tbl_notificacoes (tipo, pedido_id, proxima_em, criada_em) VALUES (%s, %s, %s, %s)"
+# Resumos de vendas (relatorios.py): valores do pedido, a venda e a soma no grupo do resumo
+VENDA_DO_PEDIDO = (
+    "SELECT p.id, DATE(p.data_hora), ca.produto_id, COALESCE(pr.fornecedor_id, 0), p.status, ca.quantidade, "
+    "ca.quantidade * pr.preco, ca.quantidade * COALESCE(pr.custo_no_fornecedor, 0) "
+    "FROM tbl_pedidos p JOIN tbl_carrinhos ca ON ca.id = p.carrinho_id JOIN tbl_produtos pr ON pr.id = ca.produto_id "
+    "WHERE p.id = %s"
+)
+REGISTRAR_VENDA = ("INSERT INTO tbl_vendas (pedido_id, dia, produto_id, fornecedor_id, status, quantidade, receita, custo) "
+                   "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
+SOMAR_VENDA = (
+    "INSERT INTO tbl_resumo_vendas (dia, produto_id, fornecedor_id, status, pedidos, quantidade, receita, custo) "
+    "VALUES (%s, %s, %s, %s, 1, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE pedidos = pedidos + 1, quantidade = quantidade + VALUES(quantidade), "
+    "receita = receita + VALUES(receita), custo = custo + VALUES(custo)"
+)
+# Registro de mudanças (mudancas.py)
+REGISTRAR_MUDANCA = "INSERT INTO tbl_mudancas (tabela, registro_id, operacao, criada_em) VALUES (%s, %s, %s, %s)"
+
+REGISTRO = {
+    'produto_por_id': PRODUTO_POR_ID,
+    'produto_existe': PRODUTO_EXISTE,
+    'cliente_por_id': CLIENTE_POR_ID,
+    'carrinho_por_id': CARRINHO_POR_ID,
+    'inserir_cliente': INSERIR_CLIENTE,
+    'inserir_produto': INSERIR_PRODUTO,
+    'inserir_carrinho': INSERIR_CARRINHO,
+    'inserir_pedido': INSERIR_PEDIDO,
+    'reservar_estoque': RESERVAR_ESTOQUE,
+    'registrar_reserva': REGISTRAR_RESERVA,
+    'confirmar_reserva': CONFIRMAR_RESERVA,
+    'confirmar_reserva_fragmentos': CONFIRMAR_RESERVA_FRAGMENTOS,
+    'registrar_reserva_fragmento': REGISTRAR_RESERVA_FRAGMENTO,
+    'inserir_notificacao': INSERIR_NOTIFICACAO,
+    'venda_do_pedido': VENDA_DO_PEDIDO,
+    'registrar_venda': REGISTRAR_VENDA,
+    'somar_venda': SOMAR_VENDA,
+    'registrar_mudanca': REGISTRAR_MUDANCA,
+    'imagem_do_produto': IMAGEM_DO_PRODUTO,
+}
+_NOMES = {sql: nome for nome, sql in REGISTRO.items()}
+
+# Leituras preparadas no aquecimento do worker, com o tipo de cursor (dictionary) que as rotas usam:
+# o statement preparado é guardado por (sql, dictionary)
+AQUECER = (
+    ('produto_por_id', True),
+    ('produto_existe', False),
+    ('cliente_por_id', True),
+    ('carrinho_por_id', True),
+    ('imagem_do_produto', False),
+    ('venda_do_pedido', False),
+)
+
+
+def nome_do_comando(sql):
+    """Nome do comando registrado com este texto; None para SQL fora do registro."""
+    return _NOMES.get(sql)
+
+
+def contar(nome, evento):
+    """Conta uma execução de comando registrado: 'preparo' (statement novo na conexão), 'reuso' ou 'direto'."""
+    metricas.registro.incrementar('sql_comandos_registrados_total', (('comando', nome), ('evento', evento)))
+
+
+def aquecer(conn):
+    """Prepara na conexão as leituras de AQUECER, executadas com parâmetros nulos (sem linhas); retorna quantas."""
+    if not PREPARADAS:
+        return 0
+    for nome, dictionary in AQUECER:
+        sql = REGISTRO[nome]
+        with conn.cursor(dictionary=dictionary) as cursor:
+            cursor.execute(sql, (None,) * sql.count('%s'))
+    conn.rollback()
+    return len(AQUECER)
+
+
+class CursorPreparavel:
+    """Cursor que executa os comandos registrados por statements preparados da conexão.
+
+    SQL fora do registro (e executemany) vai para o cursor comum. O resultado de
+    um statement preparado é lido por inteiro logo após a execução, pois a
+    conexão não aceita outro comando com linhas pendentes; os comandos
+    registrados retornam no máximo uma linha.
+    """
+
+    def __init__(self, conn, cursor, dictionary=False):
+        self._conn = conn  # ConexaoDoPool: guarda os statements preparados da conexão física
+        self._comum = cursor
+        self._dictionary = dictionary
+        self._ativo = cursor
+        self._linhas = None
+
+    def __getattr__(self, nome):
+        # rowcount, lastrowid, column_names... do último cursor usado
+        return getattr(self._ativo, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def execute(self, sql, params=()):
+        nome = nome_do_comando(sql)
+        if nome is None:
+            self._ativo, self._linhas = self._comum, None
+            return self._comum.execute(sql, params)
+        if not PREPARADAS:
+            contar(nome, 'direto')
+            self._ativo, self._linhas = self._comum, None
+            return self._comum.execute(sql, params)
+
+        cursor, novo = self._conn.preparado(sql, self._dictionary)
+        contar(nome, 'preparo' if novo else 'reuso')
+        self._ativo = cursor
+        cursor.execute(sql, tuple(params))
+        self._linhas = cursor.fetchall() if cursor.description else []
+
+    def executemany(self, sql, seq_params):
+        self._ativo, self._linhas = self._comum, None
+        return self._comum.executemany(sql, seq_params)
+
+    def fetchone(self):
+        if self._linhas is None:
+            return self._comum.fetchone()
+        return self._linhas.pop(0) if self._linhas else None
+
+    def fetchmany(self, size=1):
+        if self._linhas is None:
+            return self._comum.fetchmany(size)
+        lote, self._linhas = self._linhas[:size], self._linhas[size:]
+        return lote
+
+    def fetchall(self):
+        if self._linhas is None:
+            return self._comum.fetchall()
+        linhas, self._linhas = self._linhas, []
+        return linhas
+
+    def close(self):
+        # Os statements preparados continuam na conexão para as próximas requisições
+        self._comum.close()
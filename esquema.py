@@ -0,0 +1,270 @@
+from datetime import datetime
+
+from mysql.connector import Error, errorcode
+
+# Migrações em ordem: (versão, descrição, comandos). Uma versão aplicada nunca
+# é alterada; mudanças de esquema entram como uma nova versão no fim da lista.
+MIGRACOES = [
+    (1, "tabelas principais", [
+        """CREATE TABLE IF NOT EXISTS tbl_clientes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            cpf VARCHAR(14) NOT NULL,
+            senha VARCHAR(255) NOT NULL,
+            UNIQUE KEY uq_clientes_email (email),
+            UNIQUE KEY uq_clientes_cpf (cpf)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS tbl_fornecedores (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            cnpj VARCHAR(18) NOT NULL,
+            UNIQUE KEY uq_fornecedores_email (email),
+            UNIQUE KEY uq_fornecedores_cnpj (cnpj)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS tbl_produtos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome VARCHAR(255) NOT NULL,
+            descrição TEXT,
+            preco DECIMAL(10, 2) NOT NULL,
+            qtd_em_estoque INT NOT NULL DEFAULT 0,
+            fornecedor_id INT,
+            custo_no_fornecedor DECIMAL(10, 2)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS tbl_carrinhos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            produto_id INT NOT NULL,
+            quantidade INT NOT NULL,
+            cliente_id INT NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS tbl_pedidos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            cliente_id INT NOT NULL,
+            carrinho_id INT NOT NULL,
+            data_hora DATETIME NOT NULL,
+            status VARCHAR(20) NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    ]),
+    # Índices secundários no formato de cada consulta de app.py. No InnoDB todo
+    # índice secundário termina implicitamente no id, então (coluna) já atende
+    # "WHERE coluna = ? ORDER BY id" e a paginação "ORDER BY coluna, id".
+    (2, "índices das listagens e filtros", [
+        "CREATE INDEX idx_clientes_nome ON tbl_clientes (nome)",  # ordenar_por=nome (email e cpf usam as chaves únicas)
+        "CREATE INDEX idx_carrinhos_cliente ON tbl_carrinhos (cliente_id)",  # /carrinhos/cliente/<id>
+        "CREATE INDEX idx_carrinhos_produto ON tbl_carrinhos (produto_id)",  # ?produto_id= e ordenar_por=produto_id
+        "CREATE INDEX idx_carrinhos_quantidade ON tbl_carrinhos (quantidade)",  # ordenar_por=quantidade
+        "CREATE INDEX idx_pedidos_cliente ON tbl_pedidos (cliente_id)",  # ?cliente_id=, /pedidos/cliente/<id>
+        "CREATE INDEX idx_pedidos_carrinho ON tbl_pedidos (carrinho_id)",  # ?carrinho_id= e ordenar_por=carrinho_id
+        "CREATE INDEX idx_pedidos_data_hora ON tbl_pedidos (data_hora)",  # ordenar_por=data_hora
+        "CREATE INDEX idx_pedidos_status ON tbl_pedidos (status)",  # ordenar_por=status
+        "CREATE INDEX idx_pedidos_cliente_data ON tbl_pedidos (cliente_id, data_hora)",  # pedidos de um cliente por data
+    ]),
+    (3, "reservas de estoque e estoque fragmentado", [
+        """CREATE TABLE IF NOT EXISTS tbl_reservas (
+            carrinho_id INT PRIMARY KEY,
+            produto_id INT NOT NULL,
+            quantidade INT NOT NULL,
+            expira_em DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        "CREATE INDEX idx_reservas_expira ON tbl_reservas (expira_em)",  # expirar-reservas
+        """CREATE TABLE IF NOT EXISTS tbl_estoque_fragmentos (
+            produto_id INT NOT NULL,
+            fragmento INT NOT NULL,
+            quantidade INT NOT NULL,
+            PRIMARY KEY (produto_id, fragmento)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    ]),
+    (4, "índice de busca por nome", [
+        """CREATE TABLE IF NOT EXISTS tbl_busca_trigramas (
+            tabela VARCHAR(32) NOT NULL,
+            trigrama CHAR(3) NOT NULL,
+            registro_id INT NOT NULL,
+            PRIMARY KEY (tabela, trigrama, registro_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin""",
+    ]),
+    (5, "chaves de idempotência", [
+        """CREATE TABLE IF NOT EXISTS tbl_idempotencia (
+            chave VARCHAR(200) NOT NULL,
+            rota VARCHAR(100) NOT NULL,
+            impressao CHAR(32) NOT NULL,
+            status INT,
+            corpo MEDIUMBLOB,
+            mimetype VARCHAR(100),
+            criada_em DATETIME NOT NULL,
+            PRIMARY KEY (chave, rota)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin""",
+        "CREATE INDEX idx_idempotencia_criada ON tbl_idempotencia (criada_em)",  # limpar-idempotencia
+    ]),
+    # Fila (outbox) dos emails de pedido: gravada na transação do pedido, esvaziada pelo despachante
+    (6, "fila de notificações", [
+        """CREATE TABLE IF NOT EXISTS tbl_notificacoes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            tipo VARCHAR(30) NOT NULL,
+            pedido_id INT NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pendente',
+            tentativas INT NOT NULL DEFAULT 0,
+            proxima_em DATETIME NOT NULL,
+            criada_em DATETIME NOT NULL,
+            ultimo_erro VARCHAR(500)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        "CREATE INDEX idx_notificacoes_fila ON tbl_notificacoes (status, proxima_em)",  # despachante e estado da fila
+    ]),
+    # Resumos dos relatórios (relatorios.py); os pedidos já existentes entram com flask reconstruir-relatorios
+    (7, "resumos de vendas e margem", [
+        """CREATE TABLE IF NOT EXISTS tbl_vendas (
+            pedido_id INT PRIMARY KEY,
+            dia DATE NOT NULL,
+            produto_id INT NOT NULL,
+            fornecedor_id INT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            quantidade INT NOT NULL,
+            receita DECIMAL(14, 2) NOT NULL,
+            custo DECIMAL(14, 2) NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        """CREATE TABLE IF NOT EXISTS tbl_resumo_vendas (
+            dia DATE NOT NULL,
+            produto_id INT NOT NULL,
+            fornecedor_id INT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            pedidos INT NOT NULL,
+            quantidade INT NOT NULL,
+            receita DECIMAL(16, 2) NOT NULL,
+            custo DECIMAL(16, 2) NOT NULL,
+            PRIMARY KEY (dia, produto_id, fornecedor_id, status)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    ]),
+    # Registro de mudanças das rotas /produtos/mudancas e /pedidos/mudancas (mudancas.py)
+    (8, "registro de mudanças para sincronização", [
+        """CREATE TABLE IF NOT EXISTS tbl_mudancas (
+            versao BIGINT AUTO_INCREMENT PRIMARY KEY,
+            tabela VARCHAR(32) NOT NULL,
+            registro_id INT NOT NULL,
+            operacao VARCHAR(10) NOT NULL,
+            criada_em DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        "CREATE INDEX idx_mudancas_tabela ON tbl_mudancas (tabela, versao)",  # páginas de cada recurso
+        "CREATE INDEX idx_mudancas_criada ON tbl_mudancas (criada_em)",  # limpar-mudancas
+    ]),
+    # Imagens dos produtos (imagens.py): os arquivos ficam em IMAGENS_DIR, com o SHA-256 como nome
+    (9, "imagens dos produtos", [
+        """CREATE TABLE IF NOT EXISTS tbl_produto_imagens (
+            produto_id INT PRIMARY KEY,
+            hash CHAR(64) NOT NULL,
+            tipo VARCHAR(20) NOT NULL,
+            tamanho INT NOT NULL,
+            atualizada_em DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        "CREATE INDEX idx_produto_imagens_hash ON tbl_produto_imagens (hash)",  # limpar-imagens e gerar-miniaturas
+    ]),
+    # Ordem de commit do registro de mudanças: as páginas seguem a sequência atribuída por mudancas.publicar()
+    (10, "sequência de publicação das mudanças", [
+        "ALTER TABLE tbl_mudancas ADD COLUMN sequencia BIGINT NULL",
+        # As mudanças já gravadas mantêm a numeração: tokens emitidos antes continuam válidos
+        "UPDATE tbl_mudancas SET sequencia = versao WHERE sequencia IS NULL",
+        """CREATE TABLE IF NOT EXISTS tbl_mudancas_sequencia (
+            id INT PRIMARY KEY,
+            valor BIGINT NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+        "INSERT IGNORE INTO tbl_mudancas_sequencia (id, valor) SELECT 1, COALESCE(MAX(versao), 0) FROM tbl_mudancas",
+        "CREATE INDEX idx_mudancas_sequencia ON tbl_mudancas (tabela, sequencia)",  # páginas de cada recurso
+        "CREATE INDEX idx_mudancas_publicar ON tbl_mudancas (sequencia)",  # mudanças ainda não publicadas
+    ]),
+    # Quanto cada reserva de um produto fragmentado baixou de cada fragmento; o resto da reserva
+    # (ou a reserva inteira, sem linhas aqui) saiu de tbl_produtos e volta para lá
+    (11, "fragmentos de origem das reservas", [
+        """CREATE TABLE IF NOT EXISTS tbl_reservas_fragmentos (
+            carrinho_id INT NOT NULL,
+            fragmento INT NOT NULL,
+            quantidade INT NOT NULL,
+            PRIMARY KEY (carrinho_id, fragmento)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    ]),
+]
+
+# Erros que indicam que o objeto já existe (banco criado à mão antes das migrações)
+_JA_EXISTE = {errorcode.ER_TABLE_EXISTS_ERROR, errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME}
+
+
+def _garantir_controle(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS tbl_migracoes ("
+        "versao INT PRIMARY KEY, descricao VARCHAR(200) NOT NULL, aplicada_em DATETIME NOT NULL"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    )
+
+
+def versoes_aplicadas(conn):
+    """Versões já registradas em tbl_migracoes."""
+    with conn.cursor() as cursor:
+        _garantir_controle(cursor)
+        cursor.execute("SELECT versao FROM tbl_migracoes")
+        versoes = {linha[0] for linha in cursor.fetchall()}
+    conn.commit()
+    return versoes
+
+
+def pendentes(conn):
+    """Migrações ainda não aplicadas, em ordem."""
+    aplicadas = versoes_aplicadas(conn)
+    return [migracao for migracao in MIGRACOES if migracao[0] not in aplicadas]
+
+
+def migrar(conn, ate=None, ao_aplicar=None):
+    """Aplica as migrações pendentes (até a versão `ate`, se informada); retorna as versões aplicadas.
+
+    DDL no MySQL faz commit implícito, então cada comando é idempotente em
+    vez de transacional: tabelas usam IF NOT EXISTS e índices que já existem
+    são ignorados. Uma migração interrompida pode ser simplesmente reexecutada.
+    """
+    aplicadas = []
+    for versao, descricao, comandos in pendentes(conn):
+        if ate is not None and versao > ate:
+            break
+        if ao_aplicar:
+            ao_aplicar(versao, descricao)
+        with conn.cursor() as cursor:
+            for comando in comandos:
+                try:
+                    cursor.execute(comando)
+                except Error as err:
+                    if err.errno not in _JA_EXISTE:
+                        raise
+            cursor.execute(
+                "INSERT INTO tbl_migracoes (versao, descricao, aplicada_em) VALUES (%s, %s, %s)",
+                (versao, descricao, datetime.now()),
+            )
+        conn.commit()
+        aplicadas.append(versao)
+    return aplicadas
+
+
+def _problemas(linha):
+    """Traduz uma linha do EXPLAIN do MySQL nos problemas que o consultor aponta."""
+    problemas = []
+    extra = linha.get('Extra') or ''
+    if linha.get('type') == 'ALL':
+        problemas.append('varredura')
+    if 'Using filesort' in extra:
+        problemas.append('filesort')
+    if 'Using temporary' in extra:
+        problemas.append('temporaria')
+    return problemas
+
+
+def analisar(conn, consultas):
+    """Roda EXPLAIN em cada consulta e aponta varreduras completas, filesorts e tabelas temporárias.
+
+    `consultas` é uma lista de (descrição, sql, params, problemas esperados).
+    Retorna [(descrição, tabela, problema, linhas estimadas, esperado)].
+    """
+    achados = []
+    for descricao, sql, params, esperados in consultas:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("EXPLAIN " + sql, tuple(params))
+            plano = cursor.fetchall()
+        for linha in plano:
+            for problema in _problemas(linha):
+                achados.append((descricao, linha.get('table'), problema, linha.get('rows'), problema in esperados))
+    conn.rollback()
+    return achados
@@ -0,0 +1,234 @@
+import os
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import comandos
+import mudancas
+
+# Tempo que um item de carrinho segura o estoque antes de ser considerado abandonado
+RESERVA_MINUTOS = int(os.getenv('RESERVA_MINUTOS', 30))
+
+# Produtos muito disputados cujo estoque é dividido em fragmentos (ex.: "12,57")
+PRODUTOS_FRAGMENTADOS = {int(id) for id in os.getenv('ESTOQUE_FRAGMENTADO', '').split(',') if id.strip()}
+FRAGMENTOS = int(os.getenv('ESTOQUE_FRAGMENTOS', 8))
+
+
+def reservar(cursor, produto_id, quantidade, carrinho_id=None):
+    """Baixa `quantidade` do estoque se houver saldo, em um único UPDATE condicional.
+
+    A verificação e a baixa acontecem no mesmo comando, então duas compras
+    simultâneas nunca vendem a mesma unidade. Retorna True se a baixa foi feita.
+
+    Em produtos fragmentados, uma quantidade maior que a de qualquer fragmento
+    é baixada de vários fragmentos na mesma transação. Com `carrinho_id`, o
+    quanto saiu de cada fragmento fica em tbl_reservas_fragmentos, para
+    liberar_reservas() devolver a eles.
+    """
+    baixas = None
+    if produto_id in PRODUTOS_FRAGMENTADOS:
+        baixas = _reservar_fragmentado(cursor, produto_id, quantidade)
+    if baixas is not None:
+        reservado = True
+        if carrinho_id is not None:
+            cursor.executemany(comandos.REGISTRAR_RESERVA_FRAGMENTO,
+                               [(carrinho_id, fragmento, baixa) for fragmento, baixa in baixas])
+    else:
+        cursor.execute(comandos.RESERVAR_ESTOQUE, (quantidade, produto_id, quantidade))
+        reservado = cursor.rowcount == 1
+    if reservado:  # O estoque publicado em /produtos/mudancas mudou
+        mudancas.registrar(cursor, 'tbl_produtos', [produto_id])
+    return reservado
+
+
+def _reservar_fragmentado(cursor, produto_id, quantidade):
+    """Tenta baixar o estoque de um fragmento sorteado, espalhando os bloqueios entre as linhas.
+
+    Retorna [(fragmento, quantidade baixada)] ou None sem saldo.
+    """
+    inicio = random.randrange(FRAGMENTOS)
+    for deslocamento in range(FRAGMENTOS):
+        fragmento = (inicio + deslocamento) % FRAGMENTOS
+        cursor.execute(
+            "UPDATE tbl_estoque_fragmentos SET quantidade = quantidade - %s "
+            "WHERE produto_id = %s AND fragmento = %s AND quantidade >= %s",
+            (quantidade, produto_id, fragmento, quantidade),
+        )
+        if cursor.rowcount == 1:
+            return [(fragmento, quantidade)]
+
+    # Nenhum fragmento sozinho tem o saldo: bloqueia todos e baixa de mais de um
+    cursor.execute(
+        "SELECT fragmento, quantidade FROM tbl_estoque_fragmentos WHERE produto_id = %s FOR UPDATE",
+        (produto_id,),
+    )
+    linhas = cursor.fetchall()
+    if not linhas or sum(disponivel for _, disponivel in linhas) < quantidade:
+        return None
+    baixas = []
+    restante = quantidade
+    for fragmento, disponivel in linhas:
+        baixa = min(disponivel, restante)
+        if baixa:
+            cursor.execute(
+                "UPDATE tbl_estoque_fragmentos SET quantidade = quantidade - %s WHERE produto_id = %s AND fragmento = %s",
+                (baixa, produto_id, fragmento),
+            )
+            baixas.append((fragmento, baixa))
+            restante -= baixa
+        if not restante:
+            break
+    return baixas
+
+
+def registrar_reserva(cursor, carrinho_id, produto_id, quantidade):
+    """Marca o item de carrinho como reserva com prazo de validade."""
+    expira_em = datetime.now() + timedelta(minutes=RESERVA_MINUTOS)
+    cursor.execute(comandos.REGISTRAR_RESERVA, (carrinho_id, produto_id, quantidade, expira_em))
+
+
+def confirmar_reserva(cursor, carrinho_id):
+    """Torna a baixa definitiva (o carrinho virou pedido): a reserva deixa de expirar."""
+    cursor.execute(comandos.CONFIRMAR_RESERVA, (carrinho_id,))
+    cursor.execute(comandos.CONFIRMAR_RESERVA_FRAGMENTOS, (carrinho_id,))
+
+
+def liberar_reservas(cursor, carrinho_ids):
+    """Devolve ao estoque as reservas dos carrinhos informados; retorna os ids de produto afetados.
+
+    O que saiu de fragmentos volta a cada um deles (se o fragmento não existe
+    mais, o produto foi consolidado, volta a tbl_produtos); o resto, a tbl_produtos.
+    """
+    if not carrinho_ids:
+        return set()
+    marcadores = ", ".join(["%s"] * len(carrinho_ids))
+    cursor.execute(
+        f"SELECT carrinho_id, produto_id, quantidade FROM tbl_reservas WHERE carrinho_id IN ({marcadores}) FOR UPDATE",
+        tuple(carrinho_ids),
+    )
+    reservas = {carrinho_id: (produto_id, quantidade) for carrinho_id, produto_id, quantidade in cursor.fetchall()}
+    cursor.execute(
+        f"SELECT carrinho_id, fragmento, quantidade FROM tbl_reservas_fragmentos "
+        f"WHERE carrinho_id IN ({marcadores}) FOR UPDATE",
+        tuple(carrinho_ids),
+    )
+    devolver = defaultdict(int)  # (produto_id, fragmento ou None) -> quantidade
+    for carrinho_id, fragmento, quantidade in cursor.fetchall():
+        if carrinho_id in reservas:
+            produto_id, total = reservas[carrinho_id]
+            devolver[(produto_id, fragmento)] += quantidade
+            reservas[carrinho_id] = (produto_id, total - quantidade)
+    for produto_id, quantidade in reservas.values():
+        if quantidade:
+            devolver[(produto_id, None)] += quantidade
+
+    cursor.execute(f"DELETE FROM tbl_reservas WHERE carrinho_id IN ({marcadores})", tuple(carrinho_ids))
+    cursor.execute(f"DELETE FROM tbl_reservas_fragmentos WHERE carrinho_id IN ({marcadores})", tuple(carrinho_ids))
+    # Incrementos relativos: não dependem do valor lido, então não disputam com as baixas
+    for (produto_id, fragmento), quantidade in sorted(devolver.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        if fragmento is not None:
+            cursor.execute(
+                "UPDATE tbl_estoque_fragmentos SET quantidade = quantidade + %s WHERE produto_id = %s AND fragmento = %s",
+                (quantidade, produto_id, fragmento),
+            )
+            if cursor.rowcount == 1:
+                continue
+        cursor.execute(
+            "UPDATE tbl_produtos SET qtd_em_estoque = qtd_em_estoque + %s WHERE id = %s",
+            (quantidade, produto_id),
+        )
+    produtos = sorted({produto_id for produto_id, _ in devolver})
+    mudancas.registrar(cursor, 'tbl_produtos', produtos)
+    return set(produtos)
+
+
+def expirar_reservas(conn, limite=500):
+    """Remove os carrinhos abandonados (reserva vencida) e devolve o estoque, em lotes.
+
+    Retorna (carrinhos removidos, ids de produto afetados).
+    """
+    removidos = 0
+    produtos = set()
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT carrinho_id FROM tbl_reservas WHERE expira_em <= %s "
+                "ORDER BY expira_em LIMIT %s FOR UPDATE SKIP LOCKED",
+                (datetime.now(), limite),
+            )
+            carrinho_ids = [linha[0] for linha in cursor.fetchall()]
+            if not carrinho_ids:
+                conn.rollback()
+                return removidos, produtos
+            produtos |= liberar_reservas(cursor, carrinho_ids)
+            marcadores = ", ".join(["%s"] * len(carrinho_ids))
+            cursor.execute(f"DELETE FROM tbl_carrinhos WHERE id IN ({marcadores})", tuple(carrinho_ids))
+        conn.commit()
+        removidos += len(carrinho_ids)
+
+
+def estoque_fragmentado(cursor, produto_id):
+    """Soma do estoque guardado nos fragmentos de um produto."""
+    cursor.execute("SELECT COALESCE(SUM(quantidade), 0) FROM tbl_estoque_fragmentos WHERE produto_id = %s", (produto_id,))
+    return int(cursor.fetchone()[0])
+
+
+def fragmentar(conn, produto_id, fragmentos=None):
+    """Distribui o estoque do produto em fragmentos (use junto com ESTOQUE_FRAGMENTADO)."""
+    fragmentos = fragmentos or FRAGMENTOS
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT qtd_em_estoque FROM tbl_produtos WHERE id = %s FOR UPDATE", (produto_id,))
+        linha = cursor.fetchone()
+        if not linha:
+            conn.rollback()
+            return False
+        _distribuir(cursor, produto_id, linha[0] + estoque_fragmentado(cursor, produto_id), fragmentos)
+        # O total não muda, mas o qtd_em_estoque da listagem (só tbl_produtos) sim: muda a versão do ETag
+        mudancas.registrar(cursor, 'tbl_produtos', [produto_id])
+    conn.commit()
+    return True
+
+
+def _distribuir(cursor, produto_id, total, fragmentos):
+    """Divide `total` igualmente entre `fragmentos` fragmentos e zera o estoque em tbl_produtos."""
+    cursor.execute("DELETE FROM tbl_estoque_fragmentos WHERE produto_id = %s", (produto_id,))
+    base, resto = divmod(total, fragmentos)
+    cursor.executemany(
+        "INSERT INTO tbl_estoque_fragmentos (produto_id, fragmento, quantidade) VALUES (%s, %s, %s)",
+        [(produto_id, fragmento, base + (1 if fragmento < resto else 0)) for fragmento in range(fragmentos)],
+    )
+    cursor.execute("UPDATE tbl_produtos SET qtd_em_estoque = 0 WHERE id = %s", (produto_id,))
+
+
+def refragmentar(cursor, produto_ids):
+    """Depois de gravar um qtd_em_estoque absoluto, leva o valor aos fragmentos dos produtos fragmentados.
+
+    O valor gravado substitui o estoque dos fragmentos (como substituiria o de
+    um produto comum) e é redistribuído entre o mesmo número de fragmentos;
+    sem isso a soma exibida seria o valor gravado mais o saldo antigo deles.
+    Chamar na transação da escrita, depois do UPDATE em tbl_produtos.
+    """
+    if not produto_ids:
+        return
+    marcadores = ", ".join(["%s"] * len(produto_ids))
+    cursor.execute(
+        f"SELECT produto_id, fragmento FROM tbl_estoque_fragmentos WHERE produto_id IN ({marcadores}) FOR UPDATE",
+        tuple(produto_ids),
+    )
+    fragmentos = defaultdict(int)
+    for produto_id, _ in cursor.fetchall():
+        fragmentos[produto_id] += 1
+    for produto_id in sorted(fragmentos):
+        cursor.execute("SELECT qtd_em_estoque FROM tbl_produtos WHERE id = %s", (produto_id,))
+        _distribuir(cursor, produto_id, cursor.fetchone()[0], fragmentos[produto_id])
+
+
+def consolidar(conn, produto_id):
+    """Devolve o estoque dos fragmentos para tbl_produtos.qtd_em_estoque."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT quantidade FROM tbl_estoque_fragmentos WHERE produto_id = %s FOR UPDATE", (produto_id,))
+        total = sum(linha[0] for linha in cursor.fetchall())
+        cursor.execute("DELETE FROM tbl_estoque_fragmentos WHERE produto_id = %s", (produto_id,))
+        cursor.execute("UPDATE tbl_produtos SET qtd_em_estoque = qtd_em_estoque + %s WHERE id = %s", (total, produto_id))
+        mudancas.registrar(cursor, 'tbl_produtos', [produto_id])
+    conn.commit()
@@ -0,0 +1,119 @@
+# Expansão de pedidos (?expandir=cliente,carrinho,produtos) sem consultas por linha
+
+RELACOES = ['cliente', 'carrinho', 'produtos']
+
+# Colunas trazidas de cada tabela relacionada (a senha do cliente nunca é expandida)
+COLUNAS_CLIENTE = ['id', 'nome', 'email', 'cpf']
+COLUNAS_CARRINHO = ['id', 'produto_id', 'quantidade', 'cliente_id']
+COLUNAS_PRODUTO = ['id', 'nome', 'descrição', 'preco', 'fornecedor_id', 'custo_no_fornecedor']
+
+
+def ler_expandir(valor):
+    """Converte ?expandir=cliente,produtos no conjunto de relações pedidas."""
+    if not valor:
+        return set()
+    expandir = {relacao.strip() for relacao in valor.split(',') if relacao.strip()}
+    invalidas = expandir - set(RELACOES)
+    if invalidas:
+        raise ValueError(f"Parâmetro 'expandir' aceita apenas: {', '.join(RELACOES)}.")
+    return expandir
+
+
+def _colunas(apelido, prefixo, colunas):
+    return [f"{apelido}.{coluna} AS {prefixo}__{coluna}" for coluna in colunas]
+
+
+def _colunas_carrinho(expandir):
+    """Colunas de carrinho/produto, com o total da linha calculado no banco."""
+    colunas = _colunas('ca', 'carrinho', COLUNAS_CARRINHO)
+    if 'produtos' in expandir:
+        colunas += _colunas('pr', 'produto', COLUNAS_PRODUTO)
+    colunas.append("pr.preco * ca.quantidade AS carrinho__total")
+    return colunas
+
+
+def consulta_pedido(expandir):
+    """SELECT de um pedido com as relações pedidas, em uma única consulta com JOINs."""
+    colunas = ["p.*"]
+    juncoes = []
+    if 'cliente' in expandir:
+        colunas += _colunas('c', 'cliente', COLUNAS_CLIENTE)
+        juncoes.append("LEFT JOIN tbl_clientes c ON c.id = p.cliente_id")
+    if expandir & {'carrinho', 'produtos'}:
+        colunas += _colunas_carrinho(expandir)
+        juncoes.append("LEFT JOIN tbl_carrinhos ca ON ca.id = p.carrinho_id")
+        juncoes.append("LEFT JOIN tbl_produtos pr ON pr.id = ca.produto_id")
+    return f"SELECT {', '.join(colunas)} FROM tbl_pedidos p {' '.join(juncoes)} WHERE p.id = %s"
+
+
+def _separar(linha, prefixo):
+    """Extrai as colunas 'prefixo__coluna' da linha; retorna None se a relação não existe (LEFT JOIN vazio)."""
+    marcador = prefixo + '__'
+    dados = {chave[len(marcador):]: linha.pop(chave) for chave in list(linha) if chave.startswith(marcador)}
+    if dados.get('id') is None:
+        return None
+    return dados
+
+
+def _montar_carrinho(linha, expandir):
+    """Separa carrinho e produto de uma linha e monta as relações pedidas."""
+    relacoes = {}
+    produto = _separar(linha, 'produto')
+    carrinho = _separar(linha, 'carrinho')
+    if carrinho is None:
+        total = None
+    else:
+        total = carrinho.pop('total', None)
+    if 'carrinho' in expandir:
+        relacoes['carrinho'] = dict(carrinho, total=total) if carrinho else None
+    if 'produtos' in expandir:
+        relacoes['produtos'] = []
+        if produto and carrinho:
+            relacoes['produtos'].append(dict(produto, quantidade=carrinho['quantidade'], total=total))
+    return relacoes
+
+
+def montar_pedido(linha, expandir):
+    """Transforma a linha da consulta_pedido() em um pedido com as relações aninhadas."""
+    pedido = dict(linha)
+    if 'cliente' in expandir:
+        pedido['cliente'] = _separar(pedido, 'cliente')
+    if expandir & {'carrinho', 'produtos'}:
+        pedido.update(_montar_carrinho(pedido, expandir))
+    return pedido
+
+
+def expandir_pedidos(conn, pedidos, expandir):
+    """Acrescenta as relações pedidas a uma lista de pedidos, com uma consulta IN por relação."""
+    if not pedidos or not expandir:
+        return pedidos
+
+    if 'cliente' in expandir:
+        ids = list({pedido['cliente_id'] for pedido in pedidos})
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(COLUNAS_CLIENTE)} FROM tbl_clientes WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                tuple(ids),
+            )
+            clientes = {cliente['id']: cliente for cliente in cursor.fetchall()}
+        for pedido in pedidos:
+            pedido['cliente'] = clientes.get(pedido['cliente_id'])
+
+    if expandir & {'carrinho', 'produtos'}:
+        ids = list({pedido['carrinho_id'] for pedido in pedidos})
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(_colunas_carrinho(expandir))} FROM tbl_carrinhos ca "
+                f"LEFT JOIN tbl_produtos pr ON pr.id = ca.produto_id "
+                f"WHERE ca.id IN ({', '.join(['%s'] * len(ids))})",
+                tuple(ids),
+            )
+            carrinhos = {linha['carrinho__id']: linha for linha in cursor.fetchall()}
+        for pedido in pedidos:
+            linha = carrinhos.get(pedido['carrinho_id'])
+            if linha is None:
+                pedido.update(_montar_carrinho({}, expandir))
+            else:
+                pedido.update(_montar_carrinho(dict(linha), expandir))
+
+    return pedidos
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import os
+
+from flask import Response
+
+# Linhas lidas do servidor a cada ida ao banco durante a exportação
+TAMANHO_LOTE = int(os.getenv('EXPORTACAO_LOTE', 1000))
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def montar_consulta(tabela, condicoes, params, ordenar_por, ordem):
+    """Monta o SELECT da exportação com os mesmos filtros e ordenação da listagem."""
+    sql = f"SELECT * FROM {tabela}"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    if ordenar_por == 'id':
+        sql += f" ORDER BY id {ordem}"
+    else:
+        sql += f" ORDER BY {ordenar_por} {ordem}, id {ordem}"
+    return sql, list(params)
+
+
+def _linhas_ndjson(colunas, lote):
+    return ''.join(
+        json.dumps(dict(zip(colunas, linha)), default=str, ensure_ascii=False) + '\n'
+        for linha in lote
+    )
+
+
+def _esvaziar(buffer):
+    texto = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return texto
+
+
+def exportar(conn, sql, params, formato, nome_arquivo):
+    """Executa `sql` em um cursor sem buffer e transmite as linhas em lotes.
+
+    A conexão fica presa à resposta e volta ao pool quando a transmissão termina;
+    se o cliente desistir no meio, ela é descartada, pois ainda há linhas não lidas.
+    """
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(sql, params)
+    colunas = cursor.column_names
+    estado = {'concluida': False}
+
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if formato == 'csv':
+            escritor.writerow(colunas)
+            yield _esvaziar(buffer)
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE)
+            if not lote:
+                break
+            if formato == 'csv':
+                escritor.writerows(lote)
+                yield _esvaziar(buffer)
+            else:
+                yield _linhas_ndjson(colunas, lote)
+        estado['concluida'] = True
+
+    def liberar():
+        # Chamado pelo servidor ao fechar a resposta (fim da transmissão ou desconexão)
+        if estado['concluida']:
+            cursor.close()
+            conn.close()
+        else:
+            conn.descartar()
+
+    resp = Response(gerar(), mimetype=FORMATOS[formato])
+    resp.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    resp.call_on_close(liberar)
+    return resp
@@ -0,0 +1,40 @@
+# Configuração do gunicorn, lida da raiz do repositório: gunicorn app:app
+#
+# Com preload_app o processo mestre importa o código e cria a aplicação uma
+# vez; os workers a herdam no fork, em vez de cada um repetir as importações.
+# É seguro porque create_app() não abre conexões, threads nem processos: o
+# pool, as réplicas e os processos de senha são criados por worker, depois do
+# fork, e o módulo random é ressemeado em cada filho.
+import glob
+import os
+import tempfile
+import time
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+# Lido por recursos.configurar: com mais de um worker e sem CACHE_URL o cache local fica desligado
+os.environ['GUNICORN_WORKERS'] = str(workers)
+worker_class = 'gthread'  # Threads por worker: as classes de admissão limitam a concorrência de cada uma
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+# O aquecimento roda antes do worker avisar o mestre: o prazo precisa cobri-lo
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def post_worker_init(worker):
+    # Depois do fork e antes do worker aceitar conexões: a primeira requisição já encontra tudo pronto
+    import app as aplicacao
+
+    if aplicacao.AQUECER:
+        inicio = time.perf_counter()
+        aquecidos = aplicacao.aquecer(worker.wsgi)
+        worker.log.info("worker aquecido em %.0f ms: %s", (time.perf_counter() - inicio) * 1000, aquecidos)
+
+
+def on_starting(server):
+    # Uma vez, no mestre: diretório onde cada worker grava as suas métricas para o /metrics somá-las.
+    # Sem arquivos de uma execução anterior, que seriam somados ao total (METRICAS_DIR é lido na hora do uso).
+    if not os.getenv('METRICAS_DIR'):
+        os.environ['METRICAS_DIR'] = tempfile.mkdtemp(prefix='metricas-')
+    for arquivo in glob.glob(os.path.join(os.environ['METRICAS_DIR'], '*.json')):
+        os.remove(arquivo)
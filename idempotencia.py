@@ -0,0 +1,209 @@
+import functools
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from flask import Response, make_response, request
+from mysql.connector import Error
+
+import metricas
+
+log = logging.getLogger(__name__)
+
+# Por quanto tempo (segundos) uma chave é lembrada e a resposta repetida nas novas tentativas
+IDEMPOTENCIA_TTL = int(os.getenv('IDEMPOTENCIA_TTL', 86400))
+# Quanto uma requisição repetida espera pela original ainda em andamento antes de responder 409
+IDEMPOTENCIA_ESPERA = float(os.getenv('IDEMPOTENCIA_ESPERA', 10))
+# Uma chave em andamento há mais tempo que isso é considerada abandonada (worker que caiu)
+IDEMPOTENCIA_ABANDONO = int(os.getenv('IDEMPOTENCIA_ABANDONO', 60))
+CHAVE_MAXIMA = 200
+
+CABECALHO = 'Idempotency-Key'
+
+
+def impressao():
+    """Resumo do método, caminho e corpo: a mesma chave com outro conteúdo é um erro do cliente."""
+    resumo = hashlib.blake2b(digest_size=16)
+    resumo.update(f"{request.method} {request.path}\n".encode())
+    resumo.update(request.get_data())
+    return resumo.hexdigest()
+
+
+def reservar(conn, chave, rota, digital):
+    """Tenta registrar a chave como em andamento; retorna True se esta requisição deve executar a escrita.
+
+    Chaves vencidas (fora do TTL) ou abandonadas em andamento são apagadas e
+    disputadas de novo; o INSERT IGNORE garante um único vencedor por chave.
+    """
+    agora = datetime.now()
+    inserir = "INSERT IGNORE INTO tbl_idempotencia (chave, rota, impressao, criada_em) VALUES (%s, %s, %s, %s)"
+    with conn.cursor() as cursor:
+        cursor.execute(inserir, (chave, rota, digital, agora))
+        venceu = cursor.rowcount == 1
+        if not venceu:
+            cursor.execute(
+                "DELETE FROM tbl_idempotencia WHERE chave = %s AND rota = %s AND "
+                "(criada_em < %s OR (status IS NULL AND criada_em < %s))",
+                (chave, rota, agora - timedelta(seconds=IDEMPOTENCIA_TTL), agora - timedelta(seconds=IDEMPOTENCIA_ABANDONO)),
+            )
+            if cursor.rowcount:
+                cursor.execute(inserir, (chave, rota, digital, agora))
+                venceu = cursor.rowcount == 1
+    conn.commit()
+    return venceu
+
+
+def concluir(conn, chave, rota, resp):
+    """Grava a resposta da chave; respostas 5xx liberam a chave para que uma nova tentativa execute de novo."""
+    if resp.status_code >= 500:
+        liberar(conn, chave, rota)
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "UPDATE tbl_idempotencia SET status = %s, corpo = %s, mimetype = %s WHERE chave = %s AND rota = %s",
+            (resp.status_code, resp.get_data(), resp.mimetype, chave, rota),
+        )
+    conn.commit()
+
+
+def consultar(conn, chave, rota):
+    """Linha da chave (impressao, status, corpo, mimetype); status None enquanto em andamento."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT impressao, status, corpo, mimetype FROM tbl_idempotencia WHERE chave = %s AND rota = %s",
+            (chave, rota),
+        )
+        linha = cursor.fetchone()
+    conn.rollback()  # Encerra o snapshot: a próxima consulta enxerga a conclusão da original
+    return linha
+
+
+def liberar(conn, chave, rota):
+    """Apaga a chave para que uma nova tentativa execute a escrita de novo."""
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM tbl_idempotencia WHERE chave = %s AND rota = %s", (chave, rota))
+    conn.commit()
+
+
+def limpar(conn, limite=1000):
+    """Apaga as chaves vencidas, em lotes; retorna quantas foram removidas."""
+    vencimento = datetime.now() - timedelta(seconds=IDEMPOTENCIA_TTL)
+    removidas = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT chave, rota FROM tbl_idempotencia WHERE criada_em < %s ORDER BY criada_em LIMIT %s",
+                (vencimento, limite),
+            )
+            vencidas = cursor.fetchall()
+            if vencidas:
+                cursor.executemany("DELETE FROM tbl_idempotencia WHERE chave = %s AND rota = %s", vencidas)
+        conn.commit()
+        removidas += len(vencidas)
+        if len(vencidas) < limite:
+            return removidas
+
+
+def _contar(evento):
+    metricas.registro.incrementar('idempotencia_eventos_total', (('evento', evento),))
+
+
+def _repetir(linha):
+    _, status, corpo, mimetype = linha
+    resp = Response(bytes(corpo or b''), status=status, mimetype=mimetype)
+    resp.headers['Idempotent-Replayed'] = 'true'
+    return resp
+
+
+def _aguardar(conectar, chave, rota, digital):
+    """Espera a requisição original terminar e devolve a resposta dela (ou o erro da espera)."""
+    limite = time.monotonic() + IDEMPOTENCIA_ESPERA
+    intervalo = 0.05
+    while True:
+        conn = conectar()
+        if not conn:
+            return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        try:
+            linha = consultar(conn, chave, rota)
+        finally:
+            conn.close()
+
+        if linha is None:
+            return None  # A original falhou (5xx) e liberou a chave: esta tentativa executa
+        if linha[0] != digital:
+            _contar('divergente')
+            return {"erro": f"A chave '{chave}' já foi usada com outro conteúdo."}, 422
+        if linha[1] is not None:
+            _contar('repetida')
+            return _repetir(linha)
+        if time.monotonic() >= limite:
+            _contar('em_andamento')
+            return {"erro": "Uma requisição com esta chave ainda está em andamento; tente novamente."}, 409
+        time.sleep(intervalo)
+        intervalo = min(intervalo * 2, 0.5)
+
+
+def _finalizar(conectar, acao, chave, rota, *args):
+    # Falhar aqui não desfaz a escrita já feita; a chave fica em andamento até IDEMPOTENCIA_ABANDONO
+    conn = conectar()
+    if not conn:
+        return
+    try:
+        acao(conn, chave, rota, *args)
+    except Error as err:
+        log.error("Erro ao finalizar a chave de idempotência %s: %s", chave, err)
+    finally:
+        conn.close()
+
+
+def idempotente(conectar):
+    """Decorador de rotas POST: com o cabeçalho Idempotency-Key, a escrita roda uma única vez por chave.
+
+    A primeira requisição reserva a chave em tbl_idempotencia, executa a rota
+    e grava a resposta; as novas tentativas recebem essa mesma resposta (com
+    Idempotent-Replayed: true) sem tocar nas tabelas, e as que chegam enquanto
+    a original roda esperam por ela. Sem o cabeçalho a rota roda como antes.
+    `conectar` retorna uma conexão (ou None), como connect_db().
+    """
+
+    def decorador(view):
+        @functools.wraps(view)
+        def envolvida(*args, **kwargs):
+            chave = request.headers.get(CABECALHO)
+            if chave is None:
+                return view(*args, **kwargs)
+            if not chave or len(chave) > CHAVE_MAXIMA:
+                return {"erro": f"O cabeçalho {CABECALHO} deve ter de 1 a {CHAVE_MAXIMA} caracteres."}, 400
+
+            rota = request.url_rule.rule
+            digital = impressao()
+            for _ in range(2):  # Uma segunda volta se a original falhar e liberar a chave durante a espera
+                conn = conectar()
+                if not conn:
+                    return {"erro": "Erro ao conectar com o banco de dados"}, 500
+                try:
+                    venceu = reservar(conn, chave, rota, digital)
+                except Error as err:
+                    return {"erro": f"Erro ao registrar a chave de idempotência: {err}"}, 500
+                finally:
+                    conn.close()
+
+                if venceu:
+                    try:
+                        resp = make_response(view(*args, **kwargs))
+                    except Exception:
+                        _finalizar(conectar, liberar, chave, rota)
+                        raise
+                    _finalizar(conectar, concluir, chave, rota, resp)
+                    return resp
+
+                resultado = _aguardar(conectar, chave, rota, digital)
+                if resultado is not None:
+                    return resultado
+            return {"erro": "Uma requisição com esta chave ainda está em andamento; tente novamente."}, 409
+
+        return envolvida
+
+    return decorador
@@ -0,0 +1,301 @@
+# Imagens dos produtos (PUT/GET /produtos/<id>/imagem)
+#
+# O upload vai direto do corpo da requisição para um arquivo temporário, em
+# blocos, calculando o SHA-256 no caminho; o arquivo final recebe o nome do
+# hash (armazenamento endereçado pelo conteúdo: a mesma imagem enviada para
+# vários produtos ocupa o disco uma vez e nunca muda de conteúdo). As
+# miniaturas são geradas depois do commit, em processos auxiliares.
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import metricas
+
+try:
+    from PIL import Image  # Dependência opcional (Pillow); sem ela não há miniaturas e ?tamanho= serve o original
+except ImportError:
+    Image = None
+
+DIRETORIO = os.getenv('IMAGENS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imagens'))
+# Maior upload aceito, em bytes (acima disso, 413)
+TAMANHO_MAXIMO = int(os.getenv('IMAGEM_TAMANHO_MAXIMO', 10 * 1024 * 1024))
+# Bytes lidos do corpo da requisição por vez: é o que o upload ocupa de memória
+BLOCO = 64 * 1024
+# Lados máximos (px) das miniaturas geradas para cada imagem
+TAMANHOS = sorted(int(t) for t in os.getenv('IMAGEM_MINIATURAS', '128,256,512').split(',') if t)
+# Validade no cache do cliente das URLs com ?v=<hash>, que nunca mudam de conteúdo
+CACHE_SEGUNDOS = int(os.getenv('IMAGEM_CACHE_SEGUNDOS', 365 * 24 * 3600))
+
+# Processos que geram as miniaturas, por worker (0 = gera na própria thread da requisição)
+PROCESSOS = int(os.getenv('IMAGEM_PROCESSOS', min(os.cpu_count() or 1, 2)))
+# Imagens aguardando um processo livre; acima disso a miniatura não é agendada
+# (o GET serve o original até flask gerar-miniaturas)
+PENDENTES_MAXIMO = int(os.getenv('IMAGEM_PENDENTES', max(PROCESSOS, 1) * 16))
+
+# Assinaturas dos formatos aceitos: (deslocamento, bytes) -> tipo
+_ASSINATURAS = [
+    ((0, b'\xff\xd8\xff'), 'image/jpeg'),
+    ((0, b'\x89PNG\r\n\x1a\n'), 'image/png'),
+    ((0, b'GIF87a'), 'image/gif'),
+    ((0, b'GIF89a'), 'image/gif'),
+    ((8, b'WEBP'), 'image/webp'),
+]
+# Formato em que o Pillow grava a miniatura de cada tipo (GIF animado vira um PNG do primeiro quadro)
+_FORMATOS_MINIATURA = {'image/jpeg': 'JPEG', 'image/png': 'PNG', 'image/gif': 'PNG', 'image/webp': 'WEBP'}
+_TIPOS_MINIATURA = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+log = logging.getLogger('imagens')
+
+_lock = threading.Lock()
+_executor = None
+_pid = None
+_vagas = threading.BoundedSemaphore(PENDENTES_MAXIMO)
+
+
+class TamanhoExcedido(Exception):
+    """O corpo passou de IMAGEM_TAMANHO_MAXIMO bytes."""
+
+
+class TipoNaoSuportado(ValueError):
+    """O conteúdo não é JPEG, PNG, GIF nem WebP."""
+
+
+def detectar_tipo(inicio):
+    """Tipo da imagem pelos primeiros bytes do arquivo (o Content-Type do cliente não é usado)."""
+    for (deslocamento, assinatura), tipo in _ASSINATURAS:
+        if inicio[deslocamento:deslocamento + len(assinatura)] == assinatura:
+            if tipo == 'image/webp' and not inicio.startswith(b'RIFF'):
+                continue
+            return tipo
+    return None
+
+
+def caminho_original(hash_):
+    return os.path.join(DIRETORIO, 'originais', hash_[:2], hash_)
+
+
+def caminho_miniatura(hash_, tamanho):
+    return os.path.join(DIRETORIO, 'miniaturas', str(tamanho), hash_[:2], hash_)
+
+
+def _publicar(temporario, destino):
+    """Move o arquivo pronto para o nome final; se o conteúdo já existe, descarta a cópia."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    if os.path.exists(destino):
+        os.remove(temporario)
+    else:
+        os.replace(temporario, destino)  # Atômico: quem lê nunca vê um arquivo pela metade
+
+
+def gravar(fluxo, tamanho_maximo=None):
+    """Copia o corpo da requisição para o armazenamento, em blocos; retorna (hash, tipo, bytes).
+
+    Levanta TamanhoExcedido, TipoNaoSuportado ou ValueError (corpo vazio);
+    nesses casos nada fica gravado.
+    """
+    tamanho_maximo = tamanho_maximo or TAMANHO_MAXIMO
+    os.makedirs(os.path.join(DIRETORIO, 'tmp'), exist_ok=True)
+    resumo = hashlib.sha256()
+    total, tipo = 0, None
+    with tempfile.NamedTemporaryFile(dir=os.path.join(DIRETORIO, 'tmp'), delete=False) as arquivo:
+        try:
+            inicio = b''
+            while True:
+                bloco = fluxo.read(BLOCO)
+                if not bloco:
+                    break
+                total += len(bloco)
+                if total > tamanho_maximo:
+                    raise TamanhoExcedido(f"A imagem passa de {tamanho_maximo} bytes.")
+                if tipo is None:
+                    inicio += bloco
+                    if len(inicio) >= 12:
+                        tipo = detectar_tipo(inicio)
+                        if tipo is None:
+                            raise TipoNaoSuportado("A imagem deve ser JPEG, PNG, GIF ou WebP.")
+                resumo.update(bloco)
+                arquivo.write(bloco)
+            if total == 0:
+                raise ValueError("Envie a imagem no corpo da requisição.")
+            if tipo is None:
+                tipo = detectar_tipo(inicio)  # Arquivo com menos de 12 bytes
+                if tipo is None:
+                    raise TipoNaoSuportado("A imagem deve ser JPEG, PNG, GIF ou WebP.")
+        except BaseException:
+            arquivo.close()
+            os.remove(arquivo.name)
+            raise
+    hash_ = resumo.hexdigest()
+    _publicar(arquivo.name, caminho_original(hash_))
+    return hash_, tipo, total
+
+
+def registrar(cursor, produto_id, hash_, tipo, tamanho):
+    """Associa a imagem gravada ao produto (substitui a anterior)."""
+    cursor.execute(
+        "INSERT INTO tbl_produto_imagens (produto_id, hash, tipo, tamanho, atualizada_em) VALUES (%s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE hash = VALUES(hash), tipo = VALUES(tipo), tamanho = VALUES(tamanho), "
+        "atualizada_em = VALUES(atualizada_em)",
+        (produto_id, hash_, tipo, tamanho, datetime.now()),
+    )
+
+
+def remover(cursor, produto_ids):
+    """Desassocia as imagens dos produtos removidos; os arquivos saem com flask limpar-imagens."""
+    for produto_id in produto_ids:
+        cursor.execute("DELETE FROM tbl_produto_imagens WHERE produto_id = %s", (produto_id,))
+
+
+def ler_tamanho(valor):
+    """Converte ?tamanho= (um dos lados de IMAGEM_MINIATURAS); None é a imagem original."""
+    if valor is None:
+        return None
+    try:
+        tamanho = int(valor)
+    except ValueError:
+        tamanho = None
+    if tamanho not in TAMANHOS:
+        raise ValueError(f"Parâmetro 'tamanho' aceita apenas: {', '.join(map(str, TAMANHOS))}.")
+    return tamanho
+
+
+def arquivo(hash_, tipo, tamanho=None):
+    """Arquivo a servir: retorna (caminho, tipo, etag, definitivo).
+
+    Enquanto a miniatura pedida não existe, serve o original com
+    definitivo=False, para que a resposta não fique no cache do cliente.
+    """
+    if tamanho is not None:
+        caminho = caminho_miniatura(hash_, tamanho)
+        if os.path.exists(caminho):
+            return caminho, _TIPOS_MINIATURA[_FORMATOS_MINIATURA[tipo]], f"{hash_}-{tamanho}", True
+        return caminho_original(hash_), tipo, hash_, False
+    return caminho_original(hash_), tipo, hash_, True
+
+
+def gerar_miniaturas(hash_, tipo):
+    """Gera as miniaturas que faltam de uma imagem (roda no processo auxiliar); retorna quantas gerou."""
+    formato = _FORMATOS_MINIATURA[tipo]
+    geradas = 0
+    with Image.open(caminho_original(hash_)) as original:
+        original.load()
+        for tamanho in TAMANHOS:
+            destino = caminho_miniatura(hash_, tamanho)
+            if os.path.exists(destino):
+                continue
+            miniatura = original.copy()
+            miniatura.thumbnail((tamanho, tamanho))
+            if formato == 'JPEG' and miniatura.mode not in ('RGB', 'L'):
+                miniatura = miniatura.convert('RGB')
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(destino), delete=False) as temporario:
+                miniatura.save(temporario, format=formato)
+            _publicar(temporario.name, destino)
+            geradas += 1
+    return geradas
+
+
+def _executor_do_processo():
+    # Um executor por worker; após um fork o do processo pai não serve
+    global _executor, _pid
+    with _lock:
+        # Um processo auxiliar que morre (ex.: imagem que estoura a memória) inutiliza o executor: cria outro
+        if _executor is None or _pid != os.getpid() or getattr(_executor, '_broken', False):
+            # 'spawn': os processos auxiliares não herdam as threads e conexões do worker
+            _executor = ProcessPoolExecutor(max_workers=PROCESSOS, mp_context=multiprocessing.get_context('spawn'))
+            _pid = os.getpid()
+        return _executor
+
+
+def _concluida(hash_, inicio, vagas):
+    def concluida(futuro):
+        vagas.release()
+        erro = futuro.exception()
+        if erro is None:
+            metricas.registro.incrementar('miniaturas_total', (('resultado', 'gerada'),), futuro.result())
+            metricas.registro.observar('miniatura_segundos', (), time.perf_counter() - inicio)
+        else:
+            metricas.registro.incrementar('miniaturas_total', (('resultado', 'erro'),))
+            log.warning("Falha ao gerar as miniaturas de %s: %s", hash_, erro)
+    return concluida
+
+
+def agendar_miniaturas(hash_, tipo):
+    """Pede as miniaturas da imagem a um processo auxiliar, sem esperar; retorna o Future ou None."""
+    if Image is None or all(os.path.exists(caminho_miniatura(hash_, t)) for t in TAMANHOS):
+        return None
+    if PROCESSOS <= 0:
+        inicio = time.perf_counter()
+        metricas.registro.incrementar('miniaturas_total', (('resultado', 'gerada'),), gerar_miniaturas(hash_, tipo))
+        metricas.registro.observar('miniatura_segundos', (), time.perf_counter() - inicio)
+        return None
+    vagas = _vagas
+    if not vagas.acquire(blocking=False):
+        metricas.registro.incrementar('miniaturas_total', (('resultado', 'descartada'),))
+        return None
+    try:
+        futuro = _executor_do_processo().submit(gerar_miniaturas, hash_, tipo)
+    except BaseException:
+        vagas.release()
+        raise
+    futuro.add_done_callback(_concluida(hash_, time.perf_counter(), vagas))
+    return futuro
+
+
+def gerar_pendentes(conn, lote=500):
+    """Agenda as miniaturas que faltam de todas as imagens (flask gerar-miniaturas); retorna [Future]."""
+    if Image is None:
+        raise RuntimeError("Pillow não está instalado: não há como gerar miniaturas.")
+    futuros, ultimo = [], ''
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT hash, tipo FROM tbl_produto_imagens WHERE hash > %s ORDER BY hash LIMIT %s",
+                (ultimo, lote),
+            )
+            imagens = cursor.fetchall()
+        conn.rollback()
+        for hash_, tipo in imagens:
+            if not all(os.path.exists(caminho_miniatura(hash_, t)) for t in TAMANHOS):
+                futuros.append(_executor_do_processo().submit(gerar_miniaturas, hash_, tipo))
+        if len(imagens) < lote:
+            return futuros
+        ultimo = imagens[-1][0]
+
+
+def limpar(conn, idade=3600, lote=500):
+    """Apaga os arquivos de imagens que nenhum produto usa mais; retorna quantas imagens foram removidas.
+
+    Só considera arquivos com mais de `idade` segundos, para não apagar um
+    upload gravado cujo commit ainda não aconteceu.
+    """
+    raiz = os.path.join(DIRETORIO, 'originais')
+    limite = time.time() - idade
+    candidatos = []
+    for pasta, _, nomes in os.walk(raiz):
+        candidatos.extend(nome for nome in nomes if os.path.getmtime(os.path.join(pasta, nome)) < limite)
+
+    removidas = 0
+    for inicio in range(0, len(candidatos), lote):
+        bloco = candidatos[inicio:inicio + lote]
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT hash FROM tbl_produto_imagens WHERE hash IN ({', '.join(['%s'] * len(bloco))})",
+                tuple(bloco),
+            )
+            usadas = {linha[0] for linha in cursor.fetchall()}
+        conn.rollback()
+        for hash_ in bloco:
+            if hash_ in usadas:
+                continue
+            for caminho in [caminho_original(hash_)] + [caminho_miniatura(hash_, t) for t in TAMANHOS]:
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+            removidas += 1
+    return removidas
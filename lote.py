@@ -0,0 +1,114 @@
+import os
+
+from mysql.connector import Error
+
+# Linhas gravadas por transação e tamanho máximo aceito por requisição
+TAMANHO_BLOCO = int(os.getenv('LOTE_BLOCO', 500))
+LOTE_MAXIMO = int(os.getenv('LOTE_MAXIMO', 10000))
+
+
+def ler_itens(corpo, chave):
+    """Extrai a lista de itens do corpo da requisição de lote.
+
+    Aceita tanto uma lista JSON quanto um objeto com a lista em `chave`.
+    """
+    itens = corpo.get(chave) if isinstance(corpo, dict) else corpo
+    if not isinstance(itens, list) or not itens:
+        raise ValueError(f"Envie uma lista não vazia em '{chave}'.")
+    if len(itens) > LOTE_MAXIMO:
+        raise ValueError(f"O lote aceita no máximo {LOTE_MAXIMO} itens.")
+    return itens
+
+
+def validar(itens, campos_obrigatorios):
+    """Separa os itens válidos dos inválidos usando as mesmas regras das rotas individuais.
+
+    Retorna (validos, resultados): validos é uma lista de (indice, item) e
+    resultados já contém os erros de validação, indexados pela posição no lote.
+    """
+    validos = []
+    resultados = {}
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            resultados[indice] = {"indice": indice, "status": 400, "erro": "Item deve ser um objeto JSON."}
+            continue
+        faltando = next((campo for campo in campos_obrigatorios if campo not in item), None)
+        if faltando:
+            resultados[indice] = {"indice": indice, "status": 400, "erro": f"Campo '{faltando}' é obrigatório."}
+            continue
+        validos.append((indice, item))
+    return validos, resultados
+
+
+def em_blocos(lista, tamanho=None):
+    """Divide a lista em blocos de no máximo `tamanho` elementos."""
+    tamanho = tamanho or TAMANHO_BLOCO
+    for inicio in range(0, len(lista), tamanho):
+        yield lista[inicio:inicio + tamanho]
+
+
+def placeholders(quantidade):
+    """Gera '%s, %s, ...' para cláusulas IN."""
+    return ", ".join(["%s"] * quantidade)
+
+
+def resposta(resultados, total, status_sucesso):
+    """Monta a resposta do lote com os resultados em ordem e um resumo."""
+    linhas = [resultados[indice] for indice in range(total)]
+    sucesso = sum(1 for linha in linhas if linha["status"] == status_sucesso)
+    corpo = {"resultados": linhas, "sucesso": sucesso, "erros": total - sucesso}
+    return corpo, (status_sucesso if sucesso else 400)
+
+
+def inserir(conn, tabela, campos, validos, resultados, ao_inserir=None):
+    """Insere os itens válidos em blocos, com uma transação (um único commit) por bloco.
+
+    As linhas são inseridas uma a uma para que cada id venha do lastrowid do
+    próprio INSERT: os ids de um INSERT de várias linhas não são garantidamente
+    consecutivos (innodb_autoinc_lock_mode=2, padrão do MySQL 8, ou
+    auto_increment_increment > 1). Se um bloco falhar (ex.: email duplicado),
+    ele é refeito linha a linha, com um commit por linha, para apontar qual
+    item causou o erro.
+
+    `ao_inserir(cursor, [(id, item)])`, se informado, roda na mesma transação
+    de cada bloco (ex.: atualizar o índice de busca).
+    """
+    sql = f"INSERT INTO {tabela} ({', '.join(campos)}) VALUES ({placeholders(len(campos))})"
+    for bloco in em_blocos(validos):
+        valores = [tuple(item[campo] for campo in campos) for _, item in bloco]
+        try:
+            with conn.cursor() as cursor:
+                ids = []
+                for linha in valores:
+                    cursor.execute(sql, linha)
+                    ids.append(cursor.lastrowid)
+                if ao_inserir:
+                    ao_inserir(cursor, [(id, item) for id, (_, item) in zip(ids, bloco)])
+            conn.commit()
+        except Error:
+            conn.rollback()
+            _inserir_um_a_um(conn, sql, bloco, valores, resultados, ao_inserir)
+            continue
+        for id, (indice, _) in zip(ids, bloco):
+            resultados[indice] = {"indice": indice, "status": 201, "id": id}
+
+
+def _inserir_um_a_um(conn, sql, bloco, valores, resultados, ao_inserir=None):
+    for (indice, item), linha in zip(bloco, valores):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, linha)
+                id = cursor.lastrowid  # Antes de ao_inserir, que executa outros comandos no cursor
+                if ao_inserir:
+                    ao_inserir(cursor, [(id, item)])
+                resultados[indice] = {"indice": indice, "status": 201, "id": id}
+            conn.commit()
+        except Error as err:
+            conn.rollback()
+            resultados[indice] = {"indice": indice, "status": 400, "erro": f"Erro ao cadastrar: {err}"}
+
+
+def ids_existentes(cursor, tabela, ids):
+    """Retorna o conjunto de ids de `ids` que existem em `tabela` (uma única consulta)."""
+    cursor.execute(f"SELECT id FROM {tabela} WHERE id IN ({placeholders(len(ids))})", tuple(ids))
+    return {linha[0] for linha in cursor.fetchall()}
@@ -0,0 +1,364 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import request
+
+# Liga/desliga a instrumentação (METRICAS=0 permite medir o custo dela em benchmarks)
+ATIVAS = os.getenv('METRICAS', '1') != '0'
+
+# Diretório onde cada processo grava as suas métricas para o /metrics somá-las (lido na hora do uso;
+# o gunicorn.conf.py cria um para os workers). Sem ele, os valores são os do processo que responde.
+DIRETORIO_VARIAVEL = 'METRICAS_DIR'
+
+# Intervalo mínimo (segundos) entre duas gravações das métricas de um processo no diretório
+GRAVAR_APOS = float(os.getenv('METRICAS_GRAVAR_APOS', 1))
+
+# Consultas mais lentas que isso (em ms) vão para o log de consultas lentas
+SQL_LENTO_MS = float(os.getenv('SQL_LENTO_MS', 200))
+
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histogramas que medem outra escala de tempo (ex.: minutos em vez de milissegundos)
+LIMITES_POR_METRICA = {
+    'notificacao_atraso_segundos': (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 900.0, 1800.0, 3600.0),
+}
+
+DESCRICOES = {
+    'http_requisicoes_total': ('counter', 'Requisições atendidas, por rota, método e status.'),
+    'http_requisicao_segundos': ('histogram', 'Latência total das requisições.'),
+    'http_resposta_bytes_total': ('counter', 'Bytes de corpo enviados (respostas não transmitidas em streaming).'),
+    'db_conexao_segundos': ('histogram', 'Tempo para obter uma conexão do pool, por requisição.'),
+    'db_consulta_segundos': ('histogram', 'Tempo gasto em comandos SQL (execução e leitura), por requisição.'),
+    'db_comandos_total': ('counter', 'Comandos SQL executados.'),
+    'db_linhas_total': ('counter', 'Linhas lidas do banco.'),
+    'db_erros_conexao_total': ('counter', 'Falhas ao abrir uma conexão com o banco ao retirá-la do pool, por errno.'),
+    'db_consultas_lentas_total': ('counter', f'Comandos SQL acima de {SQL_LENTO_MS:g} ms.'),
+    'admissao_eventos_total': ('counter', 'Requisições admitidas, enfileiradas, rejeitadas (503) ou fora do prazo, por classe de rota.'),
+    'sql_comandos_registrados_total': ('counter', 'Execuções dos comandos do registro: statement preparado novo, reusado ou execução direta.'),
+    'senha_segundos': ('histogram', 'Tempo para gerar ou verificar um hash de senha, incluindo a espera por um processo auxiliar.'),
+    'senhas_recusadas_total': ('counter', 'Hashes de senha recusados (503) por excesso de pendentes.'),
+    'notificacoes_total': ('counter', 'Notificações processadas pelo despachante: enviadas, com erro (nova tentativa) ou falhas definitivas.'),
+    'notificacao_atraso_segundos': ('histogram', 'Tempo entre o registro da notificação (commit do pedido) e a entrega ao servidor SMTP.'),
+    'miniaturas_total': ('counter', 'Miniaturas de imagens de produtos geradas, com erro ou descartadas (fila dos processos cheia).'),
+    'miniatura_segundos': ('histogram', 'Tempo entre agendar as miniaturas de uma imagem e tê-las gravadas.'),
+    'idempotencia_eventos_total': ('counter', 'Requisições com Idempotency-Key repetidas, divergentes ou ainda em andamento.'),
+    'metricas_overhead_segundos_total': ('counter', 'Tempo gasto pela própria instrumentação.'),
+}
+
+log_lentas = logging.getLogger('consultas_lentas')
+
+_LITERAIS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+\b")
+
+
+def _limites(nome):
+    return LIMITES_POR_METRICA.get(nome, LIMITES_SEGUNDOS)
+
+
+class Registro:
+    """Contadores e histogramas do processo, exportados no formato texto do Prometheus.
+
+    Cada worker do gunicorn tem o seu registro. Com METRICAS_DIR, cada processo
+    grava contadores e histogramas em um arquivo próprio (no máximo a cada
+    GRAVAR_APOS segundos e ao sair) e exportar() soma os de todos os arquivos:
+    qualquer worker que atenda o /metrics mostra o total, sem os contadores
+    voltarem a zero de uma raspagem para outra. Arquivos de workers já
+    encerrados continuam somados. Os valores dos coletores (pool, caches) são
+    do processo que responde e levam o rótulo pid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = defaultdict(float)  # (nome, rótulos) -> valor
+        self._histogramas = {}  # (nome, rótulos) -> [contagens por limite, soma, total]
+        self.coletores = []  # Funções chamadas na exportação; retornam [(nome, tipo, descrição, rótulos, valor)]
+        self._arquivo = None  # (pid, caminho) do arquivo deste processo em METRICAS_DIR
+        self._gravado_em = 0.0
+
+    def incrementar(self, nome, rotulos, valor=1):
+        with self._lock:
+            self._contadores[(nome, rotulos)] += valor
+
+    def observar(self, nome, rotulos, valor):
+        with self._lock:
+            hist = self._histogramas.get((nome, rotulos))
+            if hist is None:
+                hist = self._histogramas[(nome, rotulos)] = [[0] * len(_limites(nome)), 0.0, 0]
+            contagens = hist[0]
+            for posicao, limite in enumerate(_limites(nome)):
+                if valor <= limite:
+                    contagens[posicao] += 1
+            hist[1] += valor
+            hist[2] += 1
+
+    def _copiar(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+            histogramas = {chave: [list(h[0]), h[1], h[2]] for chave, h in self._histogramas.items()}
+        return contadores, histogramas
+
+    def _caminho(self, diretorio):
+        """Arquivo deste processo; muda após um fork (o pid de um worker morto pode ser reusado)."""
+        pid = os.getpid()
+        if self._arquivo is None or self._arquivo[0] != pid:
+            self._arquivo = (pid, os.path.join(diretorio, f"{pid}-{os.urandom(4).hex()}.json"))
+        return self._arquivo[1]
+
+    def gravar(self, contadores=None, histogramas=None):
+        """Grava as métricas deste processo em METRICAS_DIR (troca atômica do arquivo)."""
+        diretorio = os.getenv(DIRETORIO_VARIAVEL)
+        if not diretorio:
+            return
+        if contadores is None:
+            contadores, histogramas = self._copiar()
+        if not contadores and not histogramas:
+            return
+        caminho = self._caminho(diretorio)
+        dados = {
+            'contadores': [[nome, rotulos, valor] for (nome, rotulos), valor in contadores.items()],
+            'histogramas': [[nome, rotulos, *hist] for (nome, rotulos), hist in histogramas.items()],
+        }
+        self._gravado_em = time.monotonic()
+        try:
+            with open(caminho + '.tmp', 'w') as arquivo:
+                json.dump(dados, arquivo)
+            os.replace(caminho + '.tmp', caminho)
+        except OSError as e:
+            logging.getLogger(__name__).warning("não foi possível gravar as métricas em %s: %s", diretorio, e)
+
+    def gravar_periodicamente(self):
+        """Grava se a última gravação tem mais de GRAVAR_APOS segundos; chamado ao fim de cada requisição."""
+        if time.monotonic() - self._gravado_em >= GRAVAR_APOS and os.getenv(DIRETORIO_VARIAVEL):
+            self.gravar()
+
+    def _somar(self, diretorio, contadores, histogramas):
+        """Soma aos valores deste processo os arquivos dos outros processos do diretório."""
+        proprio = os.path.basename(self._caminho(diretorio))
+        for nome_arquivo in os.listdir(diretorio):
+            if not nome_arquivo.endswith('.json') or nome_arquivo == proprio:
+                continue
+            try:
+                with open(os.path.join(diretorio, nome_arquivo)) as arquivo:
+                    dados = json.load(arquivo)
+            except (OSError, ValueError):
+                continue  # Removido ou ainda sendo gravado: entra na próxima raspagem
+            for nome, rotulos, valor in dados['contadores']:
+                chave = (nome, tuple(tuple(par) for par in rotulos))
+                contadores[chave] = contadores.get(chave, 0) + valor
+            for nome, rotulos, contagens, soma, total in dados['histogramas']:
+                chave = (nome, tuple(tuple(par) for par in rotulos))
+                hist = histogramas.setdefault(chave, [[0] * len(contagens), 0.0, 0])
+                hist[0] = [a + b for a, b in zip(hist[0], contagens)]
+                hist[1] += soma
+                hist[2] += total
+
+    def exportar(self):
+        """Gera o texto exposto em /metrics."""
+        contadores, histogramas = self._copiar()
+        diretorio = os.getenv(DIRETORIO_VARIAVEL)
+        if diretorio:
+            self.gravar(contadores, histogramas)
+            self._somar(diretorio, contadores, histogramas)
+            rotulo_pid = (('pid', os.getpid()),)
+        else:
+            rotulo_pid = ()
+
+        linhas = []
+        por_nome = defaultdict(list)
+        for (nome, rotulos), valor in contadores.items():
+            por_nome[nome].append((rotulos, valor))
+        for nome, series in sorted(por_nome.items()):
+            _cabecalho(linhas, nome, *DESCRICOES[nome])
+            for rotulos, valor in series:
+                linhas.append(f"{nome}{_rotulos(rotulos)} {valor:g}")
+
+        por_nome = defaultdict(list)
+        for (nome, rotulos), hist in histogramas.items():
+            por_nome[nome].append((rotulos, hist))
+        for nome, series in sorted(por_nome.items()):
+            _cabecalho(linhas, nome, *DESCRICOES[nome])
+            for rotulos, (contagens, soma, total) in series:
+                for limite, contagem in zip(_limites(nome), contagens):
+                    linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', f'{limite:g}'),))} {contagem}")
+                linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', '+Inf'),))} {total}")
+                linhas.append(f"{nome}_sum{_rotulos(rotulos)} {soma:g}")
+                linhas.append(f"{nome}_count{_rotulos(rotulos)} {total}")
+
+        vistos = set()
+        for coletor in self.coletores:
+            for nome, tipo, descricao, rotulos, valor in coletor():
+                if nome not in vistos:
+                    _cabecalho(linhas, nome, tipo, descricao)
+                    vistos.add(nome)
+                linhas.append(f"{nome}{_rotulos(rotulos + rotulo_pid)} {valor:g}")
+        return "\n".join(linhas) + "\n"
+
+
+def _cabecalho(linhas, nome, tipo, descricao):
+    linhas.append(f"# HELP {nome} {descricao}")
+    linhas.append(f"# TYPE {nome} {tipo}")
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{chave}="{str(valor)}"' for chave, valor in rotulos)
+    return "{" + pares + "}"
+
+
+def redigir(sql):
+    """Remove literais do texto SQL antes de gravá-lo em log (os parâmetros nunca são gravados)."""
+    return _LITERAIS.sub('?', " ".join(sql.split()))
+
+
+registro = Registro()
+atexit.register(registro.gravar)  # Os últimos valores de um worker que sai continuam no total
+_atual = threading.local()  # Medidas da requisição em andamento nesta thread
+
+
+def _medidas():
+    return getattr(_atual, 'medidas', None)
+
+
+class CursorMedido:
+    """Envolve um cursor do banco contando comandos, linhas e tempo gasto em SQL."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _medir(self, funcao, *args, sql=None):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        duracao = time.perf_counter() - inicio
+
+        medidas = _medidas()
+        if medidas is not None:
+            medidas['consulta'] += duracao
+            if sql is not None:
+                medidas['comandos'] += 1
+            elif resultado is not None:
+                medidas['linhas'] += len(resultado) if isinstance(resultado, list) else 1
+        if sql is not None and duracao * 1000 >= SQL_LENTO_MS:
+            rota = medidas['rota'] if medidas is not None else '-'
+            registro.incrementar('db_consultas_lentas_total', (('rota', rota),))
+            log_lentas.warning("consulta lenta (%.1f ms) em %s: %s", duracao * 1000, rota, redigir(sql))
+        if medidas is not None:
+            medidas['overhead'] += time.perf_counter() - inicio - duracao
+        return resultado
+
+    def execute(self, sql, params=()):
+        return self._medir(self._cursor.execute, sql, params, sql=sql)
+
+    def executemany(self, sql, seq_params):
+        return self._medir(self._cursor.executemany, sql, seq_params, sql=sql)
+
+    def fetchone(self):
+        return self._medir(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._medir(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._medir(self._cursor.fetchall)
+
+
+def registrar_conexao(duracao):
+    """Soma à requisição atual o tempo gasto esperando/abrindo uma conexão."""
+    medidas = _medidas()
+    if medidas is not None:
+        medidas['conexao'] += duracao
+
+
+def _inicio():
+    inicio = time.perf_counter()
+    _atual.medidas = {
+        'inicio': inicio,
+        'rota': request.url_rule.rule if request.url_rule else 'desconhecida',
+        'conexao': 0.0,
+        'consulta': 0.0,
+        'comandos': 0,
+        'linhas': 0,
+        'bytes': 0,
+        'overhead': 0.0,
+    }
+    _atual.medidas['overhead'] = time.perf_counter() - inicio
+
+
+def _resposta(resp):
+    inicio = time.perf_counter()
+    medidas = _medidas()
+    if medidas is not None:
+        medidas['status'] = resp.status_code
+        if not resp.is_streamed:
+            medidas['bytes'] = resp.calculate_content_length() or 0
+        medidas['overhead'] += time.perf_counter() - inicio
+    return resp
+
+
+def _fim(exc):
+    medidas = _medidas()
+    if medidas is None:
+        return
+    _atual.medidas = None
+    fim = time.perf_counter()
+
+    rota = (('rota', medidas['rota']),)
+    status = medidas.get('status', 500)
+    registro.incrementar('http_requisicoes_total', rota + (('metodo', request.method), ('status', status)))
+    registro.observar('http_requisicao_segundos', rota + (('metodo', request.method),), fim - medidas['inicio'])
+    if medidas['conexao']:
+        registro.observar('db_conexao_segundos', rota, medidas['conexao'])
+    if medidas['comandos']:
+        registro.observar('db_consulta_segundos', rota, medidas['consulta'])
+        registro.incrementar('db_comandos_total', rota, medidas['comandos'])
+        registro.incrementar('db_linhas_total', rota, medidas['linhas'])
+    if medidas['bytes']:
+        registro.incrementar('http_resposta_bytes_total', rota, medidas['bytes'])
+    registro.incrementar('metricas_overhead_segundos_total', (), medidas['overhead'] + time.perf_counter() - fim)
+    registro.gravar_periodicamente()
+
+
+def instrumentar(app):
+    """Registra os ganchos que medem cada requisição da aplicação."""
+    if not ATIVAS:
+        return
+    app.before_request(_inicio)
+    app.after_request(_resposta)
+    app.teardown_request(_fim)
+
+
+def servir(porta):
+    """Expõe /metrics em um servidor HTTP próprio, para processos sem a aplicação web (ex.: despachante)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Metricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            corpo = registro.exportar().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('', porta), Metricas)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
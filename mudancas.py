@@ -0,0 +1,199 @@
+# Registro de mudanças para sincronização incremental (GET /produtos/mudancas, GET /pedidos/mudancas)
+#
+# Cada escrita em produtos e pedidos grava em tbl_mudancas, na mesma
+# transação, o id alterado e a operação ('alteracao' ou 'remocao', a lápide
+# das remoções). O consumidor guarda o token da última página e pede só o que
+# veio depois dele.
+#
+# A ordem entregue é a de commit, não a do INSERT: a versao (AUTO_INCREMENT)
+# é numerada no INSERT, e uma transação lenta pode confirmar a versão 10
+# depois de a 11 já ter sido lida. Por isso o leitor primeiro publica as
+# mudanças já confirmadas, dando a cada uma o próximo número de `sequencia`
+# sob o lock de tbl_mudancas_sequencia; as ainda não confirmadas são puladas
+# (SKIP LOCKED) e recebem um número maior quando forem publicadas. As páginas
+# só leem mudanças publicadas, em ordem de sequencia.
+import base64
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import comandos
+
+# Recurso da rota -> tabela cujas mudanças ele publica
+FEEDS = {'produtos': 'tbl_produtos', 'pedidos': 'tbl_pedidos'}
+
+ALTERACAO = 'alteracao'
+REMOCAO = 'remocao'
+
+# Mudanças publicadas por comando na publicação (publicar() repete até esvaziar)
+PUBLICAR_LOTE = int(os.getenv('MUDANCAS_PUBLICAR_LOTE', 1000))
+# Por quantos dias o registro é mantido; tokens mais antigos que isso recebem
+# 410 e o consumidor precisa refazer a leitura completa
+RETENCAO_DIAS = int(os.getenv('MUDANCAS_RETENCAO_DIAS', 30))
+
+# Página do registro: o índice (tabela, sequencia) entrega as linhas já na ordem
+PAGINA = ("SELECT sequencia, registro_id, operacao, criada_em FROM tbl_mudancas "
+          "WHERE tabela = %s AND sequencia > %s ORDER BY sequencia LIMIT %s")
+# Versão dos dados de uma tabela para o ETag (versao()): a última mudança e as confirmadas perto dela
+ULTIMA_MUDANCA = "SELECT versao, criada_em FROM tbl_mudancas WHERE tabela = %s ORDER BY versao DESC LIMIT 1"
+MUDANCAS_RECENTES = "SELECT COUNT(*) FROM tbl_mudancas WHERE tabela = %s AND versao > %s"
+# Quantas versões antes da última entram na contagem: uma transação que confirma depois de
+# outra mais nova, dentro dessa distância, ainda muda a versão do ETag
+JANELA_VERSAO = int(os.getenv('MUDANCAS_JANELA_VERSAO', 1000))
+# Mudanças confirmadas e ainda sem sequencia; as de transações em andamento estão bloqueadas e ficam de fora
+NAO_PUBLICADAS = ("SELECT versao FROM tbl_mudancas WHERE sequencia IS NULL "
+                  "ORDER BY versao LIMIT %s FOR UPDATE SKIP LOCKED")
+
+
+class TokenExpirado(Exception):
+    """O token aponta para antes do registro mantido: as lápides daquele período já foram apagadas."""
+
+
+def registrar(cursor, tabela, ids, operacao=ALTERACAO):
+    """Grava a mudança dos registros `ids` de `tabela` (mesma transação da escrita)."""
+    ids = list(ids)
+    if not ids:
+        return
+    agora = datetime.now()
+    if len(ids) == 1:
+        cursor.execute(comandos.REGISTRAR_MUDANCA, (tabela, ids[0], operacao, agora))
+    else:
+        cursor.executemany(comandos.REGISTRAR_MUDANCA, [(tabela, id, operacao, agora) for id in ids])
+
+
+def codificar_token(feed, versao, instante):
+    """Token opaco com o recurso, a última sequência entregue e o instante até onde o consumidor está em dia."""
+    dado = json.dumps([feed, versao, int(instante.timestamp())], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dado.encode()).decode().rstrip('=')
+
+
+def decodificar_token(token, feed):
+    """Lê um token de codificar_token(); retorna a sequência. Recusa tokens de outro recurso ou vencidos."""
+    try:
+        dado = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        origem, versao, instante = json.loads(dado)
+        versao, instante = int(versao), int(instante)
+    except (ValueError, TypeError):
+        raise ValueError("Parâmetro 'desde' inválido.")
+    if origem != feed:
+        raise ValueError(f"Parâmetro 'desde' não é um token de /{feed}/mudancas.")
+    if instante < time.time() - RETENCAO_DIAS * 86400:
+        raise TokenExpirado(f"Token anterior aos {RETENCAO_DIAS} dias mantidos; refaça a leitura completa de /{feed}.")
+    return versao
+
+
+def _instante(valor):
+    return datetime.fromisoformat(valor) if isinstance(valor, str) else valor  # Banco local devolve texto
+
+
+def publicar(conn):
+    """Numera, em ordem de commit, as mudanças confirmadas ainda sem sequência; retorna quantas.
+
+    Os publicadores se revezam no lock da linha de tbl_mudancas_sequencia, então
+    uma sequência só é vista depois de todas as menores. Precisa do primário.
+    """
+    publicadas = 0
+    with conn.cursor() as cursor:
+        # Leitura sem lock: sem nada a publicar, não disputa a linha da sequência
+        cursor.execute("SELECT 1 FROM tbl_mudancas WHERE sequencia IS NULL LIMIT 1")
+        pendente = cursor.fetchone()
+    conn.rollback()
+    while pendente:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT valor FROM tbl_mudancas_sequencia WHERE id = 1 FOR UPDATE")
+            ultima = cursor.fetchone()[0]
+            cursor.execute(NAO_PUBLICADAS, (PUBLICAR_LOTE,))
+            versoes = [linha[0] for linha in cursor.fetchall()]
+            if versoes:
+                cursor.executemany("UPDATE tbl_mudancas SET sequencia = %s WHERE versao = %s",
+                                   [(ultima + posicao, versao) for posicao, versao in enumerate(versoes, 1)])
+                cursor.execute("UPDATE tbl_mudancas_sequencia SET valor = %s WHERE id = 1", (ultima + len(versoes),))
+        conn.commit()
+        publicadas += len(versoes)
+        pendente = len(versoes) == PUBLICAR_LOTE
+    return publicadas
+
+
+def ultima(conn, tabela):
+    """Última sequência publicada de `tabela`, depois de publicar as mudanças confirmadas (precisa do primário)."""
+    publicar(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(sequencia), 0) FROM tbl_mudancas WHERE tabela = %s", (tabela,))
+        sequencia = cursor.fetchone()[0]
+    conn.rollback()
+    return sequencia
+
+
+def versao(conn, tabela):
+    """Versão dos dados de `tabela` para o ETag; retorna (marca, instante da última mudança ou None).
+
+    Só lê (serve em réplicas) e não encerra a transação: lida na mesma conexão
+    antes da consulta da rota, a versão é do mesmo snapshot dos dados. A marca
+    é a maior versao e quantas mudanças há desde JANELA_VERSAO antes dela: uma
+    transação que confirma depois de outra mais nova não aumenta a maior
+    versao, mas aumenta a contagem.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(ULTIMA_MUDANCA, (tabela,))
+        linha = cursor.fetchone()
+        if linha is None:
+            return (0, 0), None
+        maior, criada_em = linha
+        cursor.execute(MUDANCAS_RECENTES, (tabela, maior - JANELA_VERSAO))
+        recentes = cursor.fetchone()[0]
+    return (maior, recentes), _instante(criada_em)
+
+
+def atual(conn, feed):
+    """Token do ponto atual do registro (?desde=agora): tomado antes de uma leitura completa."""
+    agora = datetime.now()
+    return codificar_token(feed, ultima(conn, FEEDS[feed]), agora)
+
+
+def ler(conn, feed, desde, limite):
+    """Uma página de mudanças depois da sequência `desde`; retorna ([(sequencia, id, operacao)], proximo, mais).
+
+    Publica antes as mudanças confirmadas. Vários registros do mesmo id na
+    página viram um só, com a última sequência e operação. O `proximo` aponta
+    para a última sequência lida.
+    """
+    publicar(conn)
+    agora = datetime.now()
+    with conn.cursor() as cursor:
+        cursor.execute(PAGINA, (FEEDS[feed], desde, limite + 1))
+        linhas = cursor.fetchall()
+    conn.rollback()
+
+    mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    if not linhas:
+        return [], codificar_token(feed, desde, agora), False
+
+    ultimas = {}
+    for sequencia, registro_id, operacao, _ in linhas:
+        ultimas.pop(registro_id, None)  # Reinsere no fim: a ordem segue a última sequência de cada id
+        ultimas[registro_id] = (sequencia, registro_id, operacao)
+    ultima_sequencia, _, _, criada_em = linhas[-1]
+    # Sem mais páginas, o consumidor está em dia até agora, não só até a última mudança
+    proximo = codificar_token(feed, ultima_sequencia, _instante(criada_em) if mais else agora)
+    return list(ultimas.values()), proximo, mais
+
+
+def limpar(conn, limite=1000):
+    """Apaga as mudanças mais antigas que a retenção, em lotes; retorna quantas foram removidas."""
+    vencimento = datetime.now() - timedelta(days=RETENCAO_DIAS)
+    removidas = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT versao FROM tbl_mudancas WHERE criada_em < %s ORDER BY criada_em LIMIT %s",
+                (vencimento, limite),
+            )
+            vencidas = cursor.fetchall()
+            if vencidas:
+                cursor.executemany("DELETE FROM tbl_mudancas WHERE versao = %s", vencidas)
+        conn.commit()
+        removidas += len(vencidas)
+        if len(vencidas) < limite:
+            return removidas
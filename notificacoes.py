@@ -0,0 +1,270 @@
+import logging
+import os
+import random
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from mysql.connector import Error
+
+import comandos
+import lote
+import metricas
+
+log = logging.getLogger(__name__)
+
+# Registra o email de confirmação em cada POST /pedidos (padrão: ligado quando há SMTP configurado)
+NOTIFICAR_PEDIDOS = os.getenv('NOTIFICACOES_PEDIDOS', '1' if os.getenv('SMTP_HOST') else '0') == '1'
+
+# Notificações lidas por vez pelo despachante
+LOTE = int(os.getenv('NOTIFICACOES_LOTE', 50))
+# Segundos entre as leituras da fila quando ela está vazia
+INTERVALO = float(os.getenv('NOTIFICACOES_INTERVALO', 1))
+# Tentativas antes de a notificação ficar como 'falhou' (para inspeção manual)
+TENTATIVAS_MAXIMAS = int(os.getenv('NOTIFICACOES_TENTATIVAS', 8))
+# Espera antes da 2ª tentativa; dobra a cada falha, até a espera máxima
+ESPERA_INICIAL = float(os.getenv('NOTIFICACOES_ESPERA_INICIAL', 30))
+ESPERA_MAXIMA = float(os.getenv('NOTIFICACOES_ESPERA_MAXIMA', 3600))
+# Por quanto tempo as notificações lidas ficam reservadas ao despachante; se ele
+# cair no meio do envio, outro as reenvia depois disso (entrega "ao menos uma vez")
+ARRENDAMENTO = float(os.getenv('NOTIFICACOES_ARRENDAMENTO', 300))
+
+# Servidor SMTP das entregas
+smtp_config = {
+    'host': os.getenv('SMTP_HOST', 'localhost'),
+    'porta': int(os.getenv('SMTP_PORTA', 25)),
+    'usuario': os.getenv('SMTP_USUARIO'),
+    'senha': os.getenv('SMTP_SENHA'),
+    'tls': os.getenv('SMTP_TLS', '0') == '1',  # STARTTLS antes do login
+    'remetente': os.getenv('SMTP_REMETENTE', 'pedidos@localhost'),
+    'timeout': float(os.getenv('SMTP_TIMEOUT', 10)),
+}
+
+PEDIDO_CRIADO = 'pedido_criado'
+
+
+def registrar_pedido(cursor, pedido_id):
+    """Enfileira o email de confirmação do pedido na mesma transação do INSERT do pedido.
+
+    Só o id vai para a fila: o despachante monta a mensagem na hora do envio,
+    e o pedido não espera pelo SMTP nem por consultas extras.
+    """
+    if NOTIFICAR_PEDIDOS:
+        agora = datetime.now()
+        cursor.execute(comandos.INSERIR_NOTIFICACAO, (PEDIDO_CRIADO, pedido_id, agora, agora))
+
+
+def espera(tentativas):
+    """Segundos até a próxima tentativa: backoff exponencial com variação, para não sincronizar os reenvios."""
+    base = min(ESPERA_INICIAL * 2 ** max(tentativas - 1, 0), ESPERA_MAXIMA)
+    return base * random.uniform(0.5, 1)
+
+
+class EnvioSMTP:
+    """Conexão SMTP usada por um lote de notificações (uma conexão por lote, não por email)."""
+
+    def __init__(self, config=None):
+        self.config = config or smtp_config
+        self._smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                self._smtp.close()
+            except OSError:
+                pass
+            self._smtp = None
+
+    def _conectar(self):
+        config = self.config
+        smtp = smtplib.SMTP(config['host'], config['porta'], timeout=config['timeout'])
+        if config['tls']:
+            smtp.starttls()
+        if config['usuario']:
+            smtp.login(config['usuario'], config['senha'])
+        return smtp
+
+    def enviar(self, destinatario, assunto, corpo):
+        mensagem = EmailMessage()
+        mensagem['From'] = self.config['remetente']
+        mensagem['To'] = destinatario
+        mensagem['Subject'] = assunto
+        mensagem.set_content(corpo)
+        if self._smtp is None:
+            self._smtp = self._conectar()
+        try:
+            self._smtp.send_message(mensagem)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._smtp = None  # A próxima mensagem do lote abre outra conexão
+            raise
+
+
+def definitivo(err):
+    """Erros que não adianta repetir: destinatário recusado ou resposta 5xx do servidor."""
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _ in err.recipients.values())
+    return isinstance(err, smtplib.SMTPResponseException) and err.smtp_code >= 500
+
+
+def montar_mensagem(pedido):
+    """Destinatário, assunto e corpo do email de confirmação de um pedido."""
+    assunto = f"Pedido #{pedido['id']} recebido"
+    corpo = (
+        f"Olá, {pedido['nome']}!\n\n"
+        f"Recebemos o seu pedido #{pedido['id']} em {pedido['data_hora']}.\n"
+        f"Situação: {pedido['status']}.\n"
+    )
+    return pedido['email'], assunto, corpo
+
+
+def _reservar(conn, limite):
+    """Lê as notificações vencidas e as reserva por ARRENDAMENTO segundos (transação curta)."""
+    agora = datetime.now()
+    with conn.cursor(dictionary=True) as cursor:
+        cursor.execute(
+            "SELECT id, tipo, pedido_id, tentativas, criada_em FROM tbl_notificacoes "
+            "WHERE status = 'pendente' AND proxima_em <= %s ORDER BY proxima_em LIMIT %s FOR UPDATE SKIP LOCKED",
+            (agora, limite),
+        )
+        notificacoes = cursor.fetchall()
+        if notificacoes:
+            reservada_ate = agora + timedelta(seconds=ARRENDAMENTO)
+            cursor.executemany("UPDATE tbl_notificacoes SET proxima_em = %s WHERE id = %s",
+                               [(reservada_ate, n['id']) for n in notificacoes])
+    conn.commit()
+    return notificacoes
+
+
+def _ler_pedidos(conn, ids):
+    with conn.cursor(dictionary=True) as cursor:
+        cursor.execute(
+            "SELECT p.id, p.data_hora, p.status, c.nome, c.email FROM tbl_pedidos p "
+            f"JOIN tbl_clientes c ON c.id = p.cliente_id WHERE p.id IN ({lote.placeholders(len(ids))})",
+            tuple(ids),
+        )
+        pedidos = {pedido['id']: pedido for pedido in cursor.fetchall()}
+    conn.rollback()
+    return pedidos
+
+
+def _contar(resultado):
+    metricas.registro.incrementar('notificacoes_total', (('resultado', resultado),))
+
+
+def despachar_lote(conn, envio, limite=None):
+    """Envia um lote de notificações vencidas; retorna quantas foram lidas da fila.
+
+    O SMTP é chamado fora de qualquer transação. As enviadas saem da fila; as
+    que falharam voltam com a próxima tentativa em backoff exponencial, ou
+    ficam como 'falhou' depois de TENTATIVAS_MAXIMAS ou de um erro definitivo.
+    """
+    notificacoes = _reservar(conn, limite or LOTE)
+    if not notificacoes:
+        return 0
+    pedidos = _ler_pedidos(conn, [n['pedido_id'] for n in notificacoes])
+
+    enviadas, falhas = [], []
+    for notificacao in notificacoes:
+        pedido = pedidos.get(notificacao['pedido_id'])
+        if pedido is None:
+            falhas.append((notificacao, "pedido ou cliente não encontrado", True))
+            continue
+        try:
+            envio.enviar(*montar_mensagem(pedido))
+        except (smtplib.SMTPException, OSError) as err:
+            falhas.append((notificacao, str(err) or err.__class__.__name__, definitivo(err)))
+            continue
+        enviadas.append(notificacao)
+
+    agora = datetime.now()
+    with conn.cursor() as cursor:
+        if enviadas:
+            cursor.executemany("DELETE FROM tbl_notificacoes WHERE id = %s", [(n['id'],) for n in enviadas])
+        for notificacao, erro, sem_volta in falhas:
+            tentativas = notificacao['tentativas'] + 1
+            falhou = sem_volta or tentativas >= TENTATIVAS_MAXIMAS
+            cursor.execute(
+                "UPDATE tbl_notificacoes SET tentativas = %s, status = %s, proxima_em = %s, ultimo_erro = %s WHERE id = %s",
+                (tentativas, 'falhou' if falhou else 'pendente', agora + timedelta(seconds=espera(tentativas)),
+                 erro[:500], notificacao['id']),
+            )
+            _contar('falhou' if falhou else 'erro')
+    conn.commit()
+
+    for notificacao in enviadas:
+        _contar('enviada')
+        criada_em = notificacao['criada_em']
+        if isinstance(criada_em, str):  # Banco local (SQLite) devolve datas como texto
+            criada_em = datetime.fromisoformat(criada_em)
+        metricas.registro.observar('notificacao_atraso_segundos', (), (agora - criada_em).total_seconds())
+    return len(notificacoes)
+
+
+def executar(conectar, parar=None, intervalo=None, limite=None, envio=None):
+    """Esvazia a fila continuamente até `parar` (threading.Event) ser sinalizado.
+
+    Lotes cheios são seguidos imediatamente pelo próximo; com a fila vazia o
+    despachante dorme `intervalo` segundos. Vários despachantes podem rodar ao
+    mesmo tempo: o FOR UPDATE SKIP LOCKED separa os lotes de cada um.
+    """
+    parar = parar or threading.Event()
+    intervalo = INTERVALO if intervalo is None else intervalo
+    limite = limite or LOTE
+    while not parar.is_set():
+        lidas = 0
+        conn = conectar()
+        if conn:
+            try:
+                with envio or EnvioSMTP() as smtp:
+                    lidas = despachar_lote(conn, smtp, limite)
+            except Error as err:
+                log.error("Erro ao despachar notificações: %s", err)
+            finally:
+                conn.close()
+        if lidas < limite:
+            parar.wait(intervalo)
+
+
+def estado(conn):
+    """Tamanho da fila e idade (s) da notificação pendente mais antiga."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT status, COUNT(*), MIN(criada_em) FROM tbl_notificacoes GROUP BY status")
+        linhas = cursor.fetchall()
+    conn.rollback()
+    resultado = {'pendentes': 0, 'falhas': 0, 'atraso': 0.0}
+    for status, total, mais_antiga in linhas:
+        if status == 'pendente':
+            resultado['pendentes'] = total
+            if isinstance(mais_antiga, str):
+                mais_antiga = datetime.fromisoformat(mais_antiga)
+            resultado['atraso'] = max((datetime.now() - mais_antiga).total_seconds(), 0.0)
+        elif status == 'falhou':
+            resultado['falhas'] = total
+    return resultado
+
+
+def coletar_metricas(conectar):
+    """Coletor do /metrics com a profundidade da fila, lida do banco a cada coleta."""
+    def coletar():
+        conn = conectar()
+        if not conn:
+            return []
+        try:
+            fila = estado(conn)
+        except Error:
+            return []
+        finally:
+            conn.close()
+        return [
+            ('notificacoes_pendentes', 'gauge', 'Notificações na fila aguardando envio.', (), fila['pendentes']),
+            ('notificacoes_falhas', 'gauge', 'Notificações que esgotaram as tentativas.', (), fila['falhas']),
+            ('notificacoes_atraso_segundos', 'gauge', 'Idade da notificação pendente mais antiga.', (), fila['atraso']),
+        ]
+
+    return coletar
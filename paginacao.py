@@ -0,0 +1,87 @@
+import base64
+import json
+import os
+
+# Tamanho de página padrão e máximo aceito pelo servidor
+LIMITE_PADRAO = int(os.getenv('PAGINA_PADRAO', 50))
+LIMITE_MAXIMO = int(os.getenv('PAGINA_MAXIMA', 500))
+
+
+def ler_limite(valor):
+    """Converte o parâmetro `limite` da query string, respeitando o máximo do servidor."""
+    if valor is None:
+        return LIMITE_PADRAO
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ValueError("Parâmetro 'limite' deve ser um número inteiro.")
+    if limite < 1:
+        raise ValueError("Parâmetro 'limite' deve ser maior que zero.")
+    return min(limite, LIMITE_MAXIMO)
+
+
+def codificar_cursor(ordenar_por, valor, id):
+    """Gera o cursor opaco que aponta para a linha seguinte a (valor, id)."""
+    dado = json.dumps([ordenar_por, valor, id], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dado.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token, ordenar_por):
+    """Lê um cursor gerado por codificar_cursor; retorna (valor, id)."""
+    try:
+        dado = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        coluna, valor, id = json.loads(dado)
+    except (ValueError, TypeError):
+        raise ValueError("Parâmetro 'apos' inválido.")
+    if coluna != ordenar_por:
+        raise ValueError("Parâmetro 'apos' não corresponde à ordenação solicitada.")
+    return valor, id
+
+
+def paginar(sql, condicoes, params, ordenar_por, ordem, args):
+    """Completa uma consulta de listagem com paginação por chave (keyset).
+
+    A busca avança a partir da última linha da página anterior usando o índice de
+    (ordenar_por, id) em vez de OFFSET. Retorna (sql, params, limite); a consulta
+    busca limite + 1 linhas para saber se existe uma próxima página.
+    """
+    limite = ler_limite(args.get('limite'))
+    condicoes = list(condicoes)
+    params = list(params)
+    comparador = '>' if ordem == 'asc' else '<'
+
+    token = args.get('apos')
+    if token:
+        valor, ultimo_id = decodificar_cursor(token, ordenar_por)
+        if ordenar_por == 'id':
+            condicoes.append(f"id {comparador} %s")
+            params.append(ultimo_id)
+        else:
+            condicoes.append(f"({ordenar_por} {comparador} %s OR ({ordenar_por} = %s AND id {comparador} %s))")
+            params.extend([valor, valor, ultimo_id])
+
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+
+    if ordenar_por == 'id':
+        sql += f" ORDER BY id {ordem}"
+    else:
+        sql += f" ORDER BY {ordenar_por} {ordem}, id {ordem}"
+    sql += " LIMIT %s"
+    params.append(limite + 1)
+
+    return sql, params, limite
+
+
+def fatiar_pagina(linhas, limite, ordenar_por, colunas=None):
+    """Separa a página das linhas buscadas e gera o cursor da próxima, se houver.
+
+    As linhas são dicts; com `colunas` (nomes na ordem do cursor) podem ser tuplas.
+    """
+    if len(linhas) <= limite:
+        return linhas, None
+    pagina = linhas[:limite]
+    ultima = pagina[-1]
+    if colunas is not None:
+        ultima = dict(zip(colunas, ultima))
+    return pagina, codificar_cursor(ordenar_por, ultima[ordenar_por], ultima['id'])
@@ -0,0 +1,246 @@
+# Recursos do processo usados pelas rotas: configuração do banco, pool de
+# conexões, réplicas de leitura e caches.
+#
+# São criados por configurar(), chamado por create_app() (app.py), e não na
+# importação. Nada aqui abre conexões ou threads: com gunicorn --preload o
+# processo mestre cria a aplicação e cada worker, depois do fork, abre as
+# próprias conexões (o pool recomeça vazio em um processo novo). As rotas leem
+# recursos.pool, recursos.cache_produtos... na hora do uso, nunca com
+# `from recursos import pool`.
+import logging
+import os
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+from flask import g, has_request_context, request
+
+import admissao
+import comandos
+import metricas
+import notificacoes
+import replicas
+from banco import PoolConexoes
+from cache import CacheLRU, CacheCompartilhado, CacheLeitura
+
+COOKIE_ESCRITA = 'ultima_escrita'
+
+log = logging.getLogger(__name__)
+
+# Preenchidos por configurar()
+config = None
+pool_config = None
+replicas_config = None
+cache_config = None
+JANELA_PROPRIAS_ESCRITAS = None
+pool = None
+roteador = None
+cache_produtos = None
+cache_clientes = None
+
+
+def configurar(banco=None):
+    """Lê o .cred e o ambiente e cria o pool, as réplicas e os caches deste processo.
+
+    `banco` sobrepõe as chaves da conexão (host, user, password, database, port, ssl_ca).
+    """
+    global config, pool_config, replicas_config, cache_config, JANELA_PROPRIAS_ESCRITAS
+    global pool, roteador, cache_produtos, cache_clientes
+
+    # Carrega as variáveis de ambiente do arquivo .cred (se disponível)
+    load_dotenv('.cred')
+
+    # Configurações para conexão com o banco de dados usando variáveis de ambiente
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),  # Obtém o host do banco de dados da variável de ambiente
+        'user': os.getenv('DB_USER'),  # Obtém o usuário do banco de dados da variável de ambiente
+        'password': os.getenv('DB_PASSWORD'),  # Obtém a senha do banco de dados da variável de ambiente
+        'database': os.getenv('DB_NAME', 'db_prep'),  # Obtém o nome do banco de dados da variável de ambiente
+        'port': int(os.getenv('DB_PORT', 3306)),  # Obtém a porta do banco de dados da variável de ambiente
+        'ssl_ca': os.getenv('SSL_CA_PATH')  # Caminho para o certificado SSL
+    }
+    config.update(banco or {})
+
+    # Configurações do pool de conexões (um pool por worker)
+    pool_config = {
+        'tamanho': int(os.getenv('DB_POOL_TAMANHO', 5)),  # Conexões abertas no máximo por worker
+        'espera_maxima': float(os.getenv('DB_POOL_ESPERA', 5)),  # Segundos aguardando uma conexão livre
+        'reciclar_apos': int(os.getenv('DB_POOL_RECICLAR', 1800)),  # Idade máxima de uma conexão em segundos
+        'verificar_apos': int(os.getenv('DB_POOL_VERIFICAR', 30)),  # Ociosidade que exige ping antes do reuso
+    }
+
+    # Réplicas de leitura opcionais: DB_REPLICAS=host1:3306,host2 (mesmo usuário, senha e banco do primário)
+    replicas_config = {
+        'hosts': [h.strip() for h in os.getenv('DB_REPLICAS', '').split(',') if h.strip()],
+        'atraso_maximo': float(os.getenv('DB_REPLICA_ATRASO_MAXIMO', 5)),  # Segundos de atraso que tiram a réplica do rodízio
+        'verificar_apos': float(os.getenv('DB_REPLICA_VERIFICAR', 10)),  # Intervalo entre verificações de cada réplica
+    }
+    # Depois de uma escrita, as leituras do mesmo cliente vão ao primário por esta janela (segundos).
+    # O padrão cobre o pior caso: atraso máximo aceito mais o tempo até a próxima verificação.
+    JANELA_PROPRIAS_ESCRITAS = float(os.getenv('DB_JANELA_PROPRIAS_ESCRITAS',
+                                               replicas_config['atraso_maximo'] + replicas_config['verificar_apos']))
+
+    # Configurações do cache de leitura de produtos e clientes
+    cache_config = {
+        'tamanho_maximo': int(os.getenv('CACHE_TAMANHO', 10000)),  # Entradas por worker no cache local
+        'ttl': int(os.getenv('CACHE_TTL', 60)),  # Segundos que uma entrada pode ficar em cache
+    }
+    # O cache local só é invalidado no worker que escreveu: com vários workers (GUNICORN_WORKERS,
+    # exportado pelo gunicorn.conf.py) e sem o cache compartilhado, ele fica desligado
+    workers = int(os.getenv('GUNICORN_WORKERS', 1))
+    if workers > 1 and not os.getenv('CACHE_URL') and cache_config['ttl'] > 0:
+        log.warning("cache local desligado: com %d workers serviria dados antigos depois de uma escrita; "
+                    "defina CACHE_URL para usar o cache compartilhado", workers)
+        cache_config['ttl'] = 0
+
+    pool = PoolConexoes(abrir_conexao, **pool_config)
+    pool.envolver_cursor = envolver_cursor
+    pool.cursor_preparavel = comandos.CursorPreparavel  # Comandos do registro por statements preparados da conexão
+
+    roteador = replicas.Roteador(
+        [criar_pool_replica(endereco) for endereco in replicas_config['hosts']],
+        atraso_maximo=replicas_config['atraso_maximo'],
+        verificar_apos=replicas_config['verificar_apos'],
+    )
+
+    cache_produtos = criar_cache('produtos')
+    cache_clientes = criar_cache('clientes')
+
+
+def abrir_conexao(host=None, port=None):
+    """Abre uma nova conexão física com o banco de dados (com host/port, em uma réplica)."""
+    if host is None:
+        return mysql.connector.connect(**config)
+    return mysql.connector.connect(**dict(config, host=host, port=port or config['port']))
+
+
+def criar_pool_replica(endereco):
+    """Pool de conexões de uma réplica a partir de 'host' ou 'host:porta'."""
+    host, _, porta = endereco.partition(':')
+    replica_pool = PoolConexoes(lambda: abrir_conexao(host, int(porta) if porta else None), **pool_config)
+    replica_pool.envolver_cursor = envolver_cursor
+    replica_pool.cursor_preparavel = comandos.CursorPreparavel
+    return replicas.Replica(endereco, replica_pool)
+
+
+def envolver_cursor(cursor):
+    """Passa o prazo da requisição às consultas e, se ativas, conta comandos, linhas e tempo de SQL por rota."""
+    cursor = admissao.CursorComPrazo(cursor)
+    return metricas.CursorMedido(cursor) if metricas.ATIVAS else cursor
+
+
+def ler_proprias_escritas():
+    """A requisição precisa ver as próprias escritas: escreveu há pouco ou pediu leitura no primário."""
+    if request.headers.get('X-Consistencia') == 'primario':
+        return True
+    try:
+        ultima = float(request.cookies.get(COOKIE_ESCRITA, 0))
+    except ValueError:
+        return False
+    return time.time() - ultima < JANELA_PROPRIAS_ESCRITAS
+
+
+def pode_usar_replica():
+    """GET/HEAD vão às réplicas; escritas, comandos do CLI e leituras das próprias escritas, ao primário."""
+    return (bool(roteador.replicas) and has_request_context()
+            and request.method in ('GET', 'HEAD') and not ler_proprias_escritas())
+
+
+def reservar_conexao(conn):
+    """Guarda a conexão para o próximo connect_db() da requisição (ex.: versão do ETag e dados lidos na mesma conexão)."""
+    g.conexao_reservada = conn
+
+
+def devolver_reservada(exc=None):
+    """Ao fim da requisição, devolve ao pool a conexão reservada que a rota não usou (ex.: resposta 304)."""
+    conn = g.pop('conexao_reservada', None)
+    if conn is not None:
+        conn.close()
+
+
+# Função para conectar ao banco de dados
+def connect_db(primario=False, prazo=True):
+    """Retira uma conexão do pool (de uma réplica, nas leituras); conn.close() a devolve ao pool.
+
+    `primario=True` força o primário, ex.: para preencher o cache de leitura,
+    que não pode guardar uma linha atrasada de uma réplica até o fim do TTL.
+    A espera por uma conexão livre termina no prazo da requisição (admissao);
+    `prazo=False` ignora o prazo, para registros que precisam ser gravados
+    depois de uma escrita já feita.
+    """
+    # Retorna None se não houver conexão livre dentro do tempo limite ou se o banco estiver indisponível
+    if not primario and has_request_context() and 'conexao_reservada' in g:
+        return g.pop('conexao_reservada')  # Mesma conexão (e mesmo host) de uma leitura anterior da requisição
+    espera = None
+    if prazo:
+        admissao.verificar_prazo()  # Prazo já esgotado: 503 em vez de esperar pelo pool
+        faltam = admissao.restante()
+        if faltam is not None:
+            espera = min(pool.espera_maxima, faltam)
+    inicio = time.perf_counter()
+    conn = None
+    if not primario and pode_usar_replica():
+        conn = roteador.retirar()  # None se nenhuma réplica puder atender: cai no primário
+    if conn is None:
+        conn = pool.retirar(espera)
+        if conn is None and prazo:
+            admissao.verificar_prazo()  # Esperou pelo pool até o fim do prazo: 503, não 500
+    metricas.registrar_conexao(time.perf_counter() - inicio)
+    return conn
+
+
+def criar_cache(nome):
+    """Cria o cache de um recurso: local (LRU por worker) ou compartilhado se CACHE_URL estiver definida.
+
+    Com TTL 0 (ex.: vários workers sem CACHE_URL, ver configurar) o cache
+    local não guarda nada e toda leitura vai ao banco.
+    """
+    url = os.getenv('CACHE_URL')
+    if url:
+        import redis  # Dependência opcional, necessária apenas para o cache compartilhado
+        backend = CacheCompartilhado(redis.Redis.from_url(url), ttl=cache_config['ttl'], prefixo=nome,
+                                     # Segundos sem invalidação até a versão de uma chave expirar (maior que CACHE_TTL)
+                                     ttl_versao=int(os.getenv('CACHE_TTL_VERSAO', 0)) or None)
+    else:
+        backend = CacheLRU(**cache_config)
+    return CacheLeitura(backend, nome)
+
+
+def marcar_escrita(resp):
+    """Após uma escrita bem-sucedida, marca o cliente para ler do primário durante a janela."""
+    if roteador.replicas and request.method not in ('GET', 'HEAD', 'OPTIONS') and resp.status_code < 400:
+        resp.set_cookie(COOKIE_ESCRITA, f"{time.time():.3f}", max_age=int(JANELA_PROPRIAS_ESCRITAS) + 1,
+                        httponly=True, samesite='Lax')
+    return resp
+
+
+def coletar_metricas_pool_cache():
+    """Valores do pool e dos caches deste worker para o /metrics."""
+    stats = pool.estatisticas()
+    amostras = [
+        ('db_pool_conexoes', 'gauge', 'Conexões do pool por estado.', (('estado', 'em_uso'),), stats['em_uso']),
+        ('db_pool_conexoes', 'gauge', 'Conexões do pool por estado.', (('estado', 'ociosa'),), stats['ociosas']),
+        ('db_pool_retiradas_total', 'counter', 'Conexões retiradas do pool.', (), stats['retiradas']),
+        ('db_pool_timeouts_total', 'counter', 'Retiradas que desistiram por tempo de espera.', (), stats['timeouts']),
+        ('db_pool_espera_segundos_total', 'counter', 'Tempo total esperando por uma conexão livre.', (), stats['espera_total']),
+    ]
+    for replica in roteador.estatisticas():
+        rotulos = (('replica', replica['nome']),)
+        amostras.append(('db_replica_saudavel', 'gauge', 'Réplica no rodízio de leituras (1) ou fora (0).',
+                         rotulos, int(replica['saudavel'])))
+        amostras.append(('db_replica_leituras_total', 'counter', 'Conexões de leitura servidas pela réplica.',
+                         rotulos, replica['leituras']))
+        if replica['atraso'] is not None:
+            amostras.append(('db_replica_atraso_segundos', 'gauge', 'Atraso da replicação na última verificação.',
+                             rotulos, replica['atraso']))
+    for cache in (cache_produtos, cache_clientes):
+        for evento, valor in cache.estatisticas().items():
+            if evento != 'tamanho':
+                amostras.append(('cache_eventos_total', 'counter', 'Acertos, falhas, remoções e invalidações do cache.',
+                                 (('cache', cache.nome), ('evento', evento)), valor))
+    return amostras
+
+
+metricas.registro.coletores.append(coletar_metricas_pool_cache)
+# Profundidade e atraso da fila de notificações, lidos do banco (sem esperar pelo pool)
+metricas.registro.coletores.append(notificacoes.coletar_metricas(lambda: pool.retirar(0)))
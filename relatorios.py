@@ -0,0 +1,177 @@
+# Relatórios de vendas e margem a partir de resumos mantidos a cada pedido
+#
+# tbl_vendas guarda, por pedido, o que ele valia no momento da compra (produto,
+# fornecedor, quantidade, receita e custo); tbl_resumo_vendas soma essas linhas
+# por dia, produto, fornecedor e status. pedidos() e a troca de status atualizam
+# as duas na mesma transação, e os relatórios leem só os grupos do resumo, sem
+# varrer tbl_pedidos. reconstruir() refaz tudo a partir dos pedidos (carga
+# inicial ou depois de mudanças feitas direto no banco).
+import os
+from datetime import date
+
+import comandos
+from paginacao import ler_limite
+
+AGRUPAMENTOS = {
+    'produto': ['produto_id'],
+    'fornecedor': ['fornecedor_id'],
+    'dia': ['dia'],
+}
+
+# Status que não contam como venda quando ?status= não é informado
+STATUS_EXCLUIDOS = [s for s in os.getenv('RELATORIOS_STATUS_EXCLUIDOS', 'cancelado').split(',') if s]
+
+# Pedidos processados por transação na reconstrução
+LOTE_RECONSTRUCAO = int(os.getenv('RELATORIOS_LOTE', 5000))
+
+# Os mesmos valores de comandos.VENDA_DO_PEDIDO, para todos os pedidos de uma faixa de ids
+_VENDAS_DE_PEDIDOS = (
+    "SELECT p.id, DATE(p.data_hora), ca.produto_id, COALESCE(pr.fornecedor_id, 0), p.status, ca.quantidade, "
+    "ca.quantidade * pr.preco, ca.quantidade * COALESCE(pr.custo_no_fornecedor, 0) "
+    "FROM tbl_pedidos p JOIN tbl_carrinhos ca ON ca.id = p.carrinho_id JOIN tbl_produtos pr ON pr.id = ca.produto_id"
+)
+_COLUNAS_VENDA = "pedido_id, dia, produto_id, fornecedor_id, status, quantidade, receita, custo"
+
+
+def registrar_pedido(cursor, pedido_id):
+    """Grava a venda do pedido recém-inserido e soma no resumo (mesma transação do pedido)."""
+    cursor.execute(comandos.VENDA_DO_PEDIDO, (pedido_id,))
+    venda = cursor.fetchone()
+    if venda is None:  # Carrinho ou produto inexistente: o pedido não entra nos relatórios
+        return
+    cursor.execute(comandos.REGISTRAR_VENDA, venda)
+    cursor.execute(comandos.SOMAR_VENDA, venda[1:])
+
+
+def mudar_status(cursor, pedido_id, status):
+    """Move a venda do pedido do grupo do status antigo para o do novo (mesma transação do UPDATE)."""
+    cursor.execute(
+        "SELECT dia, produto_id, fornecedor_id, status, quantidade, receita, custo FROM tbl_vendas "
+        "WHERE pedido_id = %s FOR UPDATE",
+        (pedido_id,),
+    )
+    venda = cursor.fetchone()
+    if venda is None:
+        return
+    dia, produto_id, fornecedor_id, anterior, quantidade, receita, custo = venda
+    if anterior == status:
+        return
+    cursor.execute(
+        "UPDATE tbl_resumo_vendas SET pedidos = pedidos - 1, quantidade = quantidade - %s, receita = receita - %s, "
+        "custo = custo - %s WHERE dia = %s AND produto_id = %s AND fornecedor_id = %s AND status = %s",
+        (quantidade, receita, custo, dia, produto_id, fornecedor_id, anterior),
+    )
+    cursor.execute(comandos.SOMAR_VENDA, (dia, produto_id, fornecedor_id, status, quantidade, receita, custo))
+    cursor.execute("UPDATE tbl_vendas SET status = %s WHERE pedido_id = %s", (status, pedido_id))
+
+
+def reconstruir(conn, lote=None):
+    """Refaz tbl_vendas e tbl_resumo_vendas a partir dos pedidos; retorna (vendas novas, grupos).
+
+    Os pedidos sem venda registrada (anteriores aos resumos) entram com os
+    preços atuais dos produtos, e os status alterados fora da API são
+    acertados; isso é feito em faixas de ids, uma transação por faixa. O resumo
+    é então recalculado de tbl_vendas em uma única transação.
+    """
+    lote = lote or LOTE_RECONSTRUCAO
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM tbl_pedidos")
+        maior_id = cursor.fetchone()[0]
+    conn.commit()
+
+    novas = 0
+    for inicio in range(0, maior_id, lote):
+        faixa = (inicio, inicio + lote)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO tbl_vendas ({_COLUNAS_VENDA}) {_VENDAS_DE_PEDIDOS} WHERE p.id > %s AND p.id <= %s "
+                "AND NOT EXISTS (SELECT 1 FROM tbl_vendas v WHERE v.pedido_id = p.id)",
+                faixa,
+            )
+            novas += max(cursor.rowcount, 0)
+            cursor.execute(
+                "UPDATE tbl_vendas SET status = (SELECT p.status FROM tbl_pedidos p WHERE p.id = tbl_vendas.pedido_id) "
+                "WHERE pedido_id > %s AND pedido_id <= %s AND status <> "
+                "(SELECT p.status FROM tbl_pedidos p WHERE p.id = tbl_vendas.pedido_id)",
+                faixa,
+            )
+        conn.commit()
+
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM tbl_resumo_vendas")
+        cursor.execute(
+            "INSERT INTO tbl_resumo_vendas (dia, produto_id, fornecedor_id, status, pedidos, quantidade, receita, custo) "
+            "SELECT dia, produto_id, fornecedor_id, status, COUNT(*), SUM(quantidade), SUM(receita), SUM(custo) "
+            "FROM tbl_vendas GROUP BY dia, produto_id, fornecedor_id, status"
+        )
+        grupos = cursor.rowcount
+    conn.commit()
+    return novas, grupos
+
+
+def _ler_data(args, nome):
+    valor = args.get(nome)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f"Parâmetro '{nome}' deve ser uma data no formato AAAA-MM-DD.")
+
+
+def consulta(args, margem=False):
+    """Monta a consulta de um relatório a partir da query string; retorna (sql, sql_total, params, limite).
+
+    ?agrupar=produto|fornecedor|dia, ?de= e ?ate= (datas, inclusivas),
+    ?status=pago,enviado (padrão: todos menos RELATORIOS_STATUS_EXCLUIDOS) e ?limite=.
+    """
+    agrupar = args.get('agrupar', 'produto')
+    if agrupar not in AGRUPAMENTOS:
+        raise ValueError(f"Parâmetro 'agrupar' aceita apenas: {', '.join(AGRUPAMENTOS)}.")
+    limite = ler_limite(args.get('limite'))
+
+    condicoes, params = [], []
+    de, ate = _ler_data(args, 'de'), _ler_data(args, 'ate')
+    if de:
+        condicoes.append("dia >= %s")
+        params.append(de)
+    if ate:
+        condicoes.append("dia <= %s")
+        params.append(ate)
+    if args.get('status'):
+        status = [s.strip() for s in args['status'].split(',') if s.strip()]
+        condicoes.append(f"status IN ({', '.join(['%s'] * len(status))})")
+        params.extend(status)
+    elif STATUS_EXCLUIDOS:
+        condicoes.append(f"status NOT IN ({', '.join(['%s'] * len(STATUS_EXCLUIDOS))})")
+        params.extend(STATUS_EXCLUIDOS)
+
+    colunas = AGRUPAMENTOS[agrupar]
+    where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    somas = "SUM(pedidos) AS pedidos, SUM(quantidade) AS quantidade, SUM(receita) AS receita, SUM(custo) AS custo"
+    ordem = "SUM(receita) - SUM(custo)" if margem else "SUM(receita)"
+    sql = (f"SELECT {', '.join(colunas)}, {somas} FROM tbl_resumo_vendas{where} "
+           f"GROUP BY {', '.join(colunas)} HAVING SUM(pedidos) > 0 "
+           f"ORDER BY {ordem} DESC, {', '.join(colunas)} LIMIT %s")
+    sql_total = f"SELECT {somas} FROM tbl_resumo_vendas{where}"
+    return sql, sql_total, params, limite
+
+
+def montar(linha, margem=False):
+    """Formata um grupo (ou o total) do relatório; a margem inclui custo, margem e margem percentual."""
+    grupo = {
+        'pedidos': int(linha['pedidos'] or 0),
+        'quantidade': int(linha['quantidade'] or 0),
+        'receita': linha['receita'] or 0,
+    }
+    for coluna in ('produto_id', 'fornecedor_id'):
+        if coluna in linha:
+            grupo[coluna] = linha[coluna]
+    if 'dia' in linha:
+        grupo['dia'] = str(linha['dia'])  # AAAA-MM-DD, não a data HTTP usada nos demais campos de data
+    if margem:
+        custo = linha['custo'] or 0
+        grupo['custo'] = custo
+        grupo['margem'] = grupo['receita'] - custo
+        grupo['margem_percentual'] = round(float(grupo['margem']) / float(grupo['receita']) * 100, 2) if grupo['receita'] else None
+    return grupo
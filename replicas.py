@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from mysql.connector import Error
+
+log = logging.getLogger(__name__)
+
+
+class Replica:
+    """Uma réplica de leitura: seu pool de conexões e o resultado da última verificação."""
+
+    def __init__(self, nome, pool):
+        self.nome = nome
+        self.pool = pool
+        self.saudavel = False  # Só recebe leituras depois da primeira verificação bem-sucedida
+        self.atraso = None  # Segundos de atraso da replicação na última verificação
+        self.verificada_em = None
+        self.leituras = 0
+        self._verificando = threading.Lock()
+
+
+def medir_atraso(conn):
+    """Atraso da replicação em segundos (SHOW REPLICA STATUS); None se a replicação não está rodando."""
+    with conn.cursor(dictionary=True) as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL anterior ao 8.0.22
+        linha = cursor.fetchone()
+    if not linha:
+        return None  # O servidor não é uma réplica
+    return linha.get('Seconds_Behind_Source', linha.get('Seconds_Behind_Master'))
+
+
+class Roteador:
+    """Distribui as leituras entre as réplicas saudáveis; sem nenhuma, quem chama usa o primário.
+
+    Cada réplica é verificada no máximo a cada `verificar_apos` segundos, pela
+    própria requisição que a encontra vencida (sem thread de fundo). Réplicas
+    fora do ar, com a replicação parada ou com atraso acima de `atraso_maximo`
+    ficam fora do rodízio até a próxima verificação sem problemas.
+    """
+
+    def __init__(self, replicas, atraso_maximo=5, verificar_apos=10, espera_verificacao=1.0):
+        self.replicas = replicas
+        self.atraso_maximo = atraso_maximo  # Segundos de atraso a partir dos quais a réplica é retirada
+        self.verificar_apos = verificar_apos  # Intervalo entre verificações de cada réplica
+        self.espera_verificacao = espera_verificacao  # Espera máxima por uma conexão para verificar
+        self._proxima = 0
+        self._lock = threading.Lock()
+
+    def verificar(self, replica):
+        """Mede o atraso da réplica e atualiza seu estado; retorna se ela está saudável."""
+        conn = replica.pool.retirar(timeout=self.espera_verificacao)
+        atraso = None
+        if conn:
+            try:
+                atraso = medir_atraso(conn)
+            except Error as err:
+                log.warning("Erro ao verificar a réplica %s: %s", replica.nome, err)
+            finally:
+                conn.close()
+        replica.atraso = atraso
+        replica.saudavel = atraso is not None and atraso <= self.atraso_maximo
+        replica.verificada_em = time.monotonic()
+        return replica.saudavel
+
+    def _verificar_vencidas(self):
+        agora = time.monotonic()
+        for replica in self.replicas:
+            if replica.verificada_em is not None and agora - replica.verificada_em < self.verificar_apos:
+                continue
+            # Uma requisição verifica; as demais seguem com o último estado conhecido
+            if replica._verificando.acquire(blocking=False):
+                try:
+                    self.verificar(replica)
+                finally:
+                    replica._verificando.release()
+
+    def retirar(self):
+        """Retira uma conexão de uma réplica saudável (em rodízio); None se nenhuma puder atender."""
+        if not self.replicas:
+            return None
+        self._verificar_vencidas()
+        with self._lock:
+            inicio = self._proxima
+            self._proxima = (self._proxima + 1) % len(self.replicas)
+        for passo in range(len(self.replicas)):
+            replica = self.replicas[(inicio + passo) % len(self.replicas)]
+            if not replica.saudavel:
+                continue
+            conn = replica.pool.retirar(timeout=0)  # Réplica sem conexão livre: tenta a próxima
+            if conn:
+                replica.leituras += 1
+                return conn
+        return None
+
+    def estatisticas(self):
+        """Estado de cada réplica deste worker."""
+        return [
+            {'nome': r.nome, 'saudavel': r.saudavel, 'atraso': r.atraso, 'leituras': r.leituras}
+            for r in self.replicas
+        ]
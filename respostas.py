@@ -0,0 +1,135 @@
+import functools
+import gzip
+import hashlib
+import os
+from datetime import timezone
+
+from flask import Response, make_response, request
+
+# Corpos menores que isso (em bytes) não compensam a compressão
+COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', 1024))
+NIVEL_GZIP = int(os.getenv('COMPRESSAO_NIVEL_GZIP', 6))
+QUALIDADE_BROTLI = int(os.getenv('COMPRESSAO_QUALIDADE_BROTLI', 5))
+
+try:
+    import brotli  # Dependência opcional; sem ela só gzip é oferecido
+except ImportError:
+    brotli = None
+
+_TIPOS_COMPRIMIVEIS = ('application/json', 'text/', 'application/x-ndjson')
+
+
+def etag_dos_dados(dados):
+    """ETag forte calculado dos dados da resposta (dicts/listas lidos do banco), sem gerar o JSON.
+
+    A ordem das colunas vem da consulta, então os mesmos dados sempre geram
+    o mesmo repr() e, portanto, o mesmo ETag.
+    """
+    return hashlib.blake2b(repr(dados).encode(), digest_size=16).hexdigest()
+
+
+def _variantes(etag):
+    # Cada codificação é uma representação diferente e recebe o ETag com sufixo (ex.: "abc-gzip")
+    return [etag, f"{etag}-gzip", f"{etag}-br"]
+
+
+def _validado(etag):
+    """A variante de `etag` que o cliente já tem (If-None-Match), ou None."""
+    return next((v for v in _variantes(etag) if request.if_none_match.contains_weak(v)), None)
+
+
+def _cabecalhos(resp, modificado_em=None):
+    resp.headers['Cache-Control'] = 'no-cache'  # Pode guardar, mas deve revalidar a cada uso
+    resp.vary.add('Accept-Encoding')
+    if modificado_em is not None:
+        resp.last_modified = modificado_em.astimezone(timezone.utc)  # Gravado na hora local do servidor
+    return resp
+
+
+def _nao_modificado(validado, modificado_em=None):
+    resp = Response(status=304)
+    resp.set_etag(validado)  # Repete o ETag da representação que o cliente já tem
+    return _cabecalhos(resp, modificado_em)
+
+
+def condicional(view=None, versao=None):
+    """Responde If-None-Match com 304 sem serializar o corpo; nas demais respostas 200 envia o ETag.
+
+    Sem `versao`, o ETag é calculado dos dados retornados pela rota: o 304
+    poupa a serialização e a banda, mas não a consulta. Com `versao`, uma
+    função dos mesmos argumentos da rota que retorna (versão dos dados,
+    instante da última mudança ou None) antes da consulta (ex.:
+    rotas.versao_mudancas), o ETag vem da versão e da URL e um If-None-Match
+    igual responde 304 sem executar a rota; o instante vai em Last-Modified.
+    If-Modified-Since não é avaliado: o instante é o da gravação da mudança,
+    e uma transação confirmada depois pode ter gravado um instante anterior.
+    Se `versao` retornar None, vale o ETag dos dados.
+    """
+    if view is None:
+        return functools.partial(condicional, versao=versao)
+
+    @functools.wraps(view)
+    def envolvida(*args, **kwargs):
+        etag = modificado_em = None
+        versao_atual = versao(*args, **kwargs) if versao is not None else None
+        if versao_atual is not None:
+            marca, modificado_em = versao_atual
+            etag = etag_dos_dados((request.full_path, marca))
+            validado = _validado(etag)
+            if validado:
+                return _nao_modificado(validado, modificado_em)
+
+        resultado = view(*args, **kwargs)
+        corpo, status = resultado if isinstance(resultado, tuple) else (resultado, 200)
+        if status != 200 or not isinstance(corpo, (dict, list)):
+            return resultado
+
+        if etag is None:
+            etag = etag_dos_dados(corpo)
+            validado = _validado(etag)
+            if validado:
+                return _nao_modificado(validado)
+        resp = make_response(corpo, status)
+        resp.set_etag(etag)
+        return _cabecalhos(resp, modificado_em)
+
+    return envolvida
+
+
+def _codificacao_aceita():
+    aceitas = request.accept_encodings
+    if brotli is not None and aceitas['br']:
+        return 'br'
+    if aceitas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(resp):
+    """Comprime o corpo com brotli ou gzip conforme o Accept-Encoding, acima de COMPRESSAO_MINIMO bytes."""
+    if (resp.status_code != 200 or resp.is_streamed or resp.direct_passthrough
+            or 'Content-Encoding' in resp.headers
+            or not (resp.mimetype or '').startswith(_TIPOS_COMPRIMIVEIS)):
+        return resp
+    resp.vary.add('Accept-Encoding')
+    codificacao = _codificacao_aceita()
+    if codificacao is None:
+        return resp
+    corpo = resp.get_data()
+    if len(corpo) < COMPRESSAO_MINIMO:
+        return resp
+
+    if codificacao == 'br':
+        resp.set_data(brotli.compress(corpo, quality=QUALIDADE_BROTLI))
+    else:
+        resp.set_data(gzip.compress(corpo, compresslevel=NIVEL_GZIP, mtime=0))
+    resp.headers['Content-Encoding'] = codificacao
+    etag, fraco = resp.get_etag()
+    if etag:
+        resp.set_etag(f"{etag}-{codificacao}", weak=fraco)
+    return resp
+
+
+def comprimir_respostas(app):
+    """Registra a compressão negociada de respostas na aplicação."""
+    app.after_request(comprimir)
@@ -0,0 +1,151 @@
+# Rotas da API, uma blueprint por recurso (registradas em create_app, app.py).
+#
+# Este pacote reúne os auxiliares comuns às blueprints: leitura de ?ids= e de
+# páginas, busca, registro de mudanças e o decorador de idempotência. Os
+# recursos do processo (pool, caches) ficam em recursos.py e são lidos na hora
+# do uso, pois só existem depois de configurar().
+import os
+
+from flask import request
+from mysql.connector import Error
+
+import busca
+import idempotencia
+import mudancas
+from banco import ConexaoIndisponivel
+from paginacao import fatiar_pagina, ler_limite
+from recursos import connect_db, reservar_conexao
+
+# Quantidade máxima de ids aceita em uma busca múltipla (?ids=1,2,3)
+MULTI_GET_MAXIMO = int(os.getenv('MULTI_GET_MAXIMO', 100))
+
+# Retries do gateway com o mesmo Idempotency-Key repetem a primeira resposta em vez de escrever de novo
+idempotente = idempotencia.idempotente(lambda: connect_db(prazo=False))
+
+def ler_ids(valor):
+    """Converte o parâmetro ?ids=1,2,3 em uma lista de ids sem repetição."""
+    try:
+        ids = list(dict.fromkeys(int(id) for id in valor.split(',') if id.strip()))
+    except ValueError:
+        raise ValueError("Parâmetro 'ids' deve ser uma lista de números separados por vírgula.")
+    if not ids:
+        raise ValueError("Parâmetro 'ids' está vazio.")
+    if len(ids) > MULTI_GET_MAXIMO:
+        raise ValueError(f"Parâmetro 'ids' aceita no máximo {MULTI_GET_MAXIMO} ids.")
+    return ids
+
+def ler_colunar(args):
+    """?formato=colunar nas listagens: nomes das colunas uma vez e cada linha como lista de valores."""
+    formato = args.get('formato')
+    if formato not in (None, 'colunar'):
+        raise ValueError("Parâmetro 'formato' aceita apenas 'colunar'.")
+    return formato == 'colunar'
+
+def ler_pagina(conn, sql, params, limite, ordenar_por, chave, colunar):
+    """Executa a consulta de uma página e monta o corpo da listagem; retorna None se a página está vazia.
+
+    No formato colunar a consulta usa um cursor de tuplas, sem montar um dict por linha.
+    """
+    with conn.cursor(dictionary=not colunar) as cursor:
+        cursor.execute(sql, params)
+        linhas = cursor.fetchall()
+        colunas = list(cursor.column_names) if colunar else None
+    pagina, proximo = fatiar_pagina(linhas, limite, ordenar_por, colunas)
+    if not pagina:
+        return None
+    if colunar:
+        return {"colunas": colunas, chave: pagina, "proximo": proximo}
+    return {chave: pagina, "proximo": proximo}
+
+def pesquisar(tabela, colunas, chave):
+    """Executa a busca ranqueada de ?q= em `tabela` e monta a página de resultados."""
+    try:
+        sql, params, limite, deslocamento, procurados = busca.consulta(tabela, colunas, request.args)
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, params)
+            resultados, proximo = busca.fatiar_resultado(cursor.fetchall(), request.args, limite, deslocamento, procurados)
+            return {chave: resultados, "proximo": proximo}, 200
+    except Error as err:
+        return {"erro": f"Erro ao buscar {chave}: {err}"}, 500
+    finally:
+        conn.close()
+
+def mudancas_de(feed, chave, carregar):
+    """Uma página do registro de mudanças de `feed`, com o estado atual de cada registro alterado.
+
+    ?desde=<token> continua de onde a página anterior parou (sem ele, começa do
+    início do registro); ?desde=agora só devolve o token atual, para guardar
+    antes de uma leitura completa. A resposta traz as mudanças, o token
+    `proximo` e `mais`, que indica se já há outra página para buscar.
+    """
+    desde = request.args.get('desde')
+    try:
+        limite = ler_limite(request.args.get('limite'))
+        versao = mudancas.decodificar_token(desde, feed) if desde and desde != 'agora' else 0
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+    except mudancas.TokenExpirado as err:
+        return {"erro": str(err)}, 410
+
+    conn = connect_db(primario=True)  # Publica as mudanças confirmadas (escrita) e não lê de uma réplica atrasada
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        if desde == 'agora':
+            return {"mudancas": [], "proximo": mudancas.atual(conn, feed), "mais": False}, 200
+        lidas, proximo, mais = mudancas.ler(conn, feed, versao, limite)
+        alterados = [registro_id for _, registro_id, operacao in lidas if operacao == mudancas.ALTERACAO]
+        atuais = carregar(conn, alterados) if alterados else {}
+        itens = []
+        for versao, registro_id, operacao in lidas:
+            item = {"id": registro_id, "versao": versao, "operacao": operacao}
+            if operacao == mudancas.ALTERACAO:
+                if registro_id in atuais:
+                    item[chave] = atuais[registro_id]
+                else:  # Removido depois da alteração, em uma versão que ainda não entrou na janela
+                    item["operacao"] = mudancas.REMOCAO
+            itens.append(item)
+        return {"mudancas": itens, "proximo": proximo, "mais": mais}, 200
+    except ConexaoIndisponivel:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    except Error as err:
+        return {"erro": f"Erro ao buscar mudanças: {err}"}, 500
+    finally:
+        conn.close()
+
+def versao_mudancas(feed, exceto=()):
+    """Versão para respostas.condicional de rotas cujos dados vêm só da tabela de `feed`.
+
+    Lida do registro de mudanças (mudancas.versao) na conexão que a rota vai
+    usar: a conexão fica reservada e o connect_db() seguinte da requisição a
+    recebe, então versão e dados saem do mesmo host (réplica ou primário) e do
+    mesmo snapshot. Com algum parâmetro de `exceto` na query string (ex.:
+    expandir, que lê outras tabelas) ou se o banco falhar, retorna None e o
+    ETag volta a ser calculado da resposta.
+    """
+    tabela = mudancas.FEEDS[feed]
+
+    def versao(*args, **kwargs):
+        if any(parametro in request.args for parametro in exceto):
+            return None
+        conn = connect_db()
+        if not conn:
+            return None
+        try:
+            marca, modificado_em = mudancas.versao(conn, tabela)
+        except Error:
+            conn.close()
+            return None
+        reservar_conexao(conn)
+        return f"{tabela}:{marca[0]}:{marca[1]}", modificado_em
+
+    return versao
@@ -0,0 +1,243 @@
+from flask import Blueprint, request
+from mysql.connector import Error
+
+import admissao
+import comandos
+import estoque
+import lote
+import recursos
+import respostas
+from paginacao import paginar
+from recursos import connect_db
+from rotas import idempotente, ler_colunar, ler_pagina
+
+bp = Blueprint('carrinhos', __name__)
+
+@bp.route('/carrinhos', methods=['POST'])
+@idempotente
+def carrinhos():
+    dado_carrinho = request.json
+    if 'produto_id' not in dado_carrinho or 'quantidade' not in dado_carrinho or 'cliente_id' not in dado_carrinho:
+        return {"erro": "Dados inválidos"}, 400
+    quantidade = dado_carrinho['quantidade']
+    # Uma quantidade negativa passaria pela baixa condicional e aumentaria o estoque
+    if isinstance(quantidade, bool) or not isinstance(quantidade, int) or quantidade <= 0:
+        return {"erro": "'quantidade' deve ser um número inteiro positivo"}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        with conn.cursor() as cursor:
+            # Inserir no carrinho e registrar a reserva antes de tocar no estoque,
+            # para que a linha do produto fique bloqueada só até o commit
+            sql = comandos.INSERIR_CARRINHO
+            values = (dado_carrinho['produto_id'], dado_carrinho['quantidade'], dado_carrinho['cliente_id'])
+            cursor.execute(sql, values)
+            carrinho_id = cursor.lastrowid
+            estoque.registrar_reserva(cursor, carrinho_id, dado_carrinho['produto_id'], dado_carrinho['quantidade'])
+
+            # Verifica e baixa o qtd_em_estoque em um único UPDATE condicional
+            if not estoque.reservar(cursor, dado_carrinho['produto_id'], dado_carrinho['quantidade'], carrinho_id):
+                conn.rollback()
+                cursor.execute(comandos.PRODUTO_EXISTE, (dado_carrinho['produto_id'],))
+                if not cursor.fetchone():
+                    return {"erro": "Produto não encontrado"}, 404
+                return {"erro": "Quantidade solicitada excede o qtd_em_estoque disponível"}, 400
+
+            conn.commit()
+            recursos.cache_produtos.invalidar(dado_carrinho['produto_id'])
+            return {"mensagem": "Carrinho cadastrado com sucesso"}, 201
+
+    except Error as err:
+        return {"erro": f"Erro ao processar o carrinho: {err}"}, 500
+    finally:
+        conn.close()
+
+
+@bp.route('/carrinhos/<int:id>', methods=['GET'])
+@respostas.condicional
+def procurar_carrinhos(id):
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    sql = comandos.CARRINHO_POR_ID
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, (id,))
+            carrinho = cursor.fetchone()
+            if carrinho:
+                return carrinho, 200
+            return {"erro": "carrinho não encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar carrinho: {err}"}, 500
+    finally:
+        conn.close()
+
+def filtros_carrinhos(args):
+    """Lê os filtros e a ordenação da listagem de carrinhos."""
+    filtro_produto_id = args.get('produto_id')
+    ordenar_por = args.get('ordenar_por', 'id')
+    ordem = args.get('ordem', 'asc')
+
+    condicoes = []
+    params = []
+
+    if filtro_produto_id:
+        if not filtro_produto_id.isdigit():
+            raise ValueError("Parâmetro 'produto_id' deve ser um número inteiro.")
+        condicoes.append("produto_id = %s")
+        params.append(int(filtro_produto_id))
+
+    if ordenar_por not in ['id', 'produto_id', 'quantidade']:
+        ordenar_por = 'id'
+    if ordem not in ['asc', 'desc']:
+        ordem = 'asc'
+
+    return condicoes, params, ordenar_por, ordem
+
+@bp.route('/carrinhos', methods=['GET'])
+@admissao.classe('pesada')
+@respostas.condicional
+def listar_carrinhos():
+    try:
+        condicoes, params, ordenar_por, ordem = filtros_carrinhos(request.args)
+        colunar = ler_colunar(request.args)
+        sql, params, limite = paginar("SELECT * FROM tbl_carrinhos", condicoes, params, ordenar_por, ordem, request.args)
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        pagina = ler_pagina(conn, sql, params, limite, ordenar_por, "carrinhos", colunar)
+        if pagina:
+            return pagina, 200
+        return {"erro": "Nenhum carrinho encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar carrinhos: {err}"}, 500
+    finally:
+        conn.close()
+
+
+@bp.route('/carrinhos/<int:carrinho_id>', methods=['PUT'])
+def atualizar_carrinho(carrinho_id):
+    dado_carrinho = request.json
+    if 'produto_id' not in dado_carrinho or 'quantidade' not in dado_carrinho:
+        return {"erro": "Dados inválidos"}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT * FROM tbl_carrinhos WHERE id = %s", (carrinho_id,))
+            carrinho_atual = cursor.fetchone()
+
+            if not carrinho_atual:
+                return {"erro": "carrinho não encontrado!"}, 404
+
+            sql = "UPDATE tbl_carrinhos SET produto_id = %s, quantidade = %s WHERE id = %s"
+            values = (dado_carrinho['produto_id'], dado_carrinho['quantidade'], carrinho_id)
+
+            cursor.execute(sql, values)
+            conn.commit()
+
+            return {"mensagem": "carrinho atualizado com sucesso!"}, 200
+
+    except Error as err:
+        return {"erro": f"Erro ao atualizar carrinho: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/carrinhos/<int:carrinho_id>', methods=['DELETE'])
+def delete_carrinho(carrinho_id):
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    sql_remove = "DELETE FROM tbl_carrinhos WHERE id = %s"
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM tbl_carrinhos WHERE id = %s", (carrinho_id,))
+            if cursor.fetchone():
+                # Devolve ao estoque o que ainda estava reservado pelo carrinho
+                produtos_afetados = estoque.liberar_reservas(cursor, [carrinho_id])
+                cursor.execute(sql_remove, (carrinho_id,))
+                conn.commit()
+                recursos.cache_produtos.invalidar(*produtos_afetados)
+                return {"mensagem": "carrinho removido com sucesso"}, 200
+            return {"erro": "carrinho não encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar carrinho: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/carrinhos/lote', methods=['DELETE'])
+@admissao.classe('pesada')
+def delete_carrinhos_lote():
+    """Remove vários carrinhos de uma vez, com um DELETE por bloco."""
+    try:
+        ids = lote.ler_itens(request.json, 'ids')
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    resultados = {}
+    validos = []
+    for indice, carrinho_id in enumerate(ids):
+        if isinstance(carrinho_id, int) and not isinstance(carrinho_id, bool):
+            validos.append((indice, carrinho_id))
+        else:
+            resultados[indice] = {"indice": indice, "status": 400, "erro": "id de carrinho inválido"}
+
+    if validos:
+        conn = connect_db()
+        if not conn:
+            return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        try:
+            for bloco in lote.em_blocos(validos):
+                with conn.cursor() as cursor:
+                    existentes = lote.ids_existentes(cursor, 'tbl_carrinhos', [carrinho_id for _, carrinho_id in bloco])
+                    produtos_afetados = estoque.liberar_reservas(cursor, list(existentes))
+                    if existentes:
+                        cursor.execute(f"DELETE FROM tbl_carrinhos WHERE id IN ({lote.placeholders(len(existentes))})", tuple(existentes))
+                conn.commit()
+                recursos.cache_produtos.invalidar(*produtos_afetados)
+
+                for indice, carrinho_id in bloco:
+                    if carrinho_id in existentes:
+                        resultados[indice] = {"indice": indice, "status": 200, "id": carrinho_id}
+                    else:
+                        resultados[indice] = {"indice": indice, "status": 404, "id": carrinho_id, "erro": "carrinho não encontrado"}
+        except Error as err:
+            return {"erro": f"Erro ao remover carrinhos: {err}"}, 500
+        finally:
+            conn.close()
+
+    return lote.resposta(resultados, len(ids), 200)
+
+@bp.route('/carrinhos/cliente/<int:cliente_id>', methods=['GET'])
+@respostas.condicional
+def listar_carrinhos_cliente(cliente_id):
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    sql = "SELECT * FROM tbl_carrinhos WHERE cliente_id = %s"
+    
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, (cliente_id,))
+            carrinho = cursor.fetchall()
+            if carrinho:
+                return {"carrinho": carrinho}, 200
+            return {"erro": "Nenhum carrinho encontrado para este cliente"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar carrinho do cliente: {err}"}, 500
+    finally:
+        conn.close()
@@ -0,0 +1,328 @@
+import logging
+
+from flask import Blueprint, request
+from mysql.connector import Error
+
+import admissao
+import busca
+import comandos
+import expansao
+import lote
+import recursos
+import respostas
+import senhas
+from banco import ConexaoIndisponivel
+from exportacao import FORMATOS, montar_consulta, exportar
+from paginacao import paginar
+from recursos import connect_db
+from rotas import idempotente, ler_colunar, ler_ids, ler_pagina, pesquisar
+
+bp = Blueprint('clientes', __name__)
+log = logging.getLogger(__name__)
+
+# Campos obrigatórios de um cliente (rotas individuais e de lote)
+CAMPOS_CLIENTE = ['nome', 'email', 'cpf', 'senha']
+
+@bp.route('/clientes', methods=['POST'])
+@idempotente
+def clientes():
+    dado_cliente = request.json
+    campos_obrigatorios = CAMPOS_CLIENTE
+
+    for campo in campos_obrigatorios:
+        if campo not in dado_cliente:
+            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
+
+    # Hash antes de pegar a conexão: o cálculo é lento e não deve prender uma conexão do pool
+    dado_cliente = dict(dado_cliente, senha=senhas.gerar(dado_cliente['senha']))
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        
+    sql = comandos.INSERIR_CLIENTE
+    values = tuple(dado_cliente[campo] for campo in campos_obrigatorios)
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, values)
+            busca.indexar(cursor, 'tbl_clientes', [(cursor.lastrowid, dado_cliente['nome'])])
+            conn.commit()
+            return {"mensagem": "cliente cadastrado com sucesso"}, 201
+    except Error as err:
+        return {"erro": f"Erro ao cadastrar cliente: {err}"}, 500
+    finally:
+        conn.close()
+
+def indexar_clientes(cursor, registros):
+    """Mantém o índice de busca dos clientes inseridos em lote (mesma transação)."""
+    busca.indexar(cursor, 'tbl_clientes', [(id, item['nome']) for id, item in registros])
+
+@bp.route('/clientes/lote', methods=['POST'])
+@admissao.classe('pesada')
+def clientes_lote():
+    """Cadastra vários clientes de uma vez, em blocos gravados com uma transação cada."""
+    try:
+        itens = lote.ler_itens(request.json, 'clientes')
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    validos, resultados = lote.validar(itens, CAMPOS_CLIENTE)
+
+    if validos:
+        hashes = senhas.gerar_varios([item['senha'] for _, item in validos])
+        validos = [(indice, dict(item, senha=hash)) for (indice, item), hash in zip(validos, hashes)]
+        conn = connect_db()
+        if not conn:
+            return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        try:
+            lote.inserir(conn, 'tbl_clientes', CAMPOS_CLIENTE, validos, resultados, ao_inserir=indexar_clientes)
+        finally:
+            conn.close()
+
+    return lote.resposta(resultados, len(itens), 201)
+
+def buscar_clientes(ids):
+    """Lê vários clientes com uma única consulta IN; retorna {id: cliente}."""
+    conn = connect_db(primario=True)  # Preenche o cache: sempre do primário
+    if not conn:
+        raise ConexaoIndisponivel()
+
+    sql = f"SELECT * FROM tbl_clientes WHERE id IN ({lote.placeholders(len(ids))})"
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, tuple(ids))
+            return {cliente['id']: cliente for cliente in cursor.fetchall()}
+    finally:
+        conn.close()
+
+def buscar_cliente(id):
+    """Lê um cliente do banco; retorna None se não existir."""
+    conn = connect_db(primario=True)  # Preenche o cache: sempre do primário
+    if not conn:
+        raise ConexaoIndisponivel()
+
+    sql = comandos.CLIENTE_POR_ID
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, (id,))
+            return cursor.fetchone()
+    finally:
+        conn.close()
+
+@bp.route('/clientes/<int:id>', methods=['GET'])
+@respostas.condicional
+def procurar_clientes(id):
+    try:
+        cliente = recursos.cache_clientes.obter(id, lambda: buscar_cliente(id))
+    except ConexaoIndisponivel:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    except Error as err:
+        return {"erro": f"Erro ao buscar cliente: {err}"}, 500
+
+    if cliente:
+        return cliente, 200
+    return {"erro": "cliente não encontrado"}, 404
+
+def filtros_clientes(args):
+    """Lê os filtros e a ordenação da listagem de clientes (usado também pela exportação)."""
+    filtro_nome = args.get('nome')
+    ordenar_por = args.get('ordenar_por', 'id')
+    ordem = args.get('ordem', 'asc')
+
+    condicoes = []
+    params = []
+
+    if filtro_nome:
+        condicoes.append("nome LIKE %s")
+        params.append(f"%{filtro_nome}%")
+
+    if ordenar_por not in ['id', 'nome', 'email', 'cpf', 'senha']:
+        ordenar_por = 'id'
+    if ordem not in ['asc', 'desc']:
+        ordem = 'asc'
+
+    return condicoes, params, ordenar_por, ordem
+
+@bp.route('/clientes', methods=['GET'])
+@admissao.classe('pesada')
+@respostas.condicional
+def listar_clientes():
+    if 'ids' in request.args:
+        return procurar_varios_clientes()
+
+    condicoes, params, ordenar_por, ordem = filtros_clientes(request.args)
+
+    try:
+        colunar = ler_colunar(request.args)
+        sql, params, limite = paginar("SELECT * FROM tbl_clientes", condicoes, params, ordenar_por, ordem, request.args)
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        pagina = ler_pagina(conn, sql, params, limite, ordenar_por, "clientes", colunar)
+        if pagina:
+            return pagina, 200
+        return {"erro": "Nenhum cliente encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar clientes: {err}"}, 500
+    finally:
+        conn.close()
+
+def procurar_varios_clientes():
+    """GET /clientes?ids=1,2,3: vários clientes de uma vez, indexados pelo id."""
+    try:
+        ids = ler_ids(request.args['ids'])
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    try:
+        clientes = recursos.cache_clientes.obter_varios(ids, buscar_clientes)
+    except ConexaoIndisponivel:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    except Error as err:
+        return {"erro": f"Erro ao buscar clientes: {err}"}, 500
+
+    return {
+        "clientes": {str(id): clientes[id] for id in ids if id in clientes},
+        "faltando": [id for id in ids if id not in clientes],
+    }, 200
+
+@bp.route('/clientes/busca', methods=['GET'])
+@admissao.classe('pesada')
+@respostas.condicional
+def buscar_clientes_por_nome():
+    """GET /clientes/busca?q=: clientes cujo nome contém o termo, pelo índice de trigramas."""
+    return pesquisar('tbl_clientes', expansao.COLUNAS_CLIENTE, 'clientes')
+
+@bp.route('/clientes/export', methods=['GET'])
+@admissao.classe('exportacao')
+def exportar_clientes():
+    """Exporta os clientes em NDJSON ou CSV, transmitindo as linhas sem carregá-las em memória."""
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in FORMATOS:
+        return {"erro": "Formato inválido, use 'ndjson' ou 'csv'."}, 400
+
+    condicoes, params, ordenar_por, ordem = filtros_clientes(request.args)
+    sql, params = montar_consulta('tbl_clientes', condicoes, params, ordenar_por, ordem)
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        return exportar(conn, sql, params, formato, 'clientes')
+    except Error as err:
+        conn.descartar()
+        return {"erro": f"Erro ao exportar clientes: {err}"}, 500
+
+@bp.route('/clientes/<int:cliente_id>', methods=['PUT'])
+def atualizar_cliente(cliente_id):
+    dado_cliente = request.json
+    # Sem 'senha' o cliente mantém a senha atual; quando enviada, é sempre tratada como senha nova
+    campos = [campo for campo in CAMPOS_CLIENTE if campo != 'senha' or 'senha' in dado_cliente]
+
+    for campo in CAMPOS_CLIENTE:
+        if campo != 'senha' and campo not in dado_cliente:
+            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
+
+    if 'senha' in dado_cliente:
+        # Hash antes de pegar a conexão, como no cadastro
+        dado_cliente = dict(dado_cliente, senha=senhas.gerar(dado_cliente['senha']))
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT * FROM tbl_clientes WHERE id = %s", (cliente_id,))
+            cliente_atual = cursor.fetchone()
+
+            if not cliente_atual:
+                return {"erro": "cliente não encontrado!"}, 404
+
+            sql = f"UPDATE tbl_clientes SET {', '.join(f'{campo} = %s' for campo in campos)} WHERE id = %s"
+            values = tuple(dado_cliente[campo] for campo in campos) + (cliente_id,)
+
+            cursor.execute(sql, values)
+            busca.indexar(cursor, 'tbl_clientes', [(cliente_id, dado_cliente['nome'])])
+            conn.commit()
+            recursos.cache_clientes.invalidar(cliente_id)
+
+            return {"mensagem": "cliente atualizado com sucesso!"}, 200
+
+    except Error as err:
+        return {"erro": f"Erro ao atualizar cliente: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/clientes/login', methods=['POST'])
+def login_cliente():
+    """Confere email e senha; linhas antigas (texto ou custo menor) recebem o hash atual."""
+    dados = request.json
+    for campo in ('email', 'senha'):
+        if campo not in dados:
+            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
+
+    conn = connect_db(primario=True)  # A senha pode ter acabado de mudar
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT id, senha FROM tbl_clientes WHERE email = %s", (dados['email'],))
+            cliente = cursor.fetchone()
+    except Error as err:
+        return {"erro": f"Erro ao buscar cliente: {err}"}, 500
+    finally:
+        conn.close()  # A verificação é lenta: a conexão volta ao pool antes dela
+
+    if not cliente:
+        return {"erro": "Email ou senha inválidos."}, 401
+    confere, precisa_atualizar = senhas.verificar(dados['senha'], cliente['senha'])
+    if not confere:
+        return {"erro": "Email ou senha inválidos."}, 401
+
+    if precisa_atualizar:
+        novo = senhas.gerar(dados['senha'])
+        conn = connect_db()
+        if conn:
+            try:
+                with conn.cursor() as cursor:
+                    # Só troca se a senha não mudou desde a leitura
+                    cursor.execute("UPDATE tbl_clientes SET senha = %s WHERE id = %s AND senha = %s",
+                                   (novo, cliente['id'], cliente['senha']))
+                conn.commit()
+                recursos.cache_clientes.invalidar(cliente['id'])
+            except Error as err:
+                log.warning("Erro ao atualizar o hash da senha do cliente %s: %s", cliente['id'], err)
+            finally:
+                conn.close()
+
+    return {"mensagem": "login efetuado com sucesso", "id": cliente['id']}, 200
+
+@bp.route('/clientes/<int:cliente_id>', methods=['DELETE'])
+def delete_cliente(cliente_id):
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    sql_remove = "DELETE FROM tbl_clientes WHERE id = %s"
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM tbl_clientes WHERE id = %s", (cliente_id,))
+            if cursor.fetchone():
+                cursor.execute(sql_remove, (cliente_id,))
+                busca.remover(cursor, 'tbl_clientes', [cliente_id])
+                conn.commit()
+                recursos.cache_clientes.invalidar(cliente_id)
+                return {"mensagem": "cliente removido com sucesso"}, 200
+            return {"erro": "cliente não encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar cliente: {err}"}, 500
+    finally:
+        conn.close()
@@ -0,0 +1,227 @@
+from flask import Blueprint, request
+from mysql.connector import Error
+
+import admissao
+import comandos
+import estoque
+import expansao
+import lote
+import mudancas
+import notificacoes
+import relatorios
+import respostas
+from exportacao import FORMATOS, montar_consulta, exportar
+from paginacao import paginar
+from recursos import connect_db
+from rotas import idempotente, ler_colunar, ler_pagina, mudancas_de, versao_mudancas
+
+bp = Blueprint('pedidos', __name__)
+
+# Sem ?expandir=, as respostas dependem só de tbl_pedidos: o ETag vem do registro de mudanças
+VERSAO_PEDIDOS = versao_mudancas('pedidos', exceto=('expandir',))
+
+@bp.route('/pedidos', methods=['POST'])
+@idempotente
+def pedidos():
+    dado_pedido = request.json
+    campos_obrigatorios = ['cliente_id', 'carrinho_id', 'data_hora', 'status']
+
+    for campo in campos_obrigatorios:
+        if campo not in dado_pedido:
+            return {"erro": f"Campo '{campo}' é obrigatório."}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        
+    sql = comandos.INSERIR_PEDIDO
+    values = tuple(dado_pedido[campo] for campo in campos_obrigatorios)
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, values)
+            pedido_id = cursor.lastrowid
+            # Resumos dos relatórios de vendas e margem, atualizados junto com o pedido
+            relatorios.registrar_pedido(cursor, pedido_id)
+            # Email de confirmação: só enfileirado aqui; o despachante envia depois do commit
+            notificacoes.registrar_pedido(cursor, pedido_id)
+            # O carrinho virou pedido: a baixa de estoque passa a ser definitiva
+            estoque.confirmar_reserva(cursor, dado_pedido['carrinho_id'])
+            mudancas.registrar(cursor, 'tbl_pedidos', [pedido_id])
+            conn.commit()
+            return {"mensagem": "pedido cadastrado com sucesso"}, 201
+    except Error as err:
+        return {"erro": f"Erro ao cadastrar pedido: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/pedidos/<int:pedido_id>', methods=['PATCH'])
+def atualizar_status_pedido(pedido_id):
+    """Troca o status de um pedido, movendo a venda para o grupo do novo status nos resumos."""
+    dado_pedido = request.json
+    status = dado_pedido.get('status') if isinstance(dado_pedido, dict) else None
+    if not isinstance(status, str) or not status.strip() or len(status) > 20:
+        return {"erro": "Campo 'status' é obrigatório (texto de até 20 caracteres)."}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT status FROM tbl_pedidos WHERE id = %s FOR UPDATE", (pedido_id,))
+            pedido = cursor.fetchone()
+            if not pedido:
+                return {"erro": "pedido não encontrado"}, 404
+            if pedido[0] != status:
+                cursor.execute("UPDATE tbl_pedidos SET status = %s WHERE id = %s", (status, pedido_id))
+                relatorios.mudar_status(cursor, pedido_id, status)
+                mudancas.registrar(cursor, 'tbl_pedidos', [pedido_id])
+            conn.commit()
+            return {"mensagem": "status do pedido atualizado com sucesso"}, 200
+    except Error as err:
+        return {"erro": f"Erro ao atualizar pedido: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/pedidos/<int:id>', methods=['GET'])
+@respostas.condicional(versao=VERSAO_PEDIDOS)
+def procurar_pedidos(id):
+    try:
+        expandir = expansao.ler_expandir(request.args.get('expandir'))
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    # Com ?expandir=..., cliente, carrinho e produtos vêm na mesma consulta (JOIN)
+    sql = expansao.consulta_pedido(expandir)
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, (id,))
+            pedido = cursor.fetchone()
+            if pedido:
+                return expansao.montar_pedido(pedido, expandir), 200
+            return {"erro": "pedido não encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar pedido: {err}"}, 500
+    finally:
+        conn.close()
+
+def filtros_pedidos(args):
+    """Lê os filtros e a ordenação da listagem de pedidos (usado também pela exportação)."""
+    filtro_cliente_id = args.get('cliente_id')
+    filtro_carrinho_id = args.get('carrinho_id')
+    ordenar_por = args.get('ordenar_por', 'id')
+    ordem = args.get('ordem', 'asc')
+
+    condicoes = []
+    params = []
+
+    if filtro_cliente_id:
+        condicoes.append("cliente_id = %s")
+        params.append(filtro_cliente_id)
+
+    if filtro_carrinho_id:
+        condicoes.append("carrinho_id = %s")
+        params.append(filtro_carrinho_id)
+
+    if ordenar_por not in ['id', 'cliente_id', 'carrinho_id', 'data_hora', 'status']:
+        ordenar_por = 'id'
+    if ordem not in ['asc', 'desc']:
+        ordem = 'asc'
+
+    return condicoes, params, ordenar_por, ordem
+
+@bp.route('/pedidos', methods=['GET'])
+@admissao.classe('pesada')
+@respostas.condicional(versao=VERSAO_PEDIDOS)
+def listar_pedidos():
+    condicoes, params, ordenar_por, ordem = filtros_pedidos(request.args)
+
+    try:
+        expandir = expansao.ler_expandir(request.args.get('expandir'))
+        colunar = ler_colunar(request.args)
+        if colunar and expandir:
+            raise ValueError("O formato colunar não pode ser combinado com 'expandir'.")
+        sql, params, limite = paginar("SELECT * FROM tbl_pedidos", condicoes, params, ordenar_por, ordem, request.args)
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        pagina = ler_pagina(conn, sql, params, limite, ordenar_por, "pedidos", colunar)
+        if pagina:
+            # Uma consulta IN por relação para a página inteira, não uma por pedido
+            expansao.expandir_pedidos(conn, pagina["pedidos"], expandir)
+            return pagina, 200
+        return {"erro": "Nenhum pedido encontrado"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar pedidos: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/pedidos/export', methods=['GET'])
+@admissao.classe('exportacao')
+def exportar_pedidos():
+    """Exporta os pedidos em NDJSON ou CSV, transmitindo as linhas sem carregá-las em memória."""
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in FORMATOS:
+        return {"erro": "Formato inválido, use 'ndjson' ou 'csv'."}, 400
+
+    condicoes, params, ordenar_por, ordem = filtros_pedidos(request.args)
+    sql, params = montar_consulta('tbl_pedidos', condicoes, params, ordenar_por, ordem)
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        return exportar(conn, sql, params, formato, 'pedidos')
+    except Error as err:
+        conn.descartar()
+        return {"erro": f"Erro ao exportar pedidos: {err}"}, 500
+
+@bp.route('/pedidos/cliente/<int:cliente_id>', methods=['GET'])
+@respostas.condicional(versao=VERSAO_PEDIDOS)
+def listar_pedidos_cliente(cliente_id):
+    try:
+        expandir = expansao.ler_expandir(request.args.get('expandir'))
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    sql = "SELECT * FROM tbl_pedidos WHERE cliente_id = %s"
+    
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, (cliente_id,))
+            pedidos = cursor.fetchall()
+        if pedidos:
+            expansao.expandir_pedidos(conn, pedidos, expandir)
+            return {"pedidos": pedidos}, 200
+        return {"erro": "Nenhum pedido encontrado para este cliente"}, 404
+    except Error as err:
+        return {"erro": f"Erro ao buscar pedidos do cliente: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/pedidos/mudancas', methods=['GET'])
+@admissao.classe('pesada')
+def mudancas_pedidos():
+    """Pedidos criados ou com status alterado desde o token ?desde=, para sincronizar sem reler /pedidos."""
+    return mudancas_de('pedidos', 'pedido', buscar_pedidos_por_id)
+
+def buscar_pedidos_por_id(conn, ids):
+    """Lê os pedidos com uma única consulta IN; retorna {id: pedido}."""
+    with conn.cursor(dictionary=True) as cursor:
+        cursor.execute(f"SELECT * FROM tbl_pedidos WHERE id IN ({lote.placeholders(len(ids))})", tuple(ids))
+        return {pedido['id']: pedido for pedido in cursor.fetchall()}
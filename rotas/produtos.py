@@ -0,0 +1,460 @@
+from flask import Blueprint, request, send_file
+from mysql.connector import Error
+
+import admissao
+import busca
+import comandos
+import estoque
+import expansao
+import imagens
+import lote
+import mudancas
+import recursos
+import respostas
+from banco import ConexaoIndisponivel
+from exportacao import FORMATOS, montar_consulta, exportar
+from paginacao import paginar
+from recursos import connect_db
+from rotas import ler_colunar, ler_ids, ler_pagina, mudancas_de, pesquisar, versao_mudancas
+
+bp = Blueprint('produtos', __name__)
+
+# Campos obrigatórios de um produto (rotas individuais e de lote)
+CAMPOS_PRODUTO = ['nome', 'descrição', 'preco', 'qtd_em_estoque', 'fornecedor_id', 'custo_no_fornecedor']
+
+def indexar_produtos(cursor, registros):
+    """Mantém o índice de busca e o registro de mudanças dos produtos inseridos em lote (mesma transação)."""
+    busca.indexar(cursor, 'tbl_produtos', [(id, item['nome']) for id, item in registros])
+    mudancas.registrar(cursor, 'tbl_produtos', [id for id, _ in registros])
+
+@bp.route('/produtos', methods=['POST'])
+def produtos():
+
+    dado_produto = request.json
+    if any(campo not in dado_produto for campo in CAMPOS_PRODUTO):
+        return {"erro": "Dados inválidos, verifique se os dados necessários foram fornecidos"}, 400
+
+    # conectar colm a base
+    conn = connect_db()
+    produto_id = None
+
+    if conn is None:
+        resp = {"erro": "Erro ao conectar com o banco de dados"}
+        return resp, 500
+    
+    cursor = conn.cursor(dictionary=True)
+    sql = comandos.INSERIR_PRODUTO
+    values = (dado_produto['nome'], dado_produto['descrição'], dado_produto['preco'], dado_produto['qtd_em_estoque'], dado_produto['fornecedor_id'], dado_produto['custo_no_fornecedor'])
+    try:
+        cursor.execute(sql, values)
+        produto_id = cursor.lastrowid
+        busca.indexar(cursor, 'tbl_produtos', [(produto_id, dado_produto['nome'])])
+        mudancas.registrar(cursor, 'tbl_produtos', [produto_id])
+        conn.commit()
+
+        resp = "produto cadastrado com sucesso"
+    finally:
+        # Fecha o cursor e devolve a conexão ao pool mesmo em caso de erro
+        cursor.close()
+        conn.close()
+
+    return resp, 201
+
+@bp.route('/produtos/lote', methods=['POST'])
+@admissao.classe('pesada')
+def produtos_lote():
+    """Cadastra vários produtos de uma vez (ex.: catálogo de um fornecedor)."""
+    try:
+        itens = lote.ler_itens(request.json, 'produtos')
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    validos, resultados = lote.validar(itens, CAMPOS_PRODUTO)
+
+    if validos:
+        conn = connect_db()
+        if not conn:
+            return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        try:
+            lote.inserir(conn, 'tbl_produtos', CAMPOS_PRODUTO, validos, resultados, ao_inserir=indexar_produtos)
+        finally:
+            conn.close()
+
+    return lote.resposta(resultados, len(itens), 201)
+
+@bp.route('/produtos/lote', methods=['PATCH'])
+@admissao.classe('pesada')
+def atualizar_produtos_lote():
+    """Atualiza preço e/ou estoque de vários produtos, com um UPDATE por bloco."""
+    try:
+        itens = lote.ler_itens(request.json, 'produtos')
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    campos_atualizaveis = ['preco', 'qtd_em_estoque']
+    validos, resultados = lote.validar(itens, ['id'])
+    for indice, item in list(validos):
+        if not any(campo in item for campo in campos_atualizaveis):
+            resultados[indice] = {"indice": indice, "status": 400, "erro": "Informe 'preco' e/ou 'qtd_em_estoque'."}
+    validos = [(indice, item) for indice, item in validos if indice not in resultados]
+
+    if validos:
+        conn = connect_db()
+        if not conn:
+            return {"erro": "Erro ao conectar com o banco de dados"}, 500
+        try:
+            for bloco in lote.em_blocos(validos):
+                with conn.cursor() as cursor:
+                    existentes = lote.ids_existentes(cursor, 'tbl_produtos', [item['id'] for _, item in bloco])
+                    encontrados = [(indice, item) for indice, item in bloco if item['id'] in existentes]
+
+                    # Um único UPDATE com CASE por coluna atualiza todas as linhas do bloco
+                    atribuicoes = []
+                    params = []
+                    for campo in campos_atualizaveis:
+                        casos = [(item['id'], item[campo]) for _, item in encontrados if campo in item]
+                        if casos:
+                            atribuicoes.append(f"{campo} = CASE id" + " WHEN %s THEN %s" * len(casos) + f" ELSE {campo} END")
+                            params.extend(valor for caso in casos for valor in caso)
+                    if encontrados:
+                        ids = [item['id'] for _, item in encontrados]
+                        sql = f"UPDATE tbl_produtos SET {', '.join(atribuicoes)} WHERE id IN ({lote.placeholders(len(ids))})"
+                        cursor.execute(sql, params + ids)
+                        # Em produtos fragmentados o estoque gravado vai para os fragmentos
+                        estoque.refragmentar(cursor, [item['id'] for _, item in encontrados if 'qtd_em_estoque' in item])
+                        mudancas.registrar(cursor, 'tbl_produtos', ids)
+                conn.commit()
+                recursos.cache_produtos.invalidar(*existentes)
+
+                for indice, item in bloco:
+                    if item['id'] in existentes:
+                        resultados[indice] = {"indice": indice, "status": 200, "id": item['id']}
+                    else:
+                        resultados[indice] = {"indice": indice, "status": 404, "id": item['id'], "erro": "produto não encontrado"}
+        except Error as err:
+            return {"erro": f"Erro ao atualizar produtos: {err}"}, 500
+        finally:
+            conn.close()
+
+    return lote.resposta(resultados, len(itens), 200)
+
+def formatar_produto(produto):
+    """Monta a resposta de um produto a partir da linha de tbl_produtos."""
+    return {"id": produto['id'], "nome": produto['nome'], "descrição": produto['descrição'], "preco": produto['preco'],"qtd_em_estoque": produto['qtd_em_estoque'],"fornecedor_id": produto['fornecedor_id'],"custo_no_fornecedor":produto['custo_no_fornecedor']}
+
+def buscar_produto(id):
+    """Lê um produto do banco já no formato de resposta; retorna None se não existir."""
+    conn = connect_db(primario=True)  # Conecta ao banco de dados (primário: o resultado vai para o cache)
+    if not conn:
+        raise ConexaoIndisponivel()
+
+    cursor = conn.cursor(dictionary=True)  # Adicionei dictionary=True para o retorno ser um dicionário
+    sql = comandos.PRODUTO_POR_ID  # Comando SQL para buscar um produto pelo ID
+    try:
+        # Executa o comando SQL com o ID fornecido e recupera o resultado
+        cursor.execute(sql, (id,))
+        produto = cursor.fetchone()
+        if not produto:
+            return None
+        if id in estoque.PRODUTOS_FRAGMENTADOS:
+            # Parte do estoque de produtos muito disputados fica nos fragmentos
+            with conn.cursor() as cursor_fragmentos:
+                produto['qtd_em_estoque'] += estoque.estoque_fragmentado(cursor_fragmentos, id)
+        return formatar_produto(produto)
+    finally:
+        # Fecha o cursor e a conexão para liberar recursos
+        cursor.close()
+        conn.close()
+
+def buscar_produtos(ids):
+    """Lê vários produtos com uma única consulta IN; retorna {id: produto} já no formato de resposta."""
+    conn = connect_db(primario=True)  # Preenche o cache: sempre do primário
+    if not conn:
+        raise ConexaoIndisponivel()
+    try:
+        return ler_produtos(conn, ids)
+    finally:
+        conn.close()
+
+def ler_produtos(conn, ids):
+    """Lê os produtos `ids` na conexão dada (sem passar pelo cache); retorna {id: produto} no formato de resposta."""
+    sql = f"SELECT * FROM tbl_produtos WHERE id IN ({lote.placeholders(len(ids))})"
+    with conn.cursor(dictionary=True) as cursor:
+        cursor.execute(sql, tuple(ids))
+        produtos = cursor.fetchall()
+    with conn.cursor() as cursor:
+        for produto in produtos:
+            if produto['id'] in estoque.PRODUTOS_FRAGMENTADOS:
+                produto['qtd_em_estoque'] += estoque.estoque_fragmentado(cursor, produto['id'])
+    return {produto['id']: formatar_produto(produto) for produto in produtos}
+
+@bp.route('/produtos/<int:id>', methods=['GET'])
+@respostas.condicional
+def procurar_produtos(id):
+    """Busca um produto específico pelo seu ID, passando pelo cache de leitura."""
+    try:
+        produto = recursos.cache_produtos.obter(id, lambda: buscar_produto(id))
+    except ConexaoIndisponivel:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    except Error as err:
+        # Em caso de erro na busca, retorna uma mensagem de erro
+        return {"erro": f"Erro ao buscar produto: {err}"}, 500
+
+    # Verifica se o produto foi encontrado e retorna os detalhes como JSON
+    if produto:
+        return produto, 200  # Retorna o produto encontrado e o código de status 200 (OK)
+    return {"erro": "produto não encontrado"}, 404  # Retorna uma mensagem de erro se não encontrar o produto
+
+@bp.route('/produtos', methods=['GET'])
+@admissao.classe('pesada')
+@respostas.condicional(versao=versao_mudancas('produtos', exceto=('ids',)))  # ?ids= lê do cache
+def listar_produto():
+    """Busca e exibe os produtos da tabela tbl_produtos, uma página por vez."""
+    if 'ids' in request.args:
+        return procurar_varios_produtos()
+
+    try:
+        colunar = ler_colunar(request.args)
+        # Pagina pelo id; 'limite' e 'apos' vêm da query string
+        sql, params, limite = paginar("SELECT * FROM tbl_produtos", [], [], 'id', 'asc', request.args)
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()  # Conecta ao banco de dados
+    if conn:
+        try:
+            # Executa o comando SQL da página solicitada e separa a página e o cursor da próxima
+            pagina = ler_pagina(conn, sql, params, limite, 'id', "produtos", colunar)
+
+            # Verifica se encontrou produtos e retorna a lista
+            if pagina:
+                return pagina, 200  # Retorna a lista de produtos como JSON
+            else:
+                return {"erro": "Nenhum produto encontrado"}, 404  # Retorna uma mensagem de erro se não encontrar produtos
+        except Error as err:
+            # Em caso de erro na busca, retorna uma mensagem de erro
+            return {"erro": f"Erro ao buscar produtos: {err}"}, 500
+        finally:
+            # Devolve a conexão ao pool para liberar recursos
+            conn.close()
+    else:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+def procurar_varios_produtos():
+    """GET /produtos?ids=1,2,3: vários produtos de uma vez, indexados pelo id (substitui N chamadas a /produtos/<id>)."""
+    try:
+        ids = ler_ids(request.args['ids'])
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    try:
+        # Os ids que já estão em cache não vão ao banco; os demais saem de um único SELECT ... IN
+        produtos = recursos.cache_produtos.obter_varios(ids, buscar_produtos)
+    except ConexaoIndisponivel:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    except Error as err:
+        return {"erro": f"Erro ao buscar produtos: {err}"}, 500
+
+    return {
+        "produtos": {str(id): produtos[id] for id in ids if id in produtos},
+        "faltando": [id for id in ids if id not in produtos],
+    }, 200
+
+@bp.route('/produtos/busca', methods=['GET'])
+@admissao.classe('pesada')
+@respostas.condicional(versao=versao_mudancas('produtos'))
+def buscar_produtos_por_nome():
+    """GET /produtos/busca?q=: produtos cujo nome contém o termo, ordenados por relevância."""
+    return pesquisar('tbl_produtos', expansao.COLUNAS_PRODUTO + ['qtd_em_estoque'], 'produtos')
+
+@bp.route('/produtos/export', methods=['GET'])
+@admissao.classe('exportacao')
+def exportar_produtos():
+    """Exporta os produtos em NDJSON ou CSV, transmitindo as linhas sem carregá-las em memória."""
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in FORMATOS:
+        return {"erro": "Formato inválido, use 'ndjson' ou 'csv'."}, 400
+
+    sql, params = montar_consulta('tbl_produtos', [], [], 'id', 'asc')
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        return exportar(conn, sql, params, formato, 'produtos')
+    except Error as err:
+        conn.descartar()
+        return {"erro": f"Erro ao exportar produtos: {err}"}, 500
+
+@bp.route('/produtos/<int:produto_id>', methods=['PUT'])
+def atualizar_produto(produto_id):
+    """Atualiza os dados de um produto existente na tabela tbl_produtos."""
+    conn = connect_db()  # Conecta ao banco de dados
+    if conn:
+        cursor = conn.cursor()  # Cria um cursor para executar comandos SQL
+        dado_produto = request.json  # Obtém os dados enviados no corpo da requisição
+
+        # Verifica se os dados 'nome' e 'ano' estão no JSON recebido
+        if any(campo not in dado_produto for campo in CAMPOS_PRODUTO):
+            cursor.close()
+            conn.close()  # Devolve a conexão ao pool
+            return {"erro": "Dados inválidos, verifique se os dados necessários foram fornecidos"}, 400
+
+        sql = "UPDATE tbl_produtos SET nome = %s, descrição = %s, preco = %s, qtd_em_estoque = %s, fornecedor_id = %s, custo_no_fornecedor = %s WHERE id = %s"  # Comando SQL para atualizar o produto
+        values = (dado_produto['nome'], dado_produto['descrição'], dado_produto['preco'], dado_produto['qtd_em_estoque'], dado_produto['fornecedor_id'], dado_produto['custo_no_fornecedor'], produto_id)  # Dados a serem atualizados
+
+        try:
+            # Executa o comando SQL com os valores fornecidos
+            cursor.execute(sql, values)
+            atualizado = cursor.rowcount > 0
+            if atualizado:
+                # Em um produto fragmentado o valor gravado vai para os fragmentos
+                estoque.refragmentar(cursor, [produto_id])
+                busca.indexar(cursor, 'tbl_produtos', [(produto_id, dado_produto['nome'])])
+                mudancas.registrar(cursor, 'tbl_produtos', [produto_id])
+            # Confirma a transação no banco de dados e descarta o produto do cache
+            conn.commit()
+            recursos.cache_produtos.invalidar(produto_id)
+
+            # Verifica se alguma linha foi afetada (atualizada)
+            if atualizado:
+                return {"mensagem": "produto atualizado com sucesso!"}, 200
+            else:
+                return {"erro": "produto não encontrado!"}, 404
+        except Error as err:
+            # Em caso de erro na atualização, retorna a mensagem de erro
+            return {"erro": f"Erro ao atualizar produto: {err}"}, 500
+        finally:
+            # Fecha o cursor e a conexão para liberar recursos
+            cursor.close()
+            conn.close()
+    else:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    
+@bp.route('/produtos/<int:produto_id>', methods=['DELETE'])
+def delete_produto(produto_id):
+    """Remove um usuário da tabela tbl_produtos e suas referências em outras tabelas."""    
+    conn = connect_db()  # Conecta ao banco de dados
+
+    if conn:
+        cursor = conn.cursor(dictionary=True)  # Adiciona dictionary=True para retorno como dicionário
+
+        # Comando SQL para buscar um usuário pelo ID
+        sql_select = "SELECT * FROM tbl_produtos WHERE id = %s"
+        # Comando SQL para remover o usuário
+        sql_remove_produto = "DELETE FROM tbl_produtos WHERE id = %s"
+
+        try:
+            # Executa o comando SQL com o ID fornecido
+            cursor.execute(sql_select, (produto_id,))
+            produto = cursor.fetchone()
+
+            # Verifica se o usuário foi encontrado
+            if produto:
+                # Remove o usuário
+                cursor.execute(sql_remove_produto, (produto_id,))
+                busca.remover(cursor, 'tbl_produtos', [produto_id])
+                imagens.remover(cursor, [produto_id])
+                mudancas.registrar(cursor, 'tbl_produtos', [produto_id], mudancas.REMOCAO)  # Lápide
+                conn.commit()
+                recursos.cache_produtos.invalidar(produto_id)
+
+                resp = {"mensagem": "produto removido com sucesso"}
+                return resp, 200  # Retorna mensagem de sucesso e o código de status 200 (OK)
+            else:
+                return {"erro": "produto não encontrado"}, 404  # Retorna mensagem de erro se não encontrar o usuário
+        except Error as err:
+            # Em caso de erro, retorna uma mensagem de erro
+            return {"erro": f"Erro ao buscar produto: {err}"}, 500
+        finally:
+            # Fecha o cursor e a conexão para liberar recursos
+            cursor.close()
+            conn.close()
+    else:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+
+@bp.route('/produtos/<int:produto_id>/imagem', methods=['PUT'])
+@admissao.classe('imagem')
+def enviar_imagem_produto(produto_id):
+    """Grava a imagem do produto enviada como corpo da requisição, sem carregá-la inteira na memória."""
+    if request.mimetype.startswith('multipart/'):
+        return {"erro": "Envie a imagem como corpo da requisição (ex.: Content-Type: image/jpeg), não como formulário."}, 415
+    if request.content_length is not None and request.content_length > imagens.TAMANHO_MAXIMO:
+        return {"erro": f"A imagem passa de {imagens.TAMANHO_MAXIMO} bytes."}, 413
+
+    try:
+        hash_, tipo, tamanho = imagens.gravar(request.stream)
+    except imagens.TamanhoExcedido as err:
+        return {"erro": str(err)}, 413
+    except imagens.TipoNaoSuportado as err:
+        return {"erro": str(err)}, 415
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(comandos.PRODUTO_EXISTE, (produto_id,))
+            if not cursor.fetchone():
+                return {"erro": "produto não encontrado"}, 404  # O arquivo sem uso sai com flask limpar-imagens
+            imagens.registrar(cursor, produto_id, hash_, tipo, tamanho)
+            conn.commit()
+    except Error as err:
+        return {"erro": f"Erro ao gravar imagem: {err}"}, 500
+    finally:
+        conn.close()
+
+    # Miniaturas em segundo plano: até ficarem prontas, ?tamanho= serve o original
+    imagens.agendar_miniaturas(hash_, tipo)
+    return {"mensagem": "imagem gravada com sucesso", "url": f"/produtos/{produto_id}/imagem?v={hash_}",
+            "tipo": tipo, "tamanho": tamanho}, 200
+
+@bp.route('/produtos/<int:produto_id>/imagem', methods=['GET'])
+@admissao.classe('imagem')
+def imagem_produto(produto_id):
+    """Serve a imagem (ou a miniatura ?tamanho=) do produto direto do arquivo, com Range e 304.
+
+    A URL com ?v=<hash> devolvida pelo PUT nunca muda de conteúdo e pode ficar
+    no cache por IMAGEM_CACHE_SEGUNDOS; sem ela o cliente revalida pelo ETag.
+    """
+    try:
+        tamanho = imagens.ler_tamanho(request.args.get('tamanho'))
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(comandos.IMAGEM_DO_PRODUTO, (produto_id,))
+            imagem = cursor.fetchone()
+    except Error as err:
+        return {"erro": f"Erro ao buscar imagem: {err}"}, 500
+    finally:
+        conn.close()
+    if not imagem:
+        return {"erro": "produto sem imagem"}, 404
+
+    hash_, tipo = imagem
+    caminho, tipo, etag, definitivo = imagens.arquivo(hash_, tipo, tamanho)
+    versionada = definitivo and request.args.get('v') == hash_
+    try:
+        # O arquivo vai pelo wsgi.file_wrapper do servidor (sendfile no gunicorn), sem passar pelo Python
+        resp = send_file(caminho, mimetype=tipo, conditional=True, etag=etag,
+                         max_age=imagens.CACHE_SEGUNDOS if versionada else 0)
+    except FileNotFoundError:
+        return {"erro": "arquivo da imagem não encontrado"}, 404
+    if versionada:
+        resp.cache_control.immutable = True
+    return resp
+
+@bp.route('/produtos/mudancas', methods=['GET'])
+@admissao.classe('pesada')
+def mudancas_produtos():
+    """Produtos alterados ou removidos desde o token ?desde=, para sincronizar sem reler /produtos."""
+    # Estado atual lido na mesma conexão do registro, não do cache, que pode estar atrás da mudança
+    return mudancas_de('produtos', 'produto', ler_produtos)
@@ -0,0 +1,47 @@
+from flask import Blueprint, request
+from mysql.connector import Error
+
+import relatorios
+import respostas
+from recursos import connect_db
+from rotas import versao_mudancas
+
+bp = Blueprint('relatorios', __name__)
+
+# Os resumos só mudam com os pedidos (relatorios.registrar_pedido e mudar_status, na transação que registra a mudança)
+VERSAO_RESUMOS = versao_mudancas('pedidos')
+
+@bp.route('/relatorios/vendas', methods=['GET'])
+@respostas.condicional(versao=VERSAO_RESUMOS)
+def relatorio_vendas():
+    """Pedidos, quantidade e receita por produto, fornecedor ou dia, lidos dos resumos."""
+    return relatorio('vendas', margem=False)
+
+@bp.route('/relatorios/margem', methods=['GET'])
+@respostas.condicional(versao=VERSAO_RESUMOS)
+def relatorio_margem():
+    """Receita, custo no fornecedor e margem por produto, fornecedor ou dia, lidos dos resumos."""
+    return relatorio('margem', margem=True)
+
+def relatorio(chave, margem):
+    """Executa um relatório sobre tbl_resumo_vendas: os grupos pedidos e o total do período."""
+    try:
+        sql, sql_total, params, limite = relatorios.consulta(request.args, margem)
+    except ValueError as err:
+        return {"erro": str(err)}, 400
+
+    conn = connect_db()
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(sql, tuple(params) + (limite,))
+            grupos = [relatorios.montar(linha, margem) for linha in cursor.fetchall()]
+            cursor.execute(sql_total, tuple(params))
+            total = relatorios.montar(cursor.fetchone(), margem)
+        return {chave: grupos, "total": total}, 200
+    except Error as err:
+        return {"erro": f"Erro ao gerar relatório: {err}"}, 500
+    finally:
+        conn.close()
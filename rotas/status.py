@@ -0,0 +1,58 @@
+from flask import Blueprint, Response
+from mysql.connector import Error
+
+import admissao
+import metricas
+import notificacoes
+import recursos
+
+bp = Blueprint('status', __name__)
+
+@bp.route('/', methods=['GET'])
+@admissao.classe('leve')
+def index():
+    return {"status": "API em execução"}, 200
+
+@bp.route('/status/pool', methods=['GET'])
+@admissao.classe('leve')
+def status_pool():
+    """Estatísticas do pool de conexões do worker que atendeu a requisição."""
+    return recursos.pool.estatisticas(), 200
+
+@bp.route('/status/replicas', methods=['GET'])
+@admissao.classe('leve')
+def status_replicas():
+    """Estado das réplicas de leitura deste worker (saúde, atraso e leituras servidas)."""
+    return {"replicas": recursos.roteador.estatisticas(), "atraso_maximo": recursos.roteador.atraso_maximo}, 200
+
+@bp.route('/metrics', methods=['GET'])
+@admissao.classe('leve')
+def metrics():
+    """Métricas no formato texto do Prometheus: somadas entre os workers com METRICAS_DIR, senão deste worker."""
+    return Response(metricas.registro.exportar(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/status/admissao', methods=['GET'])
+@admissao.classe('leve')
+def status_admissao():
+    """Vagas, requisições em andamento e na fila de cada classe de rota neste worker."""
+    return admissao.estatisticas(), 200
+
+@bp.route('/status/notificacoes', methods=['GET'])
+@admissao.classe('leve')
+def status_notificacoes():
+    """Notificações pendentes, que esgotaram as tentativas e a idade da pendente mais antiga."""
+    conn = recursos.pool.retirar(0)
+    if not conn:
+        return {"erro": "Erro ao conectar com o banco de dados"}, 500
+    try:
+        return notificacoes.estado(conn), 200
+    except Error as err:
+        return {"erro": f"Erro ao ler a fila de notificações: {err}"}, 500
+    finally:
+        conn.close()
+
+@bp.route('/status/cache', methods=['GET'])
+@admissao.classe('leve')
+def status_cache():
+    """Acertos, falhas, remoções e invalidações dos caches deste worker."""
+    return {"produtos": recursos.cache_produtos.estatisticas(), "clientes": recursos.cache_clientes.estatisticas()}, 200
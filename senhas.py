@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import admissao
+import metricas
+
+# Custo do scrypt como log2(N): cada +1 dobra o tempo e a memória do hash (14 ≈ 16 MiB, dezenas de ms)
+CUSTO = int(os.getenv('SENHA_CUSTO', 14))
+BLOCO = 8  # Parâmetro r do scrypt
+PARALELISMO = 1  # Parâmetro p do scrypt
+TAMANHO_SAL = 16
+TAMANHO_HASH = 32
+
+# Processos que calculam os hashes, por worker (0 = calcula na própria thread da requisição)
+PROCESSOS = int(os.getenv('SENHA_PROCESSOS', min(os.cpu_count() or 1, 4)))
+# Hashes aguardando um processo livre; acima disso a requisição espera até SENHA_ESPERA segundos e recebe 503
+PENDENTES_MAXIMO = int(os.getenv('SENHA_PENDENTES', max(PROCESSOS, 1) * 4))
+ESPERA = float(os.getenv('SENHA_ESPERA', 2))
+
+PREFIXO = 'scrypt$'
+
+log = logging.getLogger('senhas')
+
+_lock = threading.Lock()
+_executor = None
+_pid = None
+_vagas = threading.BoundedSemaphore(PENDENTES_MAXIMO)
+
+
+def eh_hash(valor):
+    """Se o valor guardado já é um hash desta aplicação (as linhas antigas guardam a senha em texto)."""
+    return isinstance(valor, str) and valor.startswith(PREFIXO)
+
+
+def _derivar(senha, sal, custo):
+    n = 2 ** custo
+    return hashlib.scrypt(senha.encode(), salt=sal, n=n, r=BLOCO, p=PARALELISMO,
+                          maxmem=256 * BLOCO * n, dklen=TAMANHO_HASH)
+
+
+def _b64(dados):
+    return base64.b64encode(dados).decode().rstrip('=')
+
+
+def _de_b64(texto):
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def calcular(senha, custo):
+    """Hash no formato 'scrypt$custo$r$p$sal$hash' (roda no processo auxiliar)."""
+    sal = os.urandom(TAMANHO_SAL)
+    return f"{PREFIXO}{custo}${BLOCO}${PARALELISMO}${_b64(sal)}${_b64(_derivar(senha, sal, custo))}"
+
+
+def conferir(senha, armazenado):
+    """Compara a senha com um hash gerado por calcular() (roda no processo auxiliar)."""
+    custo, bloco, paralelismo, sal, esperado = armazenado[len(PREFIXO):].split('$')
+    n = 2 ** int(custo)
+    obtido = hashlib.scrypt(senha.encode(), salt=_de_b64(sal), n=n, r=int(bloco), p=int(paralelismo),
+                            maxmem=256 * int(bloco) * n, dklen=TAMANHO_HASH)
+    return hmac.compare_digest(obtido, _de_b64(esperado))
+
+
+def _executor_do_processo():
+    # Um executor por worker; após um fork o do processo pai não serve
+    global _executor, _pid
+    with _lock:
+        # Um processo auxiliar que morre (ex.: falta de memória) inutiliza o executor: cria outro
+        if _executor is None or _pid != os.getpid() or getattr(_executor, '_broken', False):
+            # 'spawn': os processos auxiliares não herdam as threads e conexões do worker
+            _executor = ProcessPoolExecutor(max_workers=PROCESSOS, mp_context=multiprocessing.get_context('spawn'))
+            _pid = os.getpid()
+        return _executor
+
+
+def aquecer():
+    """Inicia os processos auxiliares deste worker antes do primeiro hash; retorna quantos estão prontos.
+
+    Com 'spawn' cada processo importa este módulo do zero: sem isso, o primeiro
+    cadastro ou login depois de subir o worker espera por essa partida.
+    """
+    if PROCESSOS <= 0:
+        return 0
+    executor = _executor_do_processo()
+    # Enviadas de uma vez: o executor só cria outro processo quando nenhum está livre
+    for futuro in [executor.submit(eh_hash, '') for _ in range(PROCESSOS)]:
+        futuro.result()
+    return PROCESSOS
+
+
+def configurar(processos=None, pendentes=None):
+    """Troca o número de processos e o limite de pendentes (ex.: benchmarks); vale para os próximos hashes."""
+    global PROCESSOS, PENDENTES_MAXIMO, _executor, _vagas
+    with _lock:
+        if processos is not None:
+            PROCESSOS = processos
+        PENDENTES_MAXIMO = pendentes if pendentes is not None else max(PROCESSOS, 1) * 4
+        if _executor is not None and _pid == os.getpid():
+            _executor.shutdown(wait=True)
+        _executor = None
+        _vagas = threading.BoundedSemaphore(PENDENTES_MAXIMO)
+
+
+def _enviar(funcao, *args):
+    """Envia a tarefa a um processo auxiliar, respeitando o limite de pendentes; retorna o Future."""
+    vagas = _vagas
+    if not vagas.acquire(timeout=ESPERA):
+        metricas.registro.incrementar('senhas_recusadas_total', ())
+        raise admissao.Sobrecarga("Muitas senhas sendo processadas.")
+    try:
+        futuro = _executor_do_processo().submit(funcao, *args)
+    except BaseException:
+        vagas.release()
+        raise
+    futuro.add_done_callback(lambda _: vagas.release())
+    return futuro
+
+
+def _executar(operacao, funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args) if PROCESSOS <= 0 else _enviar(funcao, *args).result()
+    metricas.registro.observar('senha_segundos', (('operacao', operacao),), time.perf_counter() - inicio)
+    return resultado
+
+
+def gerar(senha):
+    """Hash da senha com o custo atual, calculado em um processo auxiliar."""
+    return _executar('gerar', calcular, str(senha), CUSTO)
+
+
+def gerar_varios(senhas):
+    """Hashes de várias senhas (ex.: cadastro em lote), em paralelo nos processos auxiliares."""
+    if PROCESSOS <= 0:
+        return [gerar(senha) for senha in senhas]
+    inicio = time.perf_counter()
+    futuros = [_enviar(calcular, str(senha), CUSTO) for senha in senhas]
+    hashes = [futuro.result() for futuro in futuros]
+    for _ in hashes:
+        metricas.registro.observar('senha_segundos', (('operacao', 'gerar'),), (time.perf_counter() - inicio) / len(hashes))
+    return hashes
+
+
+def verificar(senha, armazenado):
+    """Confere a senha com o valor guardado; retorna (confere, precisa_atualizar).
+
+    Linhas antigas com a senha em texto são comparadas diretamente e pedem
+    atualização, assim como hashes com custo menor que o atual. Um hash
+    corrompido (campos faltando, base64 ou parâmetros inválidos) não confere.
+    """
+    senha = str(senha)
+    if not eh_hash(armazenado):
+        return hmac.compare_digest(senha.encode(), str(armazenado).encode()), True
+    try:
+        custo = int(armazenado[len(PREFIXO):].split('$', 1)[0])
+        confere = _executar('verificar', conferir, senha, armazenado)
+    except ValueError as e:
+        log.warning("hash de senha inválido: %s", e)
+        return False, False
+    return confere, confere and custo < CUSTO
@@ -0,0 +1,54 @@
+from datetime import date
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson  # Serializador em C; sem ele a aplicação usa o json da biblioteca padrão
+except ImportError:
+    orjson = None
+
+
+def _padrao(valor):
+    """Tipos que o orjson não serializa sozinho, convertidos como no provedor padrão do Flask."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, date):
+        return http_date(valor)
+    if hasattr(valor, '__html__'):
+        return str(valor.__html__())
+    raise TypeError(f"Object of type {type(valor).__name__} is not JSON serializable")
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    """Provedor JSON do Flask sobre o orjson, com a mesma saída do provedor padrão.
+
+    Decimal vira texto ('10.50') e datas viram datas HTTP, como antes; as
+    chaves continuam ordenadas. Chamadas com argumentos do json da
+    biblioteca padrão (indent, cls...) e o modo debug usam o provedor padrão.
+    """
+
+    def _opcoes(self):
+        # Datas passam pelo _padrao para manter o formato HTTP em vez do ISO 8601 do orjson
+        opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        return opcoes
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_padrao, option=self._opcoes()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        corpo = orjson.dumps(obj, default=_padrao, option=self._opcoes() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(corpo, mimetype=self.mimetype)